@@ -1,12 +1,10 @@
-from django.shortcuts import render, get_object_or_404
-from rest_framework import generics, permissions, status
-from django.db.models import Avg, Count, Sum, F, ExpressionWrapper, DurationField, Q
-from django.db.models.functions import ExtractHour, ExtractWeekDay
+from rest_framework import generics, permissions
+from django.db.models import Avg, Count, F, ExpressionWrapper, DurationField, Q
 from datetime import timedelta
-from availability.models import AvailabilitySlot
-from groups.models import GroupMembership, Group
+from availability.models import UserSlotStats
+from groups.models import GroupMembership
+from groups.permissions import IsGroupMember
 from .serializers import UserAvailabilityStatsSerializer, GroupInviteStatsSerializer
-from rest_framework.response import Response
 
 WEEKDAYS = {
     1: 'Sunday',
@@ -23,74 +21,31 @@ class UserAvailabilityStatsView(generics.RetrieveAPIView):
     serializer_class = UserAvailabilityStatsSerializer
 
     def get_object(self):
-        user = self.request.user
-        
-        duration_expression = ExpressionWrapper(
-            F('end_time') - F('start_time'),
-            output_field=DurationField()
-        )
-        
-        total_hours = AvailabilitySlot.objects.filter(
-            user=user
-        ).annotate(
-            duration=duration_expression
-        ).aggregate(
-            total=Sum('duration')
-        )['total'] or timedelta()
-
-        average_duration = AvailabilitySlot.objects.filter(
-            user=user
-        ).annotate(
-            duration=duration_expression
-        ).aggregate(
-            avg=Avg('duration')
-        )['avg'] or timedelta()
-
-        most_common_time = AvailabilitySlot.objects.filter(
-            user=user
-        ).annotate(
-            hour=ExtractHour('start_time')
-        ).values('hour').annotate(
-            count=Count('id')
-        ).order_by('-count').first()
-
-        most_common_weekday = AvailabilitySlot.objects.filter(
-            user=user
-        ).annotate(
-            weekday=ExtractWeekDay('date')
-        ).values('weekday').annotate(
-            count=Count('id')
-        ).order_by('-count').first()
+        # One row, kept up to date on every slot write (series occurrences included).
+        stats = UserSlotStats.objects.filter(user=self.request.user).first() or UserSlotStats()
+        count = stats.slot_count
+        top_hour = max(range(24), key=stats.hour_counts.__getitem__)
+        top_weekday = max(range(7), key=stats.weekday_counts.__getitem__)
 
         return {
-            'total_hours': total_hours,
-            'average_duration': average_duration,
-            'most_common_time': most_common_time['hour'] if most_common_time else None,
-            'most_common_weekday': WEEKDAYS.get(most_common_weekday['weekday']) if most_common_weekday else None,
+            'total_hours': stats.total_duration,
+            'average_duration': stats.total_duration / count if count else timedelta(),
+            'most_common_time': top_hour if stats.hour_counts[top_hour] else None,
+            # weekday_counts starts on Sunday, WEEKDAYS uses ExtractWeekDay numbering (1 = Sunday).
+            'most_common_weekday': WEEKDAYS[top_weekday + 1] if stats.weekday_counts[top_weekday] else None,
         }
 
 class GroupInviteStatsView(generics.RetrieveAPIView):
-    permission_classes = [permissions.IsAuthenticated]
+    # IsGroupMember responde 404 para grupos inexistentes e 403 para quem não é membro
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
     serializer_class = GroupInviteStatsSerializer
 
     def get_object(self):
         user = self.request.user
         group_id = self.kwargs['group_id']
-        
-        # Verifica se o usuário é membro do grupo
-        group = get_object_or_404(Group, id=group_id)
-        if not GroupMembership.objects.filter(
-            group=group,
-            user=user,
-            accepted=True
-        ).exists():
-            return Response(
-                {'detail': 'Você não é membro deste grupo.'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-    
+
         invite_stats = GroupMembership.objects.filter(
-            group=group,
+            group_id=group_id,
             invited_by=user
         ).aggregate(
             total=Count('id'),
@@ -98,7 +53,7 @@ class GroupInviteStatsView(generics.RetrieveAPIView):
         )
 
         avg_acceptance_time = GroupMembership.objects.filter(
-            group=group,
+            group_id=group_id,
             invited_by=user,
             accepted=True
         ).annotate(
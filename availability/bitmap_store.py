@@ -0,0 +1,209 @@
+from collections import defaultdict
+from functools import reduce
+from itertools import chain, groupby
+from operator import itemgetter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .bitmaps import MINUTES_PER_DAY, PACKED_BYTES, pack_coverage, unpack_coverage
+from .models import AvailabilitySlot, DailyAvailabilityBitmap
+from .recurrence import expand_recurring_slots, recurring_slots
+
+SCHEDULED = 'scheduled_bits'
+AVAILABLE = 'available_bits'
+
+_ROW_FIELDS = ('user_id', 'date', 'start_time', 'end_time', 'is_available')
+_BATCH_SIZE = 1000
+
+
+def _floor_minute(value):
+    return value.hour * 60 + value.minute
+
+
+def _ceil_minute(value):
+    minute = _floor_minute(value)
+    return minute + 1 if value.second or value.microsecond else minute
+
+
+def rasterize(intervals):
+    """
+    Pack ``(start_time, end_time)`` pairs into a 1440-bit day vector.
+
+    Partial minutes are rounded outwards so the stored bitmap never misses time
+    that is actually covered; it is only used to rule days out.
+    """
+    delta = np.zeros(MINUTES_PER_DAY + 1, dtype=np.int32)
+    for start_time, end_time in intervals:
+        delta[_floor_minute(start_time)] += 1
+        delta[_ceil_minute(end_time)] -= 1
+    return pack_coverage(np.cumsum(delta)[:MINUTES_PER_DAY] > 0).tobytes()
+
+
+def build_day_bitmaps(rows):
+    """``(scheduled_bits, available_bits)`` for one user-day of ``(start, end, is_available)`` rows"""
+    return (
+        rasterize((start, end) for start, end, _ in rows),
+        rasterize((start, end) for start, end, available in rows if available),
+    )
+
+
+def _pairs_filter(pairs):
+    dates_by_user = defaultdict(set)
+    for user_id, slot_date in pairs:
+        dates_by_user[user_id].add(slot_date)
+    return reduce(
+        lambda combined, item: combined | Q(user_id=item[0], date__in=item[1]),
+        dates_by_user.items(),
+        Q(pk__in=[]),
+    )
+
+
+def _occurrence_rows(user_ids=None, start_date=None, end_date=None):
+    """``(user_id, date, start_time, end_time, is_available)`` for series occurrences in the window"""
+    for slot in expand_recurring_slots(recurring_slots(user_ids, start_date, end_date), start_date, end_date):
+        yield slot.user_id, slot.date, slot.start_time, slot.end_time, slot.is_available
+
+
+def _expected_bitmaps(slot_queryset, occurrence_rows=()):
+    rows = defaultdict(list)
+    for user_id, slot_date, start_time, end_time, is_available in chain(
+        slot_queryset.values_list(*_ROW_FIELDS), occurrence_rows
+    ):
+        rows[user_id, slot_date].append((start_time, end_time, is_available))
+    return {
+        pair: build_day_bitmaps(day_rows)
+        for pair, day_rows in rows.items()
+    }
+
+
+def refresh_daily_bitmaps(pairs):
+    """
+    Recompute the stored bitmaps for the given ``(user_id, date)`` pairs from their
+    slots and the occurrences of their series.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+
+    dates = [slot_date for _, slot_date in pairs]
+    occurrences = (
+        row
+        for row in _occurrence_rows({user_id for user_id, _ in pairs}, min(dates), max(dates))
+        if row[:2] in pairs
+    )
+    expected = _expected_bitmaps(AvailabilitySlot.objects.filter(_pairs_filter(pairs)), occurrences)
+    emptied = pairs - expected.keys()
+
+    with transaction.atomic():
+        if emptied:
+            DailyAvailabilityBitmap.objects.filter(_pairs_filter(emptied)).delete()
+        DailyAvailabilityBitmap.objects.bulk_create(
+            [
+                DailyAvailabilityBitmap(user_id=user_id, date=slot_date, scheduled_bits=scheduled, available_bits=available)
+                for (user_id, slot_date), (scheduled, available) in expected.items()
+            ],
+            batch_size=_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=[SCHEDULED, AVAILABLE],
+        )
+
+
+def _iter_user_days(values, occurrences):
+    """Merge rows ordered by ``(user_id, date)`` with ``{(user_id, date): rows}`` occurrences"""
+    for pair, day_rows in groupby(values, key=itemgetter(0, 1)):
+        yield pair, list(day_rows) + occurrences.pop(pair, [])
+    yield from occurrences.items()
+
+
+def rebuild_daily_bitmaps(user_ids=None):
+    """
+    Drop and regenerate the bitmaps of ``user_ids`` (everyone when omitted) from a
+    single streamed pass over their slots, merged with their series occurrences.
+    Returns the number of rows written.
+    """
+    slots = AvailabilitySlot.objects.all()
+    bitmaps = DailyAvailabilityBitmap.objects.all()
+    if user_ids is not None:
+        slots = slots.filter(user_id__in=user_ids)
+        bitmaps = bitmaps.filter(user_id__in=user_ids)
+
+    occurrences = defaultdict(list)
+    for row in _occurrence_rows(user_ids):
+        occurrences[row[:2]].append(row)
+
+    written = 0
+    with transaction.atomic():
+        bitmaps.delete()
+        values = slots.order_by('user_id', 'date').values_list(*_ROW_FIELDS).iterator()
+        batch = []
+        for (user_id, slot_date), day_rows in _iter_user_days(values, occurrences):
+            scheduled, available = build_day_bitmaps([row[2:] for row in day_rows])
+            batch.append(DailyAvailabilityBitmap(
+                user_id=user_id,
+                date=slot_date,
+                scheduled_bits=scheduled,
+                available_bits=available,
+            ))
+            if len(batch) >= _BATCH_SIZE:
+                DailyAvailabilityBitmap.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+
+        DailyAvailabilityBitmap.objects.bulk_create(batch)
+        written += len(batch)
+
+    return written
+
+
+def find_inconsistent_bitmaps(user_ids=None):
+    """Yield ``(user_id, date)`` pairs whose stored bitmap disagrees with their slots"""
+    slots = AvailabilitySlot.objects.all()
+    bitmaps = DailyAvailabilityBitmap.objects.all()
+    if user_ids is not None:
+        slots = slots.filter(user_id__in=user_ids)
+        bitmaps = bitmaps.filter(user_id__in=user_ids)
+
+    expected = _expected_bitmaps(slots, _occurrence_rows(user_ids))
+    stored = {
+        (user_id, slot_date): (bytes(scheduled), bytes(available))
+        for user_id, slot_date, scheduled, available in bitmaps.values_list('user_id', 'date', SCHEDULED, AVAILABLE)
+    }
+
+    for pair in sorted(expected.keys() | stored.keys()):
+        if expected.get(pair) != stored.get(pair):
+            yield pair
+
+
+def find_candidate_dates(user_ids, start_date, end_date, field=AVAILABLE, required=None):
+    """
+    Dates in ``[start_date, end_date]`` on which at least ``required`` users in
+    ``user_ids`` (all of them by default) share a free minute according to the
+    stored bitmaps. Days outside the result cannot produce a common slot, so their
+    slot rows never need to be read.
+    """
+    user_ids = set(user_ids)
+    required = len(user_ids) if required is None else required
+    if len(user_ids) < 2 or required > len(user_ids):
+        return set()
+
+    per_date = defaultdict(list)
+    for slot_date, bits in DailyAvailabilityBitmap.objects.filter(
+        user_id__in=user_ids,
+        date__range=(start_date, end_date)
+    ).values_list('date', field).iterator():
+        per_date[slot_date].append(np.frombuffer(bits, dtype=np.uint8, count=PACKED_BYTES))
+
+    candidates = set()
+    for slot_date, vectors in per_date.items():
+        if len(vectors) < max(required, 2):
+            continue
+        if required == len(user_ids):
+            overlapping = np.bitwise_and.reduce(vectors).any()
+        else:
+            overlapping = (unpack_coverage(np.stack(vectors)).sum(axis=0) >= required).any()
+        if overlapping:
+            candidates.add(slot_date)
+    return candidates
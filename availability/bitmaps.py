@@ -0,0 +1,124 @@
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+PACKED_BYTES = MINUTES_PER_DAY // 8
+
+
+def minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def is_minute_aligned(rows):
+    return all(
+        not (row.start_time.second or row.start_time.microsecond or
+             row.end_time.second or row.end_time.microsecond)
+        for row in rows
+    )
+
+
+def coverage_matrix(rows, user_index):
+    """
+    Boolean ``(len(user_index), MINUTES_PER_DAY)`` matrix with one row per user and
+    a set bit for every minute covered by at least one of that user's slots.
+    """
+    delta = np.zeros((len(user_index), MINUTES_PER_DAY + 1), dtype=np.int32)
+    users = np.fromiter((user_index[row.user_id] for row in rows), dtype=np.intp, count=len(rows))
+    starts = np.fromiter((minute_of_day(row.start_time) for row in rows), dtype=np.intp, count=len(rows))
+    ends = np.fromiter((minute_of_day(row.end_time) for row in rows), dtype=np.intp, count=len(rows))
+    np.add.at(delta, (users, starts), 1)
+    np.add.at(delta, (users, ends), -1)
+    return np.cumsum(delta, axis=1)[:, :MINUTES_PER_DAY] > 0
+
+
+def pack_coverage(coverage):
+    return np.packbits(coverage, axis=-1)
+
+
+def unpack_coverage(packed):
+    return np.unpackbits(packed, axis=-1, count=MINUTES_PER_DAY).astype(bool)
+
+
+def _split_runs(mask, boundary):
+    """
+    Turn a day's minute mask into ``(start, end)`` minute pairs, breaking runs of set
+    bits at every slot boundary so the output matches the interval engine.
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    previous, current = padded[:-1], padded[1:]
+    starts = np.flatnonzero(current & (~previous | boundary))
+    ends = np.flatnonzero(previous & (~current | boundary))
+    return zip(starts.tolist(), ends.tolist())
+
+
+def iter_bitmap_intervals(days, user_ids, fallback, required=None):
+    """
+    Bitmap counterpart of ``iter_common_intervals`` working on every requested day
+    at once.
+
+    Each member's rows are rasterised to a packed 1440-bit vector per day, the
+    vectors are ANDed across members for all days in one NumPy reduction (or, for a
+    ``required`` quorum below the member count, summed per minute), and runs of set
+    bits are turned back into intervals. Yields
+    ``(date, start_time, end_time, covering)`` tuples identical to the interval
+    engine's output. Days with slot times that are not whole minutes cannot be
+    rasterised exactly and are delegated to ``fallback``, the interval sweep.
+    """
+    user_ids = list(user_ids)
+    user_index = {uid: position for position, uid in enumerate(user_ids)}
+    days = [
+        (day, [row for row in rows if row.user_id in user_index])
+        for day, rows in days
+    ]
+    if not days:
+        return
+
+    aligned = [is_minute_aligned(rows) for day, rows in days]
+    packed = np.zeros((len(days), len(user_ids), PACKED_BYTES), dtype=np.uint8)
+    for position, (day, rows) in enumerate(days):
+        if rows and aligned[position]:
+            packed[position] = pack_coverage(coverage_matrix(rows, user_index))
+
+    required = len(user_ids) if required is None else required
+    if required > len(user_ids):
+        return
+    if required == len(user_ids):
+        common = unpack_coverage(np.bitwise_and.reduce(packed, axis=1))
+    else:
+        common = np.stack([
+            unpack_coverage(day_packed).sum(axis=0, dtype=np.int32) >= required
+            for day_packed in packed
+        ])
+
+    for position, (day, rows) in enumerate(days):
+        if not aligned[position]:
+            for interval_start, interval_end, covering in fallback(rows, user_ids, required):
+                yield day, interval_start, interval_end, covering
+            continue
+
+        if len({row.user_id for row in rows}) < 2 or not common[position].any():
+            continue
+
+        times = {}
+        boundary = np.zeros(MINUTES_PER_DAY + 1, dtype=bool)
+        for row in rows:
+            for value in (row.start_time, row.end_time):
+                minute = minute_of_day(value)
+                boundary[minute] = True
+                times[minute] = value
+
+        user_rows = {uid: [] for uid in user_ids}
+        for row in rows:
+            user_rows[row.user_id].append(row)
+
+        for start, end in _split_runs(common[position], boundary):
+            interval_start, interval_end = times[start], times[end]
+            covering = []
+            for uid in user_ids:
+                row = next(
+                    (row for row in user_rows[uid]
+                     if row.start_time <= interval_start and row.end_time >= interval_end),
+                    None
+                )
+                if row is not None:
+                    covering.append(row)
+            yield day, interval_start, interval_end, covering
@@ -0,0 +1,164 @@
+import hashlib
+from collections import defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import AvailabilitySlot, SlotChange, SlotChangeLog
+from .recurrence import expand_recurring_slots, recurring_slots
+
+_BATCH_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """The requested cursor precedes the compacted part of the log (or was never issued)"""
+
+    def __init__(self, cursor):
+        super().__init__(cursor)
+        self.cursor = cursor
+
+
+def slot_key(slot):
+    """Log key of a slot: its id, or its series for an occurrence (the date is the entry's)"""
+    if slot.series_id is None:
+        return f'slot:{slot.id}'
+    return f'series:{slot.series_id}'
+
+
+def _fingerprint(start_time, end_time, is_available, title):
+    raw = f'{start_time.isoformat()}|{end_time.isoformat()}|{int(is_available)}|{title}'
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint(slot):
+    return _fingerprint(slot.start_time, slot.end_time, slot.is_available, slot.title)
+
+
+def _current_slots(user_id, dates):
+    """``{date: [slot, ...]}`` with the user's stored slots and series occurrences on ``dates``"""
+    dates = set(dates)
+    by_date = defaultdict(list)
+    occurrences = expand_recurring_slots(
+        recurring_slots([user_id], min(dates), max(dates)), min(dates), max(dates)
+    )
+    for slot in chain(AvailabilitySlot.objects.filter(user_id=user_id, date__in=dates), occurrences):
+        if slot.date in dates:
+            by_date[slot.date].append(slot)
+    return by_date
+
+
+def record_slot_changes(pairs):
+    """
+    Append one entry per ``(user_id, date)`` pair with that day's current slots.
+    The user's log head is locked while sequences are handed out, so entries of
+    the same user are committed in sequence order.
+    """
+    dates_by_user = defaultdict(set)
+    for user_id, slot_date in pairs:
+        dates_by_user[user_id].add(slot_date)
+
+    for user_id, dates in dates_by_user.items():
+        with transaction.atomic():
+            log, _ = SlotChangeLog.objects.select_for_update().get_or_create(user_id=user_id)
+            current = _current_slots(user_id, dates)
+            SlotChange.objects.bulk_create(
+                [
+                    SlotChange(
+                        user_id=user_id,
+                        sequence=log.last_sequence + offset,
+                        date=slot_date,
+                        slots={slot_key(slot): fingerprint(slot) for slot in current.get(slot_date, ())}
+                    )
+                    for offset, slot_date in enumerate(sorted(dates), start=1)
+                ],
+                batch_size=_BATCH_SIZE
+            )
+            log.last_sequence += len(dates)
+            log.save(update_fields=['last_sequence'])
+
+            retention = settings.AVAILABILITY_CHANGE_LOG_RETENTION
+            if log.last_sequence - log.compacted_through >= 2 * retention:
+                compact_change_log(log, log.last_sequence - retention)
+
+
+def compact_change_log(log, horizon):
+    """
+    Drop the entries up to ``horizon`` that a later entry of the same day (also up
+    to ``horizon``) supersedes, and the remaining ones of empty days. Cursors from
+    ``horizon`` on still diff correctly; older ones get CursorExpired. The log then
+    holds one entry per non-empty day plus every entry after ``horizon``.
+    """
+    superseded = SlotChange.objects.filter(
+        user_id=OuterRef('user_id'),
+        date=OuterRef('date'),
+        sequence__gt=OuterRef('sequence'),
+        sequence__lte=horizon
+    )
+    SlotChange.objects.filter(user_id=log.user_id, sequence__lte=horizon).filter(
+        Q(Exists(superseded)) | Q(slots={})
+    ).delete()
+    log.compacted_through = horizon
+    log.save(update_fields=['compacted_through'])
+
+
+def current_cursor(user):
+    return SlotChangeLog.objects.filter(user=user).values_list('last_sequence', flat=True).first() or 0
+
+
+def get_changes(user, since, limit):
+    """
+    Slots upserted and removed after the ``since`` cursor, covering at most
+    ``limit`` log entries. Returns ``(cursor, upserts, tombstones, has_more)``:
+    upserts are current slot instances (stored or occurrences) and tombstones are
+    ``{'id': ...}`` or ``{'series': ..., 'date': ...}`` dicts.
+    """
+    log = SlotChangeLog.objects.filter(user=user).first()
+    if log is None:
+        return 0, [], [], False
+    if since < log.compacted_through or since > log.last_sequence:
+        raise CursorExpired(log.last_sequence)
+
+    entries = list(SlotChange.objects.filter(user=user, sequence__gt=since).order_by('sequence')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return since, [], [], False
+
+    after = {entry.date: entry.slots for entry in entries}
+    before = {
+        entry.date: entry.slots
+        for entry in SlotChange.objects.filter(
+            user=user, date__in=after.keys(), sequence__lte=since
+        ).order_by('date', 'sequence')
+    }
+
+    removed_ids = set()
+    tombstones = []
+    changed = defaultdict(set)
+    for slot_date in sorted(after):
+        old, new = before.get(slot_date, {}), after[slot_date]
+        for key in old.keys() - new.keys():
+            kind, ident = key.split(':')
+            if kind == 'slot':
+                removed_ids.add(int(ident))
+            else:
+                tombstones.append({'series': int(ident), 'date': slot_date})
+        for key, value in new.items():
+            if old.get(key) != value:
+                changed[slot_date].add(key)
+
+    # A stored slot that left a day may have moved to another one; it is only
+    # tombstoned once it is gone, otherwise its new day's entry upserts it.
+    if removed_ids:
+        removed_ids -= set(AvailabilitySlot.objects.filter(user=user, id__in=removed_ids).values_list('id', flat=True))
+        tombstones.extend({'id': slot_id} for slot_id in sorted(removed_ids))
+
+    # Upserts carry the slots' current state; one removed since will be tombstoned by a later page.
+    upserts = []
+    if changed:
+        for slot_date, slots in sorted(_current_slots(user.id, changed).items()):
+            upserts.extend(slot for slot in slots if slot_key(slot) in changed[slot_date])
+
+    return entries[-1].sequence, upserts, tombstones, has_more
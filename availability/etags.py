@@ -0,0 +1,69 @@
+import hashlib
+import threading
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SlotChangeLog
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def slot_versions(user_ids):
+    """
+    ``{user_id: version}`` of the users' slots, in ``user_ids`` order. The version
+    is the head of the user's change log, which every slot or series write moves
+    forward; users who never wrote a slot are at 0.
+    """
+    versions = dict(
+        SlotChangeLog.objects.filter(user_id__in=user_ids).values_list('user_id', 'last_sequence')
+    )
+    return {user_id: versions.get(user_id, 0) for user_id in user_ids}
+
+
+def make_etag(*parts):
+    """Strong ETag of the representation identified by ``parts`` (versions, filters, format)"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def _record(endpoint, conditional, hit):
+    with _stats_lock:
+        counters = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'conditional': 0})
+        counters['hits' if hit else 'misses'] += 1
+        counters['conditional'] += conditional
+
+
+def get_stats():
+    with _stats_lock:
+        stats = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+    for counters in stats.values():
+        total = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / total if total else 0.0
+    return stats
+
+
+def not_modified(request, endpoint, etag):
+    """
+    A 304 response if the request's ``If-None-Match`` matches ``etag``, otherwise
+    None; either way the request counts towards ``endpoint``'s hit rate. Called
+    before anything is queried for the response, so a hit costs only the version
+    lookups that went into ``etag``.
+    """
+    header = request.headers.get('If-None-Match')
+    # If-None-Match uses the weak comparison, so W/ tags from intermediaries match too.
+    tags = {tag.removeprefix('W/') for tag in parse_etags(header)} if header else set()
+    hit = '*' in tags or etag in tags
+    _record(endpoint, bool(header), hit)
+    if not hit:
+        return None
+    return tag_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+
+def tag_response(response, etag):
+    response['ETag'] = etag
+    # Always revalidate: the versions behind the tag change without the URL changing.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,39 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` hook counting database round-trips and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+@contextmanager
+def track_queries():
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield counter
+    counter.total = time.perf_counter() - started
+
+
+def server_timing(counter):
+    """Format a tracked request as a ``Server-Timing`` header value"""
+    return 'db;desc="{} queries";dur={:.1f}, total;dur={:.1f}'.format(
+        counter.count,
+        counter.duration * 1000,
+        counter.total * 1000,
+    )
@@ -0,0 +1,124 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import SlotImportJob
+from .serializers import BatchAvailabilitySlotSerializer
+from .signals import collect_slot_changes
+
+logger = logging.getLogger(__name__)
+
+# Per-slot errors kept on the job row; failed_count still counts every failure.
+MAX_STORED_ERRORS = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AVAILABILITY_JOB_WORKERS,
+                thread_name_prefix='slot-import'
+            )
+        return _executor
+
+
+def enqueue_job(job):
+    """Hand ``job`` to the local worker pool once the transaction that created it commits"""
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.id))
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception('Slot import job %s failed', job_id)
+    finally:
+        connection.close()
+
+
+def requeue_interrupted_jobs(include_failed=False):
+    """
+    Put jobs left running by a stopped process (and, optionally, failed ones) back
+    to pending so they resume after their last committed chunk; returns how many.
+    """
+    statuses = [SlotImportJob.RUNNING, SlotImportJob.FAILED] if include_failed else [SlotImportJob.RUNNING]
+    return SlotImportJob.objects.filter(status__in=statuses).update(status=SlotImportJob.PENDING)
+
+
+def run_job(job_id):
+    """
+    Claim a pending job and process its slots chunk by chunk, resuming after the
+    entries already processed. Returns False when another worker owns the job.
+    """
+    claimed = SlotImportJob.objects.filter(pk=job_id, status=SlotImportJob.PENDING).update(
+        status=SlotImportJob.RUNNING,
+        started_at=timezone.now(),
+        finished_at=None,
+        error=''
+    )
+    if not claimed:
+        return False
+
+    job = SlotImportJob.objects.select_related('user').get(pk=job_id)
+    chunk_size = settings.AVAILABILITY_JOB_CHUNK_SIZE
+    try:
+        for offset in range(job.processed, job.total, chunk_size):
+            _run_chunk(job, offset, job.payload[offset:offset + chunk_size])
+    except Exception as e:
+        SlotImportJob.objects.filter(pk=job.pk).update(
+            status=SlotImportJob.FAILED,
+            error=str(e),
+            finished_at=timezone.now()
+        )
+        raise
+
+    SlotImportJob.objects.filter(pk=job.pk).update(
+        status=SlotImportJob.COMPLETED,
+        finished_at=timezone.now()
+    )
+    return True
+
+
+def _run_chunk(job, offset, chunk):
+    """Create one chunk of slots and record its progress in the same transaction"""
+    indexes = list(range(len(chunk)))
+    errors = []
+
+    serializer = BatchAvailabilitySlotSerializer(data={'slots': chunk})
+    if not serializer.is_valid():
+        # Entries valid at submission can expire (e.g. a recurrence end date now in the past).
+        slot_errors = serializer.errors.get('slots', {})
+        if isinstance(slot_errors, list):
+            slot_errors = dict(enumerate(slot_errors))
+        slot_errors = {int(index): slot_error for index, slot_error in slot_errors.items() if slot_error}
+        for index, slot_error in sorted(slot_errors.items()):
+            errors.append({'index': offset + index, 'slot': chunk[index], 'error': slot_error})
+        indexes = [index for index in indexes if index not in slot_errors]
+        serializer = BatchAvailabilitySlotSerializer(data={'slots': [chunk[index] for index in indexes]})
+        serializer.is_valid(raise_exception=True)
+
+    slots = serializer.validated_data['slots']
+    positions = {id(slot_data): index for slot_data, index in zip(slots, indexes)}
+
+    with transaction.atomic():
+        with collect_slot_changes():
+            result = serializer.create({'user': job.user, 'slots': slots})
+
+        for slot_error in result['errors']:
+            index = positions[id(slot_error['slot'])]
+            errors.append({'index': offset + index, 'slot': chunk[index], 'error': slot_error['error']})
+
+        job.processed = offset + len(chunk)
+        job.created_count += len(result['created_slots'])
+        job.failed_count += len(errors)
+        job.errors.extend(sorted(errors, key=lambda e: e['index'])[:max(MAX_STORED_ERRORS - len(job.errors), 0)])
+        job.save(update_fields=['processed', 'created_count', 'failed_count', 'errors'])
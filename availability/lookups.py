@@ -0,0 +1,76 @@
+"""
+ORM lookups on a slot's ``[date + start_time, date + end_time)`` span:
+
+    AvailabilitySlot.objects.alias(span=SlotSpan()).filter(span__overlaps=(date, start_time, end_time))
+
+On PostgreSQL they compare the generated ``time_range`` tsrange column (migration
+0007) with ``&&`` and ``<@``, which the GiST index behind its exclusion constraint
+serves; other databases compare the date and time columns.
+"""
+from django.db import NotSupportedError
+from django.db.models import F, Field, Func, Lookup
+
+
+class SlotSpanField(Field):
+    """Output field of SlotSpan; it only exists to carry the span lookups"""
+
+
+class SlotSpan(Func):
+    output_field = SlotSpanField()
+
+    def __init__(self):
+        super().__init__(F('date'), F('start_time'), F('end_time'))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        if connection.vendor != 'postgresql':
+            raise NotSupportedError('Slot spans can only be compared through their lookups on this database.')
+        date_column = self.get_source_expressions()[0]
+        return f'{compiler.quote_name_unless_alias(date_column.alias)}.{connection.ops.quote_name("time_range")}', []
+
+
+class SlotSpanLookup(Lookup):
+    """Compares the span with ``(date, start_time, end_time)``"""
+    prepare_rhs = False
+    range_operator = None
+    fallback_template = None
+
+    def as_sql(self, compiler, connection):
+        columns = self.lhs.get_source_expressions()
+        slot_date, start_time, end_time = (
+            column.output_field.get_db_prep_value(value, connection)
+            for column, value in zip(columns, self.rhs)
+        )
+        if connection.vendor == 'postgresql':
+            lhs_sql, lhs_params = compiler.compile(self.lhs)
+            return (
+                f"{lhs_sql} {self.range_operator} tsrange(%s::date + %s::time, %s::date + %s::time, '[)')",
+                (*lhs_params, slot_date, start_time, slot_date, end_time)
+            )
+
+        date_sql, start_sql, end_sql = (compiler.compile(column)[0] for column in columns)
+        return (
+            self.fallback_template.format(date=date_sql, start_time=start_sql, end_time=end_sql),
+            self.fallback_params(slot_date, start_time, end_time)
+        )
+
+
+@SlotSpanField.register_lookup
+class SpanOverlaps(SlotSpanLookup):
+    """Slots sharing any time with the span"""
+    lookup_name = 'overlaps'
+    range_operator = '&&'
+    fallback_template = '({date} = %s AND {start_time} < %s AND {end_time} > %s)'
+
+    def fallback_params(self, slot_date, start_time, end_time):
+        return (slot_date, end_time, start_time)
+
+
+@SlotSpanField.register_lookup
+class SpanWithin(SlotSpanLookup):
+    """Slots entirely contained in the span"""
+    lookup_name = 'within'
+    range_operator = '<@'
+    fallback_template = '({date} = %s AND {start_time} >= %s AND {end_time} <= %s)'
+
+    def fallback_params(self, slot_date, start_time, end_time):
+        return (slot_date, start_time, end_time)
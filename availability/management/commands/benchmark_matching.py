@@ -0,0 +1,141 @@
+import json
+import random
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from availability import sql_sweep
+from availability.matching import (
+    ENGINE_DATABASE,
+    MEMORY_ENGINES,
+    SlotRow,
+    coalesce_windows,
+    iter_common_slots,
+    iter_daily_common_slots,
+    iter_matched_intervals,
+    resolve_min_members,
+)
+from availability.models import AvailabilitySlot
+
+
+def payload_size(slots):
+    return len(json.dumps(slots, cls=JSONEncoder).encode())
+
+
+def _clock(minute):
+    return dt_time(minute // 60, minute % 60)
+
+
+def generate_days(members, days, grid, seed):
+    """Synthetic working-hours availability on a ``grid``-minute raster, no database involved"""
+    rng = random.Random(seed)
+    start_date = date.today()
+    result = []
+    for offset in range(days):
+        rows = []
+        for user_id in range(members):
+            minute = 8 * 60
+            while minute < 18 * 60:
+                length = grid * rng.randint(1, 8)
+                if rng.random() < 0.9:
+                    end = min(minute + length, 18 * 60)
+                    rows.append(SlotRow(user_id, f'user{user_id}', start_date + timedelta(days=offset),
+                                        _clock(minute), _clock(end), 'Disponível'))
+                minute += length
+        result.append((start_date + timedelta(days=offset), rows))
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the common-availability engines on synthetic groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--days', type=int, default=31)
+        parser.add_argument('--grid', type=int, choices=[5, 15, 30], default=15)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--min-members', type=float, default=None,
+                            help='Quorum as a fraction of the group (everyone by default)')
+        parser.add_argument('--database', action='store_true',
+                            help='Also time the SQL engine on the group stored in the database (rolled back)')
+
+    def time_database(self, days, members, required, repeat):
+        """
+        Store the synthetic group (rolled back afterwards), time the SQL engine on it
+        and check its windows against the interval engine's.
+        """
+        with transaction.atomic():
+            prefix = f'benchmark-{uuid.uuid4().hex[:8]}-'
+            users = User.objects.bulk_create([User(username=f'{prefix}{index}') for index in range(members)])
+            days = [
+                (day, [row._replace(user_id=users[row.user_id].id, username=users[row.user_id].username) for row in rows])
+                for day, rows in days
+            ]
+            AvailabilitySlot.objects.bulk_create(
+                [
+                    AvailabilitySlot(user_id=row.user_id, date=row.date, start_time=row.start_time,
+                                     end_time=row.end_time, title=row.title, is_available=True)
+                    for _, rows in days for row in rows
+                ],
+                batch_size=1000
+            )
+            user_ids = [user.id for user in users]
+            dates = [day for day, _ in days]
+
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = list(sql_sweep.iter_database_daily_slots(user_ids, dates, required))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            if result != list(iter_daily_common_slots(days, user_ids, required=required)):
+                raise CommandError(f'Engine "{ENGINE_DATABASE}" disagrees with "{MEMORY_ENGINES[0]}" for {members} members')
+            transaction.set_rollback(True)
+        return best
+
+    def handle(self, *args, **options):
+        if options['database'] and not sql_sweep.is_supported():
+            raise CommandError('The database engine needs PostgreSQL or SQLite.')
+        engines = [*MEMORY_ENGINES, *([ENGINE_DATABASE] if options['database'] else [])]
+
+        self.stdout.write(f"{'members':>8} {'slots':>9} {'matches':>8} " +
+                          ' '.join(f'{engine + " ms":>12}' for engine in engines) +
+                          f" {'windows':>8} {'raw KB':>9} {'merged KB':>10}")
+
+        for members in options['members']:
+            days = generate_days(members, options['days'], options['grid'], options['seed'])
+            user_ids = list(range(members))
+            required = resolve_min_members(options['min_members'], members)
+            timings = {}
+            results = {}
+            for engine in MEMORY_ENGINES:
+                best = None
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    results[engine] = list(iter_matched_intervals(days, user_ids, engine, required))
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[engine] = best
+
+            reference = results[MEMORY_ENGINES[0]]
+            for engine in MEMORY_ENGINES[1:]:
+                if results[engine] != reference:
+                    raise CommandError(f'Engine "{engine}" disagrees with "{MEMORY_ENGINES[0]}" for {members} members')
+
+            if options['database']:
+                timings[ENGINE_DATABASE] = self.time_database(days, members, required, options['repeat'])
+
+            raw = list(iter_common_slots(days, user_ids, required=required))
+            merged = list(coalesce_windows(raw))
+
+            slots = sum(len(rows) for _, rows in days)
+            self.stdout.write(f'{members:>8} {slots:>9} {len(reference):>8} ' +
+                              ' '.join(f'{timings[engine] * 1000:>12.1f}' for engine in engines) +
+                              f' {len(merged):>8} {payload_size(raw) / 1024:>9.1f} {payload_size(merged) / 1024:>10.1f}')
@@ -0,0 +1,118 @@
+import random
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from availability.models import AvailabilitySlot
+
+HOURS_PER_DAY = 10  # hourly slots from 08:00 to 18:00
+
+# Overlap lookups before and after the time_range column; both take (user_id, start, end) timestamps.
+QUERIES = {
+    'btree': (
+        'SELECT id FROM availability_availabilityslot '
+        'WHERE user_id = %s AND date BETWEEN %s::date AND %s::date '
+        'AND date + start_time < %s AND date + end_time > %s'
+    ),
+    'gist': (
+        'SELECT id FROM availability_availabilityslot '
+        "WHERE user_id = %s AND time_range && tsrange(%s, %s, '[)')"
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare query plans and timings of the B-tree and GiST (time_range) overlap lookups '
+        'on a seeded dataset. PostgreSQL only; the seeded rows are rolled back unless --keep'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--keep', action='store_true')
+
+    def seed(self, users, days):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}-'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, '
+                'email, is_staff, is_active, date_joined) '
+                "SELECT '', false, %s || g, '', '', '', false, true, now() "
+                'FROM generate_series(1, %s) g RETURNING id',
+                [prefix, users]
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                'INSERT INTO availability_availabilityslot '
+                '(user_id, date, start_time, end_time, title, is_available) '
+                "SELECT u, %s::date + d, make_time(h, 0, 0), make_time(h + 1, 0, 0), 'Benchmark', true "
+                'FROM unnest(%s::int[]) u, generate_series(0, %s - 1) d, generate_series(8, 7 + %s) h',
+                [date.today(), user_ids, days, HOURS_PER_DAY]
+            )
+            cursor.execute('ANALYZE availability_availabilityslot')
+        return user_ids
+
+    def sample_windows(self, user_ids, days, count):
+        """Random (user, start, end) windows; every fourth one lasts 12 hours and may cross midnight"""
+        rng = random.Random(0)
+        windows = []
+        for index in range(count):
+            start = datetime.combine(date.today() + timedelta(days=rng.randrange(days)), dt_time(rng.randrange(24)))
+            length = timedelta(hours=12) if index % 4 == 0 else timedelta(minutes=90)
+            windows.append((rng.choice(user_ids), start, start + length))
+        return windows
+
+    def params(self, name, window):
+        user_id, start, end = window
+        if name == 'btree':
+            return [user_id, start.date(), end.date(), end, start]
+        return [user_id, start, end]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The time_range column and its GiST index only exist on PostgreSQL.')
+
+        users = options['users']
+        days = max(1, options['slots'] // (users * HOURS_PER_DAY))
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            user_ids = self.seed(users, days)
+            self.stdout.write(
+                f'Seeded {len(user_ids) * days * HOURS_PER_DAY} slots '
+                f'({users} users x {days} days) in {time.perf_counter() - started:.1f}s'
+            )
+            windows = self.sample_windows(user_ids, days, max(1, options['samples']))
+
+            with connection.cursor() as cursor:
+                for name, sql in QUERIES.items():
+                    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', self.params(name, windows[0]))
+                    self.stdout.write(f'\n{name} plan:')
+                    for (line,) in cursor.fetchall():
+                        self.stdout.write(f'  {line}')
+
+                self.stdout.write(f"\n{'lookup':>8} {'samples':>8} {'rows':>8} {'avg ms':>8} {'total ms':>10}")
+                for name, sql in QUERIES.items():
+                    rows = 0
+                    started = time.perf_counter()
+                    for window in windows:
+                        cursor.execute(sql, self.params(name, window))
+                        rows += len(cursor.fetchall())
+                    elapsed = (time.perf_counter() - started) * 1000
+                    self.stdout.write(
+                        f'{name:>8} {len(windows):>8} {rows:>8} {elapsed / len(windows):>8.3f} {elapsed:>10.1f}'
+                    )
+
+            # Shows that the ORM lookup takes the range path on this connection.
+            orm_query = AvailabilitySlot.objects.filter(user_id=user_ids[0]).overlapping(
+                date.today(), dt_time(9), dt_time(10)
+            ).query
+            self.stdout.write(f'\nORM overlapping(): {orm_query}')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
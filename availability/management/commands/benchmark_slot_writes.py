@@ -0,0 +1,58 @@
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from availability.instrumentation import track_queries
+from availability.serializers import BatchAvailabilitySlotSerializer
+from availability.signals import collect_slot_changes
+
+SLOTS_PER_DAY = 20
+
+
+def generate_slots(count, title):
+    """``count`` half-hour slots from 08:00 to 18:00 on consecutive days"""
+    start_date = date.today()
+    return [
+        {
+            'date': start_date + timedelta(days=index // SLOTS_PER_DAY),
+            'start_time': dt_time(8 + (index % SLOTS_PER_DAY) // 2, 30 * (index % 2)),
+            'end_time': dt_time(8 + (index % SLOTS_PER_DAY + 1) // 2, 30 * ((index + 1) % 2)),
+            'title': title,
+            'is_available': True,
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Measure slots/batch_create throughput for inserts and upserts (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, nargs='+', default=[1000, 10000, 100000])
+
+    def run_batch(self, user, slots):
+        serializer = BatchAvailabilitySlotSerializer()
+        with track_queries() as queries:
+            with collect_slot_changes():
+                result = serializer.create({'user': user, 'slots': slots})
+        return result, queries
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'slots':>8} {'pass':>7} {'queries':>8} {'ms':>10} {'slots/s':>10} {'errors':>7}")
+
+        for count in options['slots']:
+            with transaction.atomic():
+                user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+                for label, title in (('insert', 'Disponível'), ('upsert', 'Atualizado')):
+                    started = time.perf_counter()
+                    result, queries = self.run_batch(user, generate_slots(count, title))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{count:>8} {label:>7} {queries.count:>8} {elapsed * 1000:>10.1f} '
+                        f'{count / elapsed:>10.0f} {len(result["errors"]):>7}'
+                    )
+                transaction.set_rollback(True)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from availability.bitmap_store import find_inconsistent_bitmaps, refresh_daily_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Compare the stored daily availability bitmaps with the slots they are derived from'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only check this user id (repeatable)')
+        parser.add_argument('--fix', action='store_true',
+                            help='Refresh every inconsistent bitmap instead of failing')
+
+    def handle(self, *args, **options):
+        inconsistent = list(find_inconsistent_bitmaps(user_ids=options['user_ids']))
+        for user_id, slot_date in inconsistent:
+            self.stdout.write(f'user {user_id} on {slot_date}: bitmap out of date')
+
+        if not inconsistent:
+            self.stdout.write(self.style.SUCCESS('Daily bitmaps are consistent.'))
+        elif options['fix']:
+            refresh_daily_bitmaps(inconsistent)
+            self.stdout.write(self.style.SUCCESS(f'{len(inconsistent)} daily bitmaps refreshed.'))
+        else:
+            raise CommandError(f'{len(inconsistent)} daily bitmaps are inconsistent; rerun with --fix.')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from availability.bitmap_store import refresh_daily_bitmaps
+from availability.overlaps import find_overlapping_days, resolve_overlapping_days
+
+TIME_RANGE_MIGRATION = ('availability', '0007_availabilityslot_time_range')
+
+
+class Command(BaseCommand):
+    help = (
+        'Report days on which a user has overlapping slots, which block migration 0007; '
+        '--fix splits them the way the API does (the newest slot wins)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only check this user id (repeatable)')
+        parser.add_argument('--fix', action='store_true',
+                            help='Split or delete the overlapping slots instead of failing')
+
+    def handle(self, *args, **options):
+        if TIME_RANGE_MIGRATION in MigrationRecorder(connection).applied_migrations():
+            raise CommandError(
+                'Migration 0007 is already applied; this check prepares a database for it.'
+            )
+
+        days = find_overlapping_days(user_ids=options['user_ids'])
+        for (user_id, slot_date), rows in days.items():
+            spans = ', '.join(f'#{slot_id} {start:%H:%M}-{end:%H:%M}' for slot_id, start, end, _, _ in rows)
+            self.stdout.write(f'user {user_id} on {slot_date}: {spans}')
+
+        if not days:
+            self.stdout.write(self.style.SUCCESS('No overlapping slots.'))
+        elif options['fix']:
+            with transaction.atomic():
+                deleted, created = resolve_overlapping_days(days)
+                refresh_daily_bitmaps(days.keys())
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(days)} days fixed: {len(deleted)} slots replaced by {len(created)} fragments.'
+            ))
+        else:
+            raise CommandError(f'{len(days)} days have overlapping slots; review them and rerun with --fix.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from availability.bitmap_store import rebuild_daily_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the per-user daily availability bitmaps from AvailabilitySlot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_bitmaps(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'{written} daily bitmaps written.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from availability.slot_stats import find_inconsistent_slot_stats, rebuild_slot_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the per-user slot stats rollups behind the availability stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild (or check) this user id (repeatable)')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare the rollups with aggregate queries over the slots instead of rebuilding')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            written = rebuild_slot_stats(user_ids=options['user_ids'])
+            self.stdout.write(self.style.SUCCESS(f'{written} slot stats rollups written.'))
+            return
+
+        inconsistent = list(find_inconsistent_slot_stats(user_ids=options['user_ids']))
+        for user_id in inconsistent:
+            self.stdout.write(f'user {user_id}: slot stats rollup out of date')
+        if inconsistent:
+            raise CommandError(f'{len(inconsistent)} slot stats rollups are inconsistent; rerun without --check.')
+        self.stdout.write(self.style.SUCCESS('Slot stats rollups are consistent.'))
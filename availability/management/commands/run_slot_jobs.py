@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from availability.jobs import requeue_interrupted_jobs, run_job
+from availability.models import SlotImportJob
+
+
+class Command(BaseCommand):
+    help = 'Run pending background slot imports, e.g. after a restart left some unfinished'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue', action='store_true',
+                            help='First return jobs stuck in "running" (their process stopped) to pending')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also return failed jobs to pending; they resume after their last committed chunk')
+
+    def handle(self, *args, **options):
+        if options['requeue'] or options['retry_failed']:
+            requeued = requeue_interrupted_jobs(include_failed=options['retry_failed'])
+            self.stdout.write(f'{requeued} interrupted jobs requeued.')
+
+        pending = SlotImportJob.objects.filter(status=SlotImportJob.PENDING).order_by('id').values_list('id', flat=True)
+        for job_id in list(pending):
+            try:
+                run_job(job_id)
+            except Exception as e:
+                self.stderr.write(f'Job {job_id} failed: {e}')
+                continue
+            job = SlotImportJob.objects.get(pk=job_id)
+            self.stdout.write(f'Job {job_id}: {job.created_count} slots created, {job.failed_count} failed.')
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+
+from .models import SlotChange
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def is_enabled():
+    return bool(settings.AVAILABILITY_MATCH_CACHE)
+
+
+def _cache():
+    return caches[settings.AVAILABILITY_MATCH_CACHE]
+
+
+def _day_versions(user_ids, dates):
+    """
+    ``{date: ((user_id, sequence), ...)}``: the head of each member's change log on
+    each date (0 if they never wrote it), read in one query. Every slot or series
+    write appends an entry for the day it touches, and compaction keeps the latest
+    entry of each day, so a day's head only ever moves forward.
+    """
+    heads = {
+        (user_id, day): sequence
+        for user_id, day, sequence in SlotChange.objects.filter(
+            user_id__in=user_ids,
+            date__range=(min(dates), max(dates))
+        ).values('user_id', 'date').annotate(head=Max('sequence')).values_list('user_id', 'date', 'head')
+    }
+    return {day: tuple((user_id, heads.get((user_id, day), 0)) for user_id in user_ids) for day in dates}
+
+
+def _record(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+
+def get_stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def lookup(group, user_ids, dates, options):
+    """
+    Fetch cached per-day results for a group. Returns ``(cached, keys)`` where
+    ``cached`` maps each cached date to its list of common slots and ``keys`` maps
+    every requested date to the entry key its fresh result should be stored under.
+
+    Entry keys embed versions read from the database: the group's (bumped on any
+    membership change or member rename) and each member's change log head on that
+    day. A write anywhere moves the versions every process reads, so no process
+    can serve a result built from older data; the TTL only bounds memory.
+    """
+    options_hash = hashlib.md5(
+        ','.join(f'{name}={options[name]}' for name in sorted(options)).encode()
+    ).hexdigest()
+    keys = {
+        day: 'match:{}:{}:{}:{}:{}'.format(
+            group.id,
+            day.isoformat(),
+            group.version,
+            hashlib.md5(repr(versions).encode()).hexdigest(),
+            options_hash,
+        )
+        for day, versions in _day_versions(user_ids, dates).items()
+    }
+
+    found = _cache().get_many(keys.values())
+    cached = {day: found[key] for day, key in keys.items() if key in found}
+    _record(len(cached), len(keys) - len(cached))
+    return cached, keys
+
+
+def store(keys, results):
+    _cache().set_many({keys[day]: slots for day, slots in results.items()})
@@ -0,0 +1,267 @@
+import heapq
+import math
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import attrgetter, itemgetter
+
+from .bitmaps import iter_bitmap_intervals
+from .recurrence import occurrences_by_date
+
+_START = 0
+_END = 1
+
+ENGINE_INTERVAL = 'interval'
+ENGINE_BITMAP = 'bitmap'
+ENGINE_DATABASE = 'database'
+# Engines that run over rows already fetched into Python; 'database' runs the sweep in SQL (see sql_sweep).
+MEMORY_ENGINES = [ENGINE_INTERVAL, ENGINE_BITMAP]
+ENGINES = [*MEMORY_ENGINES, ENGINE_DATABASE]
+
+RANK_EARLIEST = 'earliest'
+RANK_LONGEST = 'longest'
+RANK_MOST_ATTENDEES = 'most_attendees'
+RANKINGS = [RANK_EARLIEST, RANK_LONGEST, RANK_MOST_ATTENDEES]
+
+SlotRow = namedtuple('SlotRow', ['user_id', 'username', 'date', 'start_time', 'end_time', 'title'])
+
+# Usernames are joined in so that hydrating match results never needs a User lookup.
+SLOT_ROW_FIELDS = ('user_id', 'user__username', 'date', 'start_time', 'end_time', 'title')
+
+
+def fetch_slot_rows(queryset):
+    """Evaluate an AvailabilitySlot queryset into SlotRow tuples with a single query"""
+    return [
+        SlotRow(*values)
+        for values in queryset.order_by('id').values_list(*SLOT_ROW_FIELDS)
+    ]
+
+
+def fetch_occurrence_rows(user_ids, start_date, end_date, available_only=False):
+    """``{date: [SlotRow, ...]}`` for the recurring-series occurrences of ``user_ids`` in the range"""
+    return {
+        slot_date: [
+            SlotRow(slot.user_id, slot.user.username, slot.date, slot.start_time, slot.end_time, slot.title)
+            for slot in occurrences
+        ]
+        for slot_date, occurrences in occurrences_by_date(user_ids, start_date, end_date, available_only).items()
+    }
+
+
+def iter_slot_rows_by_date(queryset, start_date, end_date, only_dates=None, extra_rows=None):
+    """
+    Fetch every slot in ``[start_date, end_date]`` with one ordered query and yield
+    ``(date, rows)`` for each day of the range, including days without slots.
+
+    Rows are streamed through ``.iterator()`` and split by date in memory, so only
+    one day's rows are held at a time. When ``only_dates`` is given, rows of other
+    days are not fetched at all and those days come back empty. ``extra_rows``
+    (``{date: rows}``, e.g. series occurrences) are appended to their day.
+    """
+    extra_rows = extra_rows or {}
+    queryset = queryset.filter(date__range=(start_date, end_date))
+    if only_dates is not None:
+        queryset = queryset.filter(date__in=only_dates) if only_dates else queryset.none()
+    values = queryset.order_by('date', 'id').values_list(*SLOT_ROW_FIELDS).iterator()
+
+    current_date = start_date
+    for slot_date, day_rows in groupby((SlotRow(*row) for row in values), key=attrgetter('date')):
+        while current_date < slot_date:
+            yield current_date, list(extra_rows.get(current_date, ()))
+            current_date += timedelta(days=1)
+        yield slot_date, [*day_rows, *extra_rows.get(slot_date, ())]
+        current_date = slot_date + timedelta(days=1)
+
+    while current_date <= end_date:
+        yield current_date, list(extra_rows.get(current_date, ()))
+        current_date += timedelta(days=1)
+
+
+def resolve_min_members(min_members, member_count):
+    """Turn a ``min_members`` count or fraction into a member count (``None`` means everyone)"""
+    if min_members is None:
+        return member_count
+    if isinstance(min_members, float):
+        return max(1, math.ceil(min_members * member_count - 1e-9))
+    return min_members
+
+
+def iter_common_intervals(slots, user_ids, required=None):
+    """
+    Sweep-line search for the intervals where at least ``required`` users in
+    ``user_ids`` (all of them by default) are available.
+
+    ``slots`` is any iterable of objects exposing ``user_id``, ``start_time`` and
+    ``end_time`` (model instances or lightweight rows). Start/end events are sorted
+    once and walked with a running count of covered users, so a day costs
+    O(S log S) instead of scanning every user's slot list for every interval.
+
+    Yields ``(start_time, end_time, covering)`` for each elementary interval, where
+    ``covering`` holds one slot per available user in ``user_ids`` order: the
+    earliest slot (in input order) of that user that spans the interval.
+    """
+    user_ids = list(user_ids)
+    wanted = set(user_ids)
+
+    events = []
+    users_with_slots = set()
+    for index, slot in enumerate(slots):
+        if slot.user_id not in wanted:
+            continue
+        users_with_slots.add(slot.user_id)
+        events.append((slot.start_time, _START, index, slot))
+        events.append((slot.end_time, _END, index, slot))
+
+    # Matching only makes sense when at least two people have slots that day.
+    if len(users_with_slots) < 2:
+        return
+
+    events.sort(key=itemgetter(0, 1))
+
+    active = defaultdict(dict)
+    covered = 0
+    needed = len(user_ids) if required is None else required
+    position = 0
+    total = len(events)
+
+    while position < total:
+        point = events[position][0]
+        while position < total and events[position][0] == point:
+            _, kind, index, slot = events[position]
+            user_active = active[slot.user_id]
+            if kind == _START:
+                if not user_active:
+                    covered += 1
+                user_active[index] = slot
+            else:
+                del user_active[index]
+                if not user_active:
+                    covered -= 1
+            position += 1
+
+        if covered >= needed and position < total:
+            covering = [
+                active[uid][min(active[uid])]
+                for uid in user_ids
+                if active[uid]
+            ]
+            yield point, events[position][0], covering
+
+
+def iter_matched_intervals(days, user_ids, engine=ENGINE_INTERVAL, required=None):
+    """Yield ``(date, start_time, end_time, covering)`` for ``(date, rows)`` days using the chosen engine"""
+    if engine == ENGINE_BITMAP:
+        yield from iter_bitmap_intervals(days, user_ids, fallback=iter_common_intervals, required=required)
+        return
+
+    for day, rows in days:
+        for interval_start, interval_end, covering in iter_common_intervals(rows, user_ids, required):
+            yield day, interval_start, interval_end, covering
+
+
+def iter_common_slots(days, user_ids, engine=ENGINE_INTERVAL, required=None):
+    """Build the common availability payload from pre-fetched ``(date, rows)`` days"""
+    for day, interval_start, interval_end, covering in iter_matched_intervals(days, user_ids, engine, required):
+        yield {
+            'date': day,
+            'start_time': interval_start,
+            'end_time': interval_end,
+            'users': [
+                {'username': row.username, 'title': row.title}
+                for row in covering
+            ],
+        }
+
+
+def iter_daily_common_slots(days, user_ids, engine=ENGINE_INTERVAL, required=None):
+    """Yield ``(date, common slots)`` for every ``(date, rows)`` day, in order"""
+    if engine == ENGINE_BITMAP:
+        # The bitmap engine reduces all days at once, so they are materialised here.
+        days = list(days)
+        by_day = defaultdict(list)
+        for slot in iter_common_slots(days, user_ids, engine, required):
+            by_day[slot['date']].append(slot)
+        for day, _ in days:
+            yield day, by_day[day]
+        return
+
+    for day, rows in days:
+        yield day, list(iter_common_slots([(day, rows)], user_ids, engine, required))
+
+
+def coalesce_windows(slots):
+    """
+    Merge touching windows of the same day whose participants (usernames and slot
+    titles) are identical. The sweep splits at every member's slot boundary, so a
+    continuous window often arrives as several fragments; ``slots`` must be in
+    chronological order and is consumed lazily.
+    """
+    pending = None
+    for slot in slots:
+        if (
+            pending is not None
+            and slot['date'] == pending['date']
+            and slot['start_time'] == pending['end_time']
+            and slot['users'] == pending['users']
+        ):
+            pending = {**pending, 'end_time': slot['end_time']}
+            continue
+        if pending is not None:
+            yield pending
+        pending = slot
+    if pending is not None:
+        yield pending
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+
+
+def window_minutes(slot):
+    return (_seconds(slot['end_time']) - _seconds(slot['start_time'])) / 60
+
+
+def iter_earliest_windows(slots, duration_minutes=None, limit=None):
+    """Lazily yield the first ``limit`` chronological windows lasting at least ``duration_minutes``"""
+    if duration_minutes:
+        slots = (slot for slot in slots if window_minutes(slot) >= duration_minutes)
+    return slots if limit is None else islice(slots, limit)
+
+
+def select_windows(slots, duration_minutes=None, limit=None, rank=RANK_EARLIEST, max_attendees=None):
+    """
+    Keep the windows lasting at least ``duration_minutes`` and return the best
+    ``limit`` of them by ``rank`` (all of them when ``limit`` is omitted).
+
+    ``slots`` must arrive in chronological order and is consumed lazily. 'earliest'
+    stops after ``limit`` windows; the other rankings keep a bounded heap, and
+    'most_attendees' stops as soon as the heap is full of windows where all
+    ``max_attendees`` members are free, since nothing later can beat them. Ties
+    are broken by the earlier window.
+    """
+    if rank == RANK_EARLIEST:
+        return list(iter_earliest_windows(slots, duration_minutes, limit))
+
+    if duration_minutes:
+        slots = (slot for slot in slots if window_minutes(slot) >= duration_minutes)
+
+    if rank == RANK_LONGEST:
+        score, best_possible = window_minutes, None
+    else:
+        score, best_possible = (lambda slot: len(slot['users'])), max_attendees
+
+    if limit is None:
+        return sorted(slots, key=score, reverse=True)
+
+    heap = []
+    for order, slot in enumerate(slots):
+        entry = (score(slot), -order, slot)
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+        if len(heap) == limit and best_possible is not None and heap[0][0] >= best_possible:
+            break
+
+    return [slot for _, _, slot in sorted(heap, key=itemgetter(0, 1), reverse=True)]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+from itertools import groupby
+from operator import itemgetter
+
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+
+MINUTES_PER_DAY = 24 * 60
+BATCH_SIZE = 1000
+
+
+def rasterize(intervals):
+    """Packed 1440-bit day vector of ``(start_time, end_time)`` pairs, partial minutes rounded outwards"""
+    delta = np.zeros(MINUTES_PER_DAY + 1, dtype=np.int32)
+    for start_time, end_time in intervals:
+        delta[start_time.hour * 60 + start_time.minute] += 1
+        delta[end_time.hour * 60 + end_time.minute + bool(end_time.second or end_time.microsecond)] -= 1
+    return np.packbits(np.cumsum(delta)[:MINUTES_PER_DAY] > 0).tobytes()
+
+
+def backfill_daily_bitmaps(apps, schema_editor):
+    slot_model = apps.get_model('availability', 'AvailabilitySlot')
+    bitmap_model = apps.get_model('availability', 'DailyAvailabilityBitmap')
+
+    values = slot_model.objects.order_by('user_id', 'date').values_list(
+        'user_id', 'date', 'start_time', 'end_time', 'is_available'
+    ).iterator()
+    batch = []
+    for (user_id, slot_date), day_rows in groupby(values, key=itemgetter(0, 1)):
+        rows = [row[2:] for row in day_rows]
+        batch.append(bitmap_model(
+            user_id=user_id,
+            date=slot_date,
+            scheduled_bits=rasterize((start, end) for start, end, _ in rows),
+            available_bits=rasterize((start, end) for start, end, available in rows if available),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            bitmap_model.objects.bulk_create(batch)
+            batch = []
+    bitmap_model.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0003_availabilityslot_is_available'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailabilityBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled_bits', models.BinaryField()),
+                ('available_bits', models.BinaryField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_bitmaps, migrations.RunPython.noop),
+    ]
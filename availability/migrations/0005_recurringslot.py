@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0004_dailyavailabilitybitmap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('repeat_type', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('specific_days', 'Specific days')], max_length=20)),
+                ('weekdays', models.JSONField(blank=True, default=list)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('title', models.CharField(default='', max_length=100)),
+                ('is_available', models.BooleanField(default=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurringSlotOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('cancelled', models.BooleanField(default=False)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('title', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_available', models.BooleanField(blank=True, null=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='availability.recurringslot')),
+            ],
+            options={
+                'unique_together': {('series', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations
+
+TABLE = 'availability_availabilityslot'
+CONSTRAINT = 'availabilityslot_no_user_overlap'
+
+
+def count_overlapping_days(slot_model):
+    """Number of (user, date) days on which the user's slots overlap"""
+    values = slot_model.objects.order_by('user_id', 'date', 'start_time').values_list(
+        'user_id', 'date', 'start_time', 'end_time'
+    ).iterator()
+
+    count = 0
+    for _, day_rows in groupby(values, key=itemgetter(0, 1)):
+        latest_end = None
+        for _, _, start_time, end_time in day_rows:
+            if latest_end is not None and start_time < latest_end:
+                count += 1
+                break
+            latest_end = end_time if latest_end is None else max(latest_end, end_time)
+    return count
+
+
+def add_time_range(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    # Existing overlaps are resolved by a separate, reviewed step rather than here.
+    overlapping = count_overlapping_days(apps.get_model('availability', 'AvailabilitySlot'))
+    if overlapping:
+        raise RuntimeError(
+            f'{overlapping} user days have overlapping slots, which the exclusion constraint added by '
+            'this migration does not allow. Review them with `python manage.py check_slot_overlaps`, '
+            'resolve them with `--fix` (or by hand), then run migrate again.'
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f'ALTER TABLE {TABLE} ADD COLUMN time_range tsrange '
+        f"GENERATED ALWAYS AS (tsrange(date + start_time, date + end_time, '[)')) STORED"
+    )
+    # The constraint's GiST index on (user_id, time_range) also serves the range lookups.
+    schema_editor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {CONSTRAINT} '
+        f'EXCLUDE USING gist (user_id WITH =, time_range WITH &&)'
+    )
+
+
+def remove_time_range(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {CONSTRAINT}')
+    schema_editor.execute(f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS time_range')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0006_slotimportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_time_range, remove_time_range),
+    ]
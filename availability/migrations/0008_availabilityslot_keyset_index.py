@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0007_availabilityslot_time_range'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availabilityslot',
+            index=models.Index(fields=['user', 'date', 'start_time', 'id'], name='availability_slot_keyset_idx'),
+        ),
+    ]
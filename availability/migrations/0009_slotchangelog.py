@@ -0,0 +1,126 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:32
+
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def fingerprint(start_time, end_time, is_available, title):
+    raw = f'{start_time.isoformat()}|{end_time.isoformat()}|{int(is_available)}|{title}'
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def series_dates(series):
+    step = 7 if series.repeat_type == 'weekly' else 1
+    current = series.start_date
+    while current <= series.end_date:
+        if series.repeat_type != 'specific_days' or current.weekday() in series.weekdays:
+            yield current
+        current += timedelta(days=step)
+
+
+def occurrence_entries(series_model, override_model):
+    """``{(user_id, date): [(log key, fingerprint), ...]}`` of every series occurrence"""
+    overrides = defaultdict(dict)
+    for override in override_model.objects.iterator():
+        overrides[override.series_id][override.date] = override
+
+    entries = defaultdict(list)
+    for series in series_model.objects.order_by('id').iterator():
+        for occurrence_date in series_dates(series):
+            override = overrides[series.id].get(occurrence_date)
+            if override is not None and override.cancelled:
+                continue
+            values = [series.start_time, series.end_time, series.is_available, series.title]
+            if override is not None:
+                overridden = (override.start_time, override.end_time, override.is_available, override.title)
+                values = [value if new is None else new for value, new in zip(values, overridden)]
+            entries[series.user_id, occurrence_date].append((f'series:{series.id}', fingerprint(*values)))
+    return entries
+
+
+def iter_days(values, occurrences):
+    """Merge slot rows ordered by ``(user_id, date)`` with the occurrence entries, one item per day"""
+    for pair, day_rows in groupby(values, key=itemgetter(0, 1)):
+        yield pair, [(f'slot:{row[2]}', fingerprint(*row[3:])) for row in day_rows] + occurrences.pop(pair, [])
+    yield from occurrences.items()
+
+
+def backfill_change_log(apps, schema_editor):
+    """
+    Start every user's log with one entry per non-empty day, so that the first
+    write to an existing day has a snapshot to be diffed against. No cursor was
+    handed out before, so the logs start compacted.
+    """
+    slot_model = apps.get_model('availability', 'AvailabilitySlot')
+    change_model = apps.get_model('availability', 'SlotChange')
+    log_model = apps.get_model('availability', 'SlotChangeLog')
+
+    occurrences = occurrence_entries(
+        apps.get_model('availability', 'RecurringSlot'),
+        apps.get_model('availability', 'RecurringSlotOverride'),
+    )
+    values = slot_model.objects.order_by('user_id', 'date').values_list(
+        'user_id', 'date', 'id', 'start_time', 'end_time', 'is_available', 'title'
+    ).iterator()
+
+    sequences = defaultdict(int)
+    batch = []
+    for (user_id, slot_date), day_slots in iter_days(values, occurrences):
+        sequences[user_id] += 1
+        batch.append(change_model(user_id=user_id, sequence=sequences[user_id], date=slot_date, slots=dict(day_slots)))
+        if len(batch) >= BATCH_SIZE:
+            change_model.objects.bulk_create(batch)
+            batch = []
+    change_model.objects.bulk_create(batch)
+
+    log_model.objects.bulk_create(
+        [
+            log_model(user_id=user_id, last_sequence=sequence, compacted_through=sequence)
+            for user_id, sequence in sequences.items()
+        ],
+        batch_size=BATCH_SIZE
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0008_availabilityslot_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sequence', models.PositiveBigIntegerField(default=0)),
+                ('compacted_through', models.PositiveBigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='slot_change_log', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SlotChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('date', models.DateField()),
+                ('slots', models.JSONField(default=dict)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date', 'sequence'], name='availability_change_date_idx')],
+                'unique_together': {('user', 'sequence')},
+            },
+        ),
+        migrations.RunPython(backfill_change_log, migrations.RunPython.noop),
+    ]
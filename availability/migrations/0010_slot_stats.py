@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:47
+
+import availability.models
+import datetime
+import django.db.models.deletion
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def series_dates(series):
+    step = 7 if series.repeat_type == 'weekly' else 1
+    current = series.start_date
+    while current <= series.end_date:
+        if series.repeat_type != 'specific_days' or current.weekday() in series.weekdays:
+            yield current
+        current += datetime.timedelta(days=step)
+
+
+def occurrence_times(series_model, override_model):
+    """``{(user_id, date): [(start_time, end_time), ...]}`` of every series occurrence"""
+    overrides = defaultdict(dict)
+    for override in override_model.objects.iterator():
+        overrides[override.series_id][override.date] = override
+
+    times = defaultdict(list)
+    for series in series_model.objects.order_by('id').iterator():
+        for occurrence_date in series_dates(series):
+            override = overrides[series.id].get(occurrence_date)
+            if override is not None and override.cancelled:
+                continue
+            times[series.user_id, occurrence_date].append((
+                series.start_time if override is None or override.start_time is None else override.start_time,
+                series.end_time if override is None or override.end_time is None else override.end_time,
+            ))
+    return times
+
+
+def iter_days(values, occurrences):
+    """Merge slot rows ordered by ``(user_id, date)`` with the occurrence times, one item per day"""
+    for pair, day_rows in groupby(values, key=itemgetter(0, 1)):
+        yield pair, [row[2:] for row in day_rows] + occurrences.pop(pair, [])
+    yield from occurrences.items()
+
+
+def backfill_slot_stats(apps, schema_editor):
+    slot_model = apps.get_model('availability', 'AvailabilitySlot')
+    day_model = apps.get_model('availability', 'DailySlotStats')
+    stats_model = apps.get_model('availability', 'UserSlotStats')
+
+    occurrences = occurrence_times(
+        apps.get_model('availability', 'RecurringSlot'),
+        apps.get_model('availability', 'RecurringSlotOverride'),
+    )
+    values = slot_model.objects.order_by('user_id', 'date').values_list(
+        'user_id', 'date', 'start_time', 'end_time'
+    ).iterator()
+
+    stats_by_user = {}
+    batch = []
+    for (user_id, slot_date), rows in iter_days(values, occurrences):
+        hour_counts = [0] * 24
+        total = datetime.timedelta()
+        for start_time, end_time in rows:
+            hour_counts[start_time.hour] += 1
+            total += datetime.datetime.combine(slot_date, end_time) - datetime.datetime.combine(slot_date, start_time)
+        batch.append(day_model(
+            user_id=user_id, date=slot_date, slot_count=len(rows), total_duration=total, hour_counts=hour_counts
+        ))
+
+        stats = stats_by_user.setdefault(user_id, stats_model(
+            user_id=user_id, total_duration=datetime.timedelta(), hour_counts=[0] * 24, weekday_counts=[0] * 7
+        ))
+        stats.slot_count += len(rows)
+        stats.total_duration += total
+        stats.hour_counts = [stored + count for stored, count in zip(stats.hour_counts, hour_counts)]
+        # Index 0 is Sunday, like ExtractWeekDay - 1.
+        stats.weekday_counts[slot_date.isoweekday() % 7] += len(rows)
+
+        if len(batch) >= BATCH_SIZE:
+            day_model.objects.bulk_create(batch)
+            batch = []
+    day_model.objects.bulk_create(batch)
+    stats_model.objects.bulk_create(stats_by_user.values(), batch_size=BATCH_SIZE)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0009_slotchangelog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSlotStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_count', models.PositiveBigIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('hour_counts', models.JSONField(default=availability.models._zero_hours)),
+                ('weekday_counts', models.JSONField(default=availability.models._zero_weekdays)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='slot_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySlotStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slot_count', models.PositiveIntegerField()),
+                ('total_duration', models.DurationField()),
+                ('hour_counts', models.JSONField(default=availability.models._zero_hours)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_slot_stats, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,34 @@
+from datetime import timedelta
+from functools import reduce
+
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 
+from .lookups import SlotSpan
+
 # Create your models here.
 
+class AvailabilitySlotQuerySet(models.QuerySet):
+    """Range filters on the slots' spans through the lookups in availability.lookups"""
+
+    def with_span(self):
+        return self.alias(span=SlotSpan())
+
+    def overlapping(self, date, start_time, end_time):
+        """Slots sharing any time with ``[start_time, end_time)`` on ``date``"""
+        return self.with_span().filter(span__overlaps=(date, start_time, end_time))
+
+    def overlapping_any(self, spans):
+        """Slots sharing any time with one of the ``(date, start_time, end_time)`` spans"""
+        return self.with_span().filter(
+            reduce(lambda combined, span: combined | Q(span__overlaps=span), spans, Q(pk__in=[]))
+        )
+
+    def within(self, date, start_time, end_time):
+        """Slots entirely contained in ``[start_time, end_time]`` on ``date``"""
+        return self.with_span().filter(span__within=(date, start_time, end_time))
+
 class AvailabilitySlot(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField()
@@ -11,8 +37,184 @@ class AvailabilitySlot(models.Model):
     title = models.CharField(max_length=100, default='')
     is_available = models.BooleanField(default=True)
 
+    objects = AvailabilitySlotQuerySet.as_manager()
+
+    # Set on the unsaved instances expanded from a RecurringSlot.
+    series_id = None
+
     def __str__(self):
         return f"{self.user.username} - {self.date} {self.start_time} to {self.end_time}"
 
     class Meta:
         unique_together = ['user', 'date', 'start_time', 'end_time']
+        indexes = [
+            # Keyset pagination order of the slot list.
+            models.Index(fields=['user', 'date', 'start_time', 'id'], name='availability_slot_keyset_idx'),
+        ]
+
+class DailyAvailabilityBitmap(models.Model):
+    """
+    Minute-resolution summary of one user's slots on one day, derived from
+    AvailabilitySlot and RecurringSlot occurrences and kept in sync by
+    availability.signals.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    scheduled_bits = models.BinaryField()
+    available_bits = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+
+    class Meta:
+        unique_together = ['user', 'date']
+
+class RecurringSlot(models.Model):
+    """
+    A slot repeating from ``start_date`` until ``end_date``. Occurrences are never
+    stored; availability.recurrence expands them inside the queried window and
+    applies the series' overrides.
+    """
+    REPEAT_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('specific_days', 'Specific days'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    repeat_type = models.CharField(max_length=20, choices=REPEAT_CHOICES)
+    weekdays = models.JSONField(default=list, blank=True)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    title = models.CharField(max_length=100, default='')
+    is_available = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.repeat_type} {self.start_date} to {self.end_date} {self.start_time}-{self.end_time}"
+
+class RecurringSlotOverride(models.Model):
+    """
+    Replaces the fields that are set (or, when ``cancelled``, removes) one
+    occurrence of a RecurringSlot.
+    """
+    series = models.ForeignKey(RecurringSlot, on_delete=models.CASCADE, related_name='overrides')
+    date = models.DateField()
+    cancelled = models.BooleanField(default=False)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    title = models.CharField(max_length=100, null=True, blank=True)
+    is_available = models.BooleanField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.series_id} - {self.date}"
+
+    class Meta:
+        unique_together = ['series', 'date']
+
+class SlotImportJob(models.Model):
+    """
+    A batch_create submitted in background mode. The submitted slots are kept in
+    ``payload`` and processed in chunks by availability.jobs; ``processed`` counts
+    the entries already committed, so an interrupted job resumes where it stopped.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    payload = models.JSONField()
+    total = models.PositiveIntegerField()
+    processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.status} {self.processed}/{self.total}"
+
+class SlotChangeLog(models.Model):
+    """
+    Per-user head of the slot change log: the last sequence number handed out and
+    the sequence up to which older entries have been compacted.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='slot_change_log')
+    last_sequence = models.PositiveBigIntegerField(default=0)
+    compacted_through = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.last_sequence}"
+
+class SlotChange(models.Model):
+    """
+    One entry of a user's slot change log: the slots (stored ones and series
+    occurrences) present on ``date`` after a write, as ``{key: fingerprint}``.
+    Deltas are computed by diffing these snapshots (see availability.change_log).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    sequence = models.PositiveBigIntegerField()
+    date = models.DateField()
+    slots = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.sequence} {self.date}"
+
+    class Meta:
+        unique_together = ['user', 'sequence']
+        indexes = [
+            models.Index(fields=['user', 'date', 'sequence'], name='availability_change_date_idx'),
+        ]
+
+def _zero_hours():
+    return [0] * 24
+
+
+def _zero_weekdays():
+    return [0] * 7
+
+
+class DailySlotStats(models.Model):
+    """
+    One user-day's share of their UserSlotStats: the number of slots (stored ones
+    and series occurrences), their total duration and the start hour histogram.
+    Kept so a write to that day can subtract the old share before adding the new.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    slot_count = models.PositiveIntegerField()
+    total_duration = models.DurationField()
+    hour_counts = models.JSONField(default=_zero_hours)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+
+    class Meta:
+        unique_together = ['user', 'date']
+
+class UserSlotStats(models.Model):
+    """
+    Rollup of all of a user's slots behind the availability stats, updated
+    incrementally from DailySlotStats by availability.signals. ``weekday_counts``
+    starts on Sunday, like ExtractWeekDay.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='slot_stats')
+    slot_count = models.PositiveBigIntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+    hour_counts = models.JSONField(default=_zero_hours)
+    weekday_counts = models.JSONField(default=_zero_weekdays)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.slot_count} slots"
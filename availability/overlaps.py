@@ -0,0 +1,121 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connection
+
+from .models import AvailabilitySlot
+
+# Span conditions OR-ed per query; SQLite caps expression depth at 1000.
+SPAN_CHUNK_SIZE = 500
+
+
+def overlapping_slots(user, spans):
+    """The user's one-off slots overlapping any of the ``(date, start_time, end_time)`` spans"""
+    spans = sorted(set(spans))
+    found = {}
+    for offset in range(0, len(spans), SPAN_CHUNK_SIZE):
+        for slot in AvailabilitySlot.objects.filter(user=user).overlapping_any(spans[offset:offset + SPAN_CHUNK_SIZE]):
+            found[slot.pk] = slot
+    return list(found.values())
+
+
+def subtract_spans(start_time, end_time, spans):
+    """The parts of ``[start_time, end_time)`` not covered by any ``(start, end)`` of ``spans``"""
+    remaining = []
+    for start, end in sorted(spans):
+        if end <= start_time or start >= end_time:
+            continue
+        if start > start_time:
+            remaining.append((start_time, start))
+        start_time = max(start_time, end)
+        if start_time >= end_time:
+            return remaining
+    remaining.append((start_time, end_time))
+    return remaining
+
+
+def _replay_day(rows):
+    """
+    Replay one user's day in creation order with the API's rule: a newer slot
+    replaces the part of any older slot it overlaps. Returns the rows to keep
+    (saved ones keep their id, fragments have ``None``).
+    """
+    kept = []
+    for row in rows:
+        _, start_time, end_time, title, is_available = row
+        remaining = []
+        for slot in kept:
+            if slot[1] < end_time and slot[2] > start_time:
+                remaining.extend(
+                    (None, start, end, slot[3], slot[4])
+                    for start, end in subtract_spans(slot[1], slot[2], [(start_time, end_time)])
+                )
+            else:
+                remaining.append(slot)
+        remaining.append(row)
+        kept = remaining
+    return kept
+
+
+def find_overlapping_days(user_ids=None):
+    """``{(user_id, date): rows}`` of the days on which a user's stored slots overlap"""
+    slots = AvailabilitySlot.objects.all()
+    if user_ids:
+        slots = slots.filter(user_id__in=user_ids)
+    values = slots.order_by('user_id', 'date', 'start_time', 'id').values_list(
+        'user_id', 'date', 'id', 'start_time', 'end_time', 'title', 'is_available'
+    ).iterator()
+
+    days = {}
+    for key, day_rows in groupby(values, key=itemgetter(0, 1)):
+        rows = [row[2:] for row in day_rows]
+        latest_end = None
+        for row in rows:
+            if latest_end is not None and row[1] < latest_end:
+                days[key] = rows
+                break
+            latest_end = row[2] if latest_end is None else max(latest_end, row[2])
+    return days
+
+
+def resolve_overlapping_days(days):
+    """
+    Split or delete the overlapping slots of ``days`` (as returned by
+    find_overlapping_days), newest slot first, and return the ids deleted and the
+    fragments created. The rows are written without signals, since this runs
+    before migration 0007 when later derived tables may not exist yet; the caller
+    refreshes what it needs.
+    """
+    deleted = []
+    created = []
+    for (user_id, slot_date), rows in days.items():
+        kept = _replay_day(sorted(rows, key=itemgetter(0)))
+        kept_ids = {row[0] for row in kept if row[0] is not None}
+        taken = {(row[1], row[2]) for row in kept if row[0] is not None}
+        deleted.extend(row[0] for row in rows if row[0] not in kept_ids)
+        for slot_id, start_time, end_time, title, is_available in kept:
+            if slot_id is None and (start_time, end_time) not in taken:
+                taken.add((start_time, end_time))
+                created.append(AvailabilitySlot(
+                    user_id=user_id,
+                    date=slot_date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    title=title,
+                    is_available=is_available
+                ))
+
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for offset in range(0, len(deleted), SPAN_CHUNK_SIZE):
+            chunk = deleted[offset:offset + SPAN_CHUNK_SIZE]
+            cursor.execute(
+                'DELETE FROM {table} WHERE {id} IN ({ids})'.format(
+                    table=qn(AvailabilitySlot._meta.db_table),
+                    id=qn(AvailabilitySlot._meta.pk.column),
+                    ids=', '.join(['%s'] * len(chunk)),
+                ),
+                chunk
+            )
+    AvailabilitySlot.objects.bulk_create(created, batch_size=1000)
+    return deleted, created
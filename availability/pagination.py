@@ -0,0 +1,107 @@
+import base64
+import binascii
+import heapq
+from datetime import date, time
+from itertools import islice
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+_STORED = 0
+_OCCURRENCE = 1
+
+
+def slot_sort_key(slot):
+    """
+    ``(date, start_time, kind, id)`` ordering of the slot list. Series occurrences
+    have no id, so they follow the stored slots that start at the same time and are
+    ordered by series id.
+    """
+    if slot.series_id is None:
+        return slot.date, slot.start_time, _STORED, slot.id
+    return slot.date, slot.start_time, _OCCURRENCE, slot.series_id
+
+
+class SlotKeysetPagination(BasePagination):
+    """
+    Keyset pagination for the slot list. The cursor is the sort key of the last
+    slot returned, so each page is an index range scan on (user, date, start_time,
+    id) that costs the same however much history precedes it, and series
+    occurrences are merged in lazily from the cursor date onwards.
+    """
+    page_size = 500
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, key):
+        slot_date, start_time, kind, ident = key
+        raw = f'{slot_date.isoformat()}|{start_time.isoformat()}|{kind}|{ident}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            slot_date, start_time, kind, ident = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return date.fromisoformat(slot_date), time.fromisoformat(start_time), int(kind), int(ident)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_slots(self, queryset, get_occurrences, request):
+        """
+        Return one page of ``queryset`` merged with series occurrences.
+        ``get_occurrences(start_date)`` must yield occurrences from that date (all
+        of them for None) in ``slot_sort_key`` order.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            occurrences = get_occurrences(None)
+        else:
+            slot_date, start_time, kind, ident = cursor
+            after = Q(date__gt=slot_date) | Q(date=slot_date, start_time__gt=start_time)
+            if kind == _STORED:
+                after |= Q(date=slot_date, start_time=start_time, id__gt=ident)
+            queryset = queryset.filter(after, date__gte=slot_date)
+            occurrences = (slot for slot in get_occurrences(slot_date) if slot_sort_key(slot) > cursor)
+
+        stored = queryset.order_by('date', 'start_time', 'id')[:self.page_size + 1]
+        page = list(islice(heapq.merge(stored, occurrences, key=slot_sort_key), self.page_size + 1))
+
+        self.next_key = slot_sort_key(page[self.page_size - 1]) if len(page) > self.page_size else None
+        return page[:self.page_size]
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_key)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
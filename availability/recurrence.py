@@ -0,0 +1,144 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from operator import attrgetter
+
+from django.db.models import Prefetch
+
+from .models import AvailabilitySlot, RecurringSlot, RecurringSlotOverride
+
+REPEAT_NONE = 'none'
+REPEAT_DAILY = 'daily'
+REPEAT_WEEKLY = 'weekly'
+REPEAT_SPECIFIC_DAYS = 'specific_days'
+
+_OVERRIDE_FIELDS = ('start_time', 'end_time', 'title', 'is_available')
+
+
+def iter_recurrence_dates(repeat_type, start_date, end_date, weekdays=(), window_start=None, window_end=None):
+    """
+    Yield the dates of a recurrence that fall inside ``[window_start, window_end]``
+    (the whole series when omitted). Only the days of the window are visited, and
+    weekly series jump straight from one occurrence to the next.
+    """
+    first = max(start_date, window_start) if window_start else start_date
+    last = min(end_date, window_end) if window_end else end_date
+
+    step = 1
+    if repeat_type == REPEAT_WEEKLY:
+        first += timedelta(days=(start_date.weekday() - first.weekday()) % 7)
+        step = 7
+    wanted = set(weekdays) if repeat_type == REPEAT_SPECIFIC_DAYS else None
+
+    current = first
+    while current <= last:
+        if wanted is None or current.weekday() in wanted:
+            yield current
+        current += timedelta(days=step)
+
+
+def recurrence_dates(start_date, recurrence):
+    """Dates generated by validated recurrence options, starting at ``start_date``"""
+    if not recurrence or recurrence['repeat_type'] == REPEAT_NONE:
+        return [start_date]
+    return list(iter_recurrence_dates(
+        recurrence['repeat_type'],
+        start_date,
+        recurrence['end_date'],
+        recurrence.get('weekdays', []),
+    ))
+
+
+def iter_series_dates(series, start_date=None, end_date=None):
+    return iter_recurrence_dates(
+        series.repeat_type, series.start_date, series.end_date, series.weekdays, start_date, end_date
+    )
+
+
+def recurring_slots(user_ids, start_date=None, end_date=None):
+    """
+    Series of ``user_ids`` (everyone's when None) active in the window, with their
+    overrides inside it prefetched.
+    """
+    series = RecurringSlot.objects.all()
+    if user_ids is not None:
+        series = series.filter(user_id__in=user_ids)
+    overrides = RecurringSlotOverride.objects.all()
+    if start_date:
+        series = series.filter(end_date__gte=start_date)
+        overrides = overrides.filter(date__gte=start_date)
+    if end_date:
+        series = series.filter(start_date__lte=end_date)
+        overrides = overrides.filter(date__lte=end_date)
+    return series.select_related('user').prefetch_related(
+        Prefetch('overrides', queryset=overrides)
+    ).order_by('id')
+
+
+def build_occurrence(series, occurrence_date, override=None):
+    """Unsaved AvailabilitySlot for one occurrence of ``series``, with ``override`` applied"""
+    slot = AvailabilitySlot(
+        user=series.user,
+        date=occurrence_date,
+        start_time=series.start_time,
+        end_time=series.end_time,
+        title=series.title,
+        is_available=series.is_available
+    )
+    if override is not None:
+        for field in _OVERRIDE_FIELDS:
+            value = getattr(override, field)
+            if value is not None:
+                setattr(slot, field, value)
+    slot.series_id = series.id
+    return slot
+
+
+def expand_recurring_slots(series_list, start_date=None, end_date=None):
+    """
+    Yield unsaved AvailabilitySlot instances for the occurrences of ``series_list``
+    inside the window, with overrides applied. ``id`` is None and ``series_id``
+    points at the series each occurrence comes from.
+    """
+    for series in series_list:
+        overrides = {override.date: override for override in series.overrides.all()}
+        for occurrence_date in iter_series_dates(series, start_date, end_date):
+            override = overrides.get(occurrence_date)
+            if override is not None and override.cancelled:
+                continue
+            yield build_occurrence(series, occurrence_date, override)
+
+
+def iter_sorted_occurrences(series_list, start_date=None, end_date=None):
+    """
+    Lazily yield the occurrences of ``series_list`` ordered by date, start time and
+    series id. Each series already produces its dates in order (one occurrence per
+    day), so they are merged rather than expanded and sorted up front.
+    """
+    return heapq.merge(
+        *(expand_recurring_slots([series], start_date, end_date) for series in series_list),
+        key=attrgetter('date', 'start_time', 'series_id')
+    )
+
+
+def occurrences_by_date(user_ids, start_date=None, end_date=None, available_only=False):
+    """``{date: [occurrence, ...]}`` for the series of ``user_ids`` inside the window"""
+    by_date = defaultdict(list)
+    for slot in expand_recurring_slots(recurring_slots(user_ids, start_date, end_date), start_date, end_date):
+        if available_only and not slot.is_available:
+            continue
+        by_date[slot.date].append(slot)
+    return by_date
+
+
+def cancel_occurrences(occurrences):
+    """Store cancelling overrides for the given expanded occurrences"""
+    RecurringSlotOverride.objects.bulk_create(
+        [
+            RecurringSlotOverride(series_id=slot.series_id, date=slot.date, cancelled=True)
+            for slot in occurrences
+        ],
+        update_conflicts=True,
+        unique_fields=['series', 'date'],
+        update_fields=['cancelled']
+    )
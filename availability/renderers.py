@@ -0,0 +1,21 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON: one object per line, used for streamed match results"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    @staticmethod
+    def render_line(data):
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(self.render_line(item) for item in items)
@@ -1,7 +1,19 @@
+from collections import defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import AvailabilitySlot
-from datetime import datetime, timedelta, date
-from typing import List
+from .models import AvailabilitySlot, RecurringSlot, RecurringSlotOverride, SlotImportJob
+from . import sql_sweep
+from .overlaps import overlapping_slots, subtract_spans
+from .matching import ENGINES, ENGINE_DATABASE, RANKINGS, RANK_EARLIEST
+from .recurrence import REPEAT_NONE, build_occurrence, cancel_occurrences, occurrences_by_date, recurrence_dates
+from .signals import mark_slot_dates_changed
+from datetime import date
+
+# Rows per INSERT statement when slots are written in bulk.
+BULK_BATCH_SIZE = 1000
 
 class RecurrenceOptionsSerializer(serializers.Serializer):
     repeat_type = serializers.ChoiceField(
@@ -43,10 +55,15 @@ class RecurrenceOptionsSerializer(serializers.Serializer):
 
 class AvailabilitySlotSerializer(serializers.ModelSerializer):
     recurrence = RecurrenceOptionsSerializer(required=False)
+    series = serializers.IntegerField(
+        source='series_id',
+        read_only=True,
+        help_text="Recurring series this occurrence belongs to (null for one-off slots)"
+    )
 
     class Meta:
         model = AvailabilitySlot
-        fields = ['id', 'user', 'date', 'start_time', 'end_time', 'title', 'is_available', 'recurrence']
+        fields = ['id', 'user', 'date', 'start_time', 'end_time', 'title', 'is_available', 'recurrence', 'series']
         read_only_fields = ['id', 'user']
 
     def validate(self, attrs):
@@ -63,59 +80,52 @@ class AvailabilitySlotSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Title must be 100 characters or less.')
         return value.strip()
 
-    def _get_recurrence_dates(self, start_date: date, recurrence: dict) -> List[date]:
-        """Helper method to generate dates based on recurrence options"""
-        if not recurrence or recurrence['repeat_type'] == 'none':
-            return [start_date]
-
-        dates = []
-        current_date = start_date
-        end_date = recurrence['end_date']
-
-        while current_date <= end_date:
-            if recurrence['repeat_type'] == 'daily':
-                dates.append(current_date)
-            elif recurrence['repeat_type'] == 'weekly':
-                if current_date.weekday() == start_date.weekday():
-                    dates.append(current_date)
-            elif recurrence['repeat_type'] == 'specific_days':
-                if current_date.weekday() in recurrence['weekdays']:
-                    dates.append(current_date)
-            current_date += timedelta(days=1)
-
-        return dates
-
-    def _handle_overlapping_slots(self, user, date, start_time, end_time):
-        """Helper method to handle overlapping slots"""
-        existing_slots = AvailabilitySlot.objects.filter(
-            user=user,
-            date=date,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        )
+    def _split_overlapping_slots(self, user, dates, start_time, end_time):
+        """
+        Find the user's slots and series occurrences overlapping
+        ``[start_time, end_time)`` on any of ``dates`` with the span lookups.
+        Returns them along with the unsaved fragments that remain before and after
+        the new slot.
+        """
+        wanted = set(dates)
+        first, last = min(wanted), max(wanted)
+        existing_slots = overlapping_slots(user, [(slot_date, start_time, end_time) for slot_date in wanted])
+        occurrences = [
+            slot
+            for slot_date, day_slots in occurrences_by_date([user.id], first, last).items()
+            for slot in day_slots
+            if slot.start_time < end_time and slot.end_time > start_time
+        ]
+
+        overlapping = []
+        fragments = []
+        for slot in chain(existing_slots, occurrences):
+            if slot.date not in wanted:
+                continue
 
-        for slot in existing_slots:
             if slot.start_time < start_time:
-                AvailabilitySlot.objects.create(
+                fragments.append(AvailabilitySlot(
                     user=user,
-                    date=date,
+                    date=slot.date,
                     start_time=slot.start_time,
                     end_time=start_time,
                     title=slot.title,
                     is_available=slot.is_available
-                )
+                ))
 
             if slot.end_time > end_time:
-                AvailabilitySlot.objects.create(
+                fragments.append(AvailabilitySlot(
                     user=user,
-                    date=date,
+                    date=slot.date,
                     start_time=end_time,
                     end_time=slot.end_time,
                     title=slot.title,
                     is_available=slot.is_available
-                )
+                ))
+
+            overlapping.append(slot)
 
-            slot.delete()
+        return overlapping, fragments
 
     def create(self, validated_data):
         recurrence = validated_data.pop('recurrence', None)
@@ -124,18 +134,126 @@ class AvailabilitySlotSerializer(serializers.ModelSerializer):
         start_time = validated_data['start_time']
         end_time = validated_data['end_time']
         
-        dates = self._get_recurrence_dates(start_date, recurrence)
-        
-        slots = []
-        for slot_date in dates:
-            self._handle_overlapping_slots(user, slot_date, start_time, end_time)
-            
-            slot_data = {**validated_data, 'date': slot_date}
-            slots.append(AvailabilitySlot.objects.create(**slot_data))
-            
+        dates = recurrence_dates(start_date, recurrence)
+        if not dates:
+            return []
+
+        # Recurring slots are stored as one series and expanded when read.
+        series = None
+        if recurrence and recurrence['repeat_type'] != REPEAT_NONE:
+            series = RecurringSlot(
+                user=user,
+                start_date=start_date,
+                end_date=recurrence['end_date'],
+                repeat_type=recurrence['repeat_type'],
+                weekdays=recurrence.get('weekdays', []),
+                start_time=start_time,
+                end_time=end_time,
+                title=validated_data.get('title', ''),
+                is_available=validated_data.get('is_available', True)
+            )
+
+        overlapping, fragments = self._split_overlapping_slots(user, dates, start_time, end_time)
+
+        with transaction.atomic():
+            overlapping_ids = [slot.id for slot in overlapping if slot.series_id is None]
+            if overlapping_ids:
+                AvailabilitySlot.objects.filter(pk__in=overlapping_ids).delete()
+            cancel_occurrences(slot for slot in overlapping if slot.series_id is not None)
+            AvailabilitySlot.objects.bulk_create(fragments, batch_size=BULK_BATCH_SIZE)
+
+            if series is not None:
+                series.save()
+                slots = [build_occurrence(series, slot_date) for slot_date in dates]
+            else:
+                slots = AvailabilitySlot.objects.bulk_create([AvailabilitySlot(**validated_data)])
+
+        # bulk_create does not send post_save, so derived data is refreshed explicitly.
+        mark_slot_dates_changed({(user.id, slot_date) for slot_date in dates})
+
         return slots[0] if len(slots) == 1 else slots
 
-class CommonAvailabilityRequestSerializer(serializers.Serializer):
+class SlotImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlotImportJob
+        fields = ['id', 'status', 'total', 'processed', 'created_count', 'failed_count',
+                  'errors', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+class RecurringSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringSlot
+        fields = ['id', 'user', 'start_date', 'end_date', 'repeat_type', 'weekdays',
+                  'start_time', 'end_time', 'title', 'is_available']
+        read_only_fields = fields
+
+class RecurringSlotOverrideSerializer(serializers.ModelSerializer):
+    """Edits one occurrence of a series; fields left out keep the series' values"""
+
+    class Meta:
+        model = RecurringSlotOverride
+        fields = ['start_time', 'end_time', 'title', 'is_available']
+
+    def validate(self, attrs):
+        series = self.instance.series
+        start = attrs.get('start_time', self.instance.start_time) or series.start_time
+        end = attrs.get('end_time', self.instance.end_time) or series.end_time
+        if start >= end:
+            raise serializers.ValidationError('Start time must be before end time.')
+        return attrs
+
+    def validate_title(self, value):
+        if value is None:
+            return value
+        if not value.strip():
+            raise serializers.ValidationError('Title is required.')
+        return value.strip()
+
+class SlotChangesRequestSerializer(serializers.Serializer):
+    since = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="Cursor returned by the previous call; omit it to get the current cursor only"
+    )
+    limit = serializers.IntegerField(
+        default=500,
+        min_value=1,
+        max_value=1000,
+        help_text="Maximum number of change log entries (changed days) to read"
+    )
+
+class MatchOptionsSerializer(serializers.Serializer):
+    engine = serializers.ChoiceField(
+        choices=ENGINES,
+        default=lambda: settings.AVAILABILITY_MATCH_ENGINE,
+        help_text="Matching engine: interval sweep, minute bitmaps or an SQL sweep run by the database"
+    )
+    duration_minutes = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Only return windows lasting at least this many minutes"
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Return at most this many windows"
+    )
+    rank = serializers.ChoiceField(
+        choices=RANKINGS,
+        default=RANK_EARLIEST,
+        help_text="Order windows by earliest start, longest duration or most attendees"
+    )
+    coalesce = serializers.BooleanField(
+        default=True,
+        help_text="Merge touching windows that have the same participants"
+    )
+
+    def validate_engine(self, value):
+        if value == ENGINE_DATABASE and not sql_sweep.is_supported():
+            raise serializers.ValidationError('The database engine is not available on this database backend.')
+        return value
+
+class CommonAvailabilityRequestSerializer(MatchOptionsSerializer):
     users = serializers.ListField(
         child=serializers.IntegerField(),
         help_text="List of user IDs to find common availability for"
@@ -144,7 +262,34 @@ class CommonAvailabilityRequestSerializer(serializers.Serializer):
         help_text="Date to find common availability for"
     )
 
-class GroupCommonAvailabilityRequestSerializer(serializers.Serializer):
+# Buffered responses are built in memory; streamed (NDJSON) ones are produced day by day.
+MAX_RANGE_DAYS = 31
+STREAMING_MAX_RANGE_DAYS = 5 * 366
+
+class MinMembersField(serializers.Field):
+    """Accepts a member count (integer >= 1) or a fraction of the group (0 < float <= 1)"""
+    default_error_messages = {
+        'invalid': 'Must be a member count (integer >= 1) or a fraction of the group between 0 and 1.'
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = float(data) if '.' in data else int(data)
+            except ValueError:
+                self.fail('invalid')
+        if isinstance(data, bool):
+            self.fail('invalid')
+        if isinstance(data, int) and data >= 1:
+            return data
+        if isinstance(data, float) and 0 < data <= 1:
+            return data
+        self.fail('invalid')
+
+    def to_representation(self, value):
+        return value
+
+class GroupCommonAvailabilityRequestSerializer(MatchOptionsSerializer):
     date = serializers.DateField(
         required=False,
         help_text="Specific date to find common availability for"
@@ -157,6 +302,10 @@ class GroupCommonAvailabilityRequestSerializer(serializers.Serializer):
         required=False,
         help_text="End date of the range to find common availability for"
     )
+    min_members = MinMembersField(
+        required=False,
+        help_text="Return windows where at least this many accepted members (or this fraction of them) are free; defaults to everyone"
+    )
 
     def validate(self, attrs):
         has_date = 'date' in attrs
@@ -179,9 +328,13 @@ class GroupCommonAvailabilityRequestSerializer(serializers.Serializer):
             if start_date > end_date:
                 raise serializers.ValidationError("Start date must be before or equal to end date")
 
+            max_days = STREAMING_MAX_RANGE_DAYS if self.context.get('streaming') else MAX_RANGE_DAYS
             date_diff = end_date - start_date
-            if date_diff.days > 31:
-                raise serializers.ValidationError("Date range cannot exceed 31 days")
+            if date_diff.days > max_days:
+                raise serializers.ValidationError(f"Date range cannot exceed {max_days} days")
+
+        if self.context.get('streaming') and attrs.get('rank') != RANK_EARLIEST and not attrs.get('limit'):
+            raise serializers.ValidationError("Streaming with a rank other than 'earliest' requires a limit")
 
         return attrs
 
@@ -196,75 +349,220 @@ class BatchAvailabilitySlotSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         slots_data = validated_data.get('slots', [])
+        user = validated_data['user']
         created_slots = []
         errors = []
 
+        # Expand every entry first. One-off slots are keyed by (date, start_time, end_time)
+        # so a later entry for the same key overwrites an earlier one, as sequential
+        # upserts did; recurring entries become one series each. Every entry keeps its
+        # own instance for the response, which shares the written row's id.
+        instances = {}
+        entries = []
         for slot_data in slots_data:
             try:
                 recurrence = slot_data.pop('recurrence', None)
                 start_date = slot_data['date']
-                user = validated_data['user']
                 start_time = slot_data['start_time']
                 end_time = slot_data['end_time']
 
-                dates = self._get_recurrence_dates(start_date, recurrence) if recurrence else [start_date]
+                dates = recurrence_dates(start_date, recurrence)
 
-                for slot_date in dates:
-                    existing_slot = AvailabilitySlot.objects.filter(
+                if recurrence and recurrence['repeat_type'] != REPEAT_NONE:
+                    series = RecurringSlot(
                         user=user,
-                        date=slot_date,
+                        start_date=start_date,
+                        end_date=recurrence['end_date'],
+                        repeat_type=recurrence['repeat_type'],
+                        weekdays=recurrence.get('weekdays', []),
                         start_time=start_time,
-                        end_time=end_time
-                    ).first()
-
-                    if existing_slot:
-                        existing_slot.title = slot_data.get('title', '')
-                        existing_slot.is_available = slot_data.get('is_available', True)
-                        existing_slot.save()
-                        created_slots.append(existing_slot)
-                    else:
-                        slot = AvailabilitySlot.objects.create(
-                            user=user,
-                            date=slot_date,
-                            start_time=start_time,
-                            end_time=end_time,
-                            title=slot_data.get('title', ''),
-                            is_available=slot_data.get('is_available', True)
-                        )
-                        created_slots.append(slot)
-
+                        end_time=end_time,
+                        title=slot_data.get('title', ''),
+                        is_available=slot_data.get('is_available', True)
+                    )
+                    entries.append((slot_data, None, (series, dates) if dates else None, None))
+                    continue
+
+                slot = AvailabilitySlot(
+                    user=user,
+                    date=start_date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    title=slot_data.get('title', ''),
+                    is_available=slot_data.get('is_available', True)
+                )
+                instances[start_date, start_time, end_time] = slot
+                entries.append((slot_data, slot, None, None))
             except Exception as e:
+                entries.append((slot_data, None, None, e))
+
+        series_entries = [entry[2] for entry in entries if entry[2] is not None]
+        series_keys = {
+            (slot_date, series.start_time, series.end_time)
+            for series, dates in series_entries
+            for slot_date in dates
+        }
+
+        failed = self._superseded_slots(entries)
+        failed_series = {}
+        keys = [key for key in instances if key not in failed]
+        with transaction.atomic():
+            self._replace_overlapped_slots(user, keys, series_keys)
+            for offset in range(0, len(keys), BULK_BATCH_SIZE):
+                chunk = [instances[key] for key in keys[offset:offset + BULK_BATCH_SIZE]]
+                failed.update(self._upsert_slots(chunk))
+            failed_series = self._create_series([series for series, _ in series_entries])
+
+        for slot_data, slot, series_entry, error in entries:
+            if slot is not None:
+                key = (slot.date, slot.start_time, slot.end_time)
+                error = error or failed.get(key)
+                if key not in failed:
+                    slot.pk = instances[key].pk
+                    created_slots.append(slot)
+            if series_entry is not None:
+                series, dates = series_entry
+                error = error or failed_series.get(id(series))
+                if id(series) not in failed_series:
+                    created_slots.extend(build_occurrence(series, slot_date) for slot_date in dates)
+            if error is not None:
                 errors.append({
                     'slot': slot_data,
-                    'error': str(e)
+                    'error': str(error)
                 })
 
+        # bulk_create does not send post_save, so derived data is refreshed explicitly.
+        mark_slot_dates_changed(
+            {(user.id, key[0]) for key in instances} |
+            {(user.id, key[0]) for key in series_keys}
+        )
+
         return {
             'created_slots': created_slots,
             'errors': errors
         }
 
+    def _superseded_slots(self, entries):
+        """
+        ``{(date, start_time, end_time): error}`` for the one-off entries overlapped
+        by a later one-off entry of the batch. A user's stored slots may not
+        overlap, and the later entry wins, as it would when created on its own.
+        """
+        positions = {}
+        for position, (_, slot, _, _) in enumerate(entries):
+            if slot is not None:
+                positions[slot.date, slot.start_time, slot.end_time] = position
+
+        kept = defaultdict(list)
+        superseded = {}
+        for key in sorted(positions, key=positions.get, reverse=True):
+            slot_date, start_time, end_time = key
+            if any(start < end_time and end > start_time for start, end in kept[slot_date]):
+                superseded[key] = ValueError('Overlaps a later slot in this batch')
+            else:
+                kept[slot_date].append((start_time, end_time))
+        return superseded
+
+    def _replace_overlapped_slots(self, user, keys, series_keys):
+        """
+        Make the new entries replace what the user already has where they overlap,
+        as creating them one by one would: overlapped series occurrences are
+        cancelled and overlapped one-off slots deleted, and the parts outside every
+        new entry are kept as one-off fragments. One-off slots at exactly one of the
+        one-off ``keys`` are updated in place by the upsert instead.
+        """
+        covered = defaultdict(list)
+        for slot_date, start_time, end_time in chain(keys, series_keys):
+            covered[slot_date].append((start_time, end_time))
+        if not covered:
+            return
+
+        def is_overlapped(slot):
+            return any(start < slot.end_time and end > slot.start_time for start, end in covered[slot.date])
+
+        # One scan of the batch's date range; a batch covers too many spans for one
+        # span lookup each.
+        first, last = min(covered), max(covered)
+        upserted = set(keys)
+        overlapped_slots = [
+            slot
+            for slot in AvailabilitySlot.objects.filter(user=user, date__range=(first, last))
+            if (slot.date, slot.start_time, slot.end_time) not in upserted and is_overlapped(slot)
+        ]
+        overlapped_occurrences = [
+            slot
+            for day_slots in occurrences_by_date([user.id], first, last).values()
+            for slot in day_slots
+            if is_overlapped(slot)
+        ]
+
+        fragments = {}
+        for slot in chain(overlapped_slots, overlapped_occurrences):
+            for start_time, end_time in subtract_spans(slot.start_time, slot.end_time, covered[slot.date]):
+                fragments[slot.date, start_time, end_time] = AvailabilitySlot(
+                    user=user,
+                    date=slot.date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    title=slot.title,
+                    is_available=slot.is_available
+                )
+
+        cancel_occurrences(overlapped_occurrences)
+        if overlapped_slots:
+            AvailabilitySlot.objects.filter(pk__in=[slot.pk for slot in overlapped_slots]).delete()
+        AvailabilitySlot.objects.bulk_create(fragments.values(), batch_size=BULK_BATCH_SIZE)
+
+    def _create_series(self, series_list):
+        """
+        Insert ``series_list`` with one statement, falling back to one savepoint per
+        series when that fails. Returns ``{id(series): error}`` for the ones not saved.
+        """
+        try:
+            with transaction.atomic():
+                RecurringSlot.objects.bulk_create(series_list)
+            return {}
+        except Exception:
+            pass
+
+        failed = {}
+        for series in series_list:
+            try:
+                with transaction.atomic():
+                    RecurringSlot.objects.bulk_create([series])
+            except Exception as e:
+                failed[id(series)] = e
+        return failed
+
+    def _upsert_slots(self, slots):
+        """
+        Insert or update ``slots`` with one statement, falling back to one savepoint
+        per slot when the chunk fails so a bad row only fails its own entry. Returns
+        ``{(date, start_time, end_time): error}`` for the slots that were not written.
+        """
+        try:
+            with transaction.atomic():
+                self._bulk_upsert(slots)
+            return {}
+        except Exception:
+            pass
+
+        failed = {}
+        for slot in slots:
+            try:
+                with transaction.atomic():
+                    self._bulk_upsert([slot])
+            except Exception as e:
+                failed[slot.date, slot.start_time, slot.end_time] = e
+        return failed
+
+    def _bulk_upsert(self, slots):
+        AvailabilitySlot.objects.bulk_create(
+            slots,
+            update_conflicts=True,
+            unique_fields=['user', 'date', 'start_time', 'end_time'],
+            update_fields=['title', 'is_available']
+        )
+
     def update(self, instance, validated_data):
         raise NotImplementedError("Batch update not supported")
-
-    def _get_recurrence_dates(self, start_date: date, recurrence: dict) -> List[date]:
-        """Helper method to generate dates based on recurrence options"""
-        if not recurrence or recurrence['repeat_type'] == 'none':
-            return [start_date]
-
-        dates = []
-        current_date = start_date
-        end_date = recurrence['end_date']
-
-        while current_date <= end_date:
-            if recurrence['repeat_type'] == 'daily':
-                dates.append(current_date)
-            elif recurrence['repeat_type'] == 'weekly':
-                if current_date.weekday() == start_date.weekday():
-                    dates.append(current_date)
-            elif recurrence['repeat_type'] == 'specific_days':
-                if current_date.weekday() in recurrence['weekdays']:
-                    dates.append(current_date)
-            current_date += timedelta(days=1)
-
-        return dates
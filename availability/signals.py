@@ -0,0 +1,86 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bitmap_store import refresh_daily_bitmaps
+from .change_log import record_slot_changes
+from .models import AvailabilitySlot, RecurringSlot, RecurringSlotOverride
+from .recurrence import iter_series_dates
+from .slot_stats import refresh_slot_stats
+
+_state = threading.local()
+
+
+def _apply_slot_changes(pairs):
+    refresh_daily_bitmaps(pairs)
+    record_slot_changes(pairs)
+    refresh_slot_stats(pairs)
+
+
+@contextmanager
+def collect_slot_changes():
+    """
+    Collect the ``(user, date)`` pairs touched by slot writes inside the block and
+    update the data derived from them (daily bitmaps, change log, stats rollups)
+    once on exit instead of after every row. The block and the
+    updates share one transaction, so the slots and their derived data commit or
+    roll back together.
+    """
+    if getattr(_state, 'pairs', None) is not None:
+        yield
+        return
+
+    _state.pairs = set()
+    try:
+        with transaction.atomic():
+            yield
+            pairs, _state.pairs = _state.pairs, None
+            _apply_slot_changes(pairs)
+    finally:
+        _state.pairs = None
+
+
+def mark_slot_dates_changed(pairs):
+    pending = getattr(_state, 'pairs', None)
+    if pending is None:
+        # Outside collect_slot_changes the derived updates join the transaction the
+        # write ran in (the admin's, for instance), or get one of their own.
+        with transaction.atomic():
+            _apply_slot_changes(set(pairs))
+    else:
+        pending.update(pairs)
+
+
+def _deleted_with(origin, model):
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+@receiver(post_delete, sender=AvailabilitySlot)
+def slot_changed(sender, instance, origin=None, **kwargs):
+    # Deleting a user cascades to everything derived from their slots as well.
+    if _deleted_with(origin, User):
+        return
+    mark_slot_dates_changed([(instance.user_id, instance.date)])
+
+
+@receiver(post_save, sender=RecurringSlot)
+@receiver(post_delete, sender=RecurringSlot)
+def recurring_slot_changed(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, User):
+        return
+    mark_slot_dates_changed((instance.user_id, slot_date) for slot_date in iter_series_dates(instance))
+
+
+@receiver(post_save, sender=RecurringSlotOverride)
+@receiver(post_delete, sender=RecurringSlotOverride)
+def recurring_slot_override_changed(sender, instance, origin=None, **kwargs):
+    # Deleting a series cascades to its overrides; the series' receiver covers those dates.
+    if _deleted_with(origin, RecurringSlot) or _deleted_with(origin, User):
+        return
+    mark_slot_dates_changed([(instance.series.user_id, instance.date)])
+
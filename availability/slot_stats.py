@@ -0,0 +1,180 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay
+
+from .bitmap_store import _iter_user_days, _occurrence_rows
+from .models import AvailabilitySlot, DailySlotStats, UserSlotStats
+from .recurrence import expand_recurring_slots, recurring_slots
+
+_ROW_FIELDS = ('user_id', 'date', 'start_time', 'end_time')
+_DAY_FIELDS = ['slot_count', 'total_duration', 'hour_counts']
+_BATCH_SIZE = 1000
+
+
+def weekday_index(slot_date):
+    """Position in ``weekday_counts``: 0 = Sunday ... 6 = Saturday (ExtractWeekDay - 1)"""
+    return slot_date.isoweekday() % 7
+
+
+def build_day_stats(slot_date, rows):
+    """``(slot_count, total_duration, hour_counts)`` of one user-day's ``(start_time, end_time)`` rows"""
+    hour_counts = [0] * 24
+    total = timedelta()
+    for start_time, end_time in rows:
+        hour_counts[start_time.hour] += 1
+        total += datetime.combine(slot_date, end_time) - datetime.combine(slot_date, start_time)
+    return len(rows), total, hour_counts
+
+
+def _add_day(stats, slot_date, day_stats, sign=1):
+    slot_count, total, hour_counts = day_stats
+    stats.slot_count += sign * slot_count
+    stats.total_duration += sign * total
+    stats.hour_counts = [stored + sign * count for stored, count in zip(stats.hour_counts, hour_counts)]
+    stats.weekday_counts[weekday_index(slot_date)] += sign * slot_count
+
+
+def _current_day_rows(user_id, dates):
+    """``{date: [(start_time, end_time), ...]}`` of the user's slots and occurrences on ``dates``"""
+    rows = defaultdict(list)
+    stored = AvailabilitySlot.objects.filter(user_id=user_id, date__in=dates).values_list(*_ROW_FIELDS)
+    occurrences = _occurrence_rows([user_id], min(dates), max(dates))
+    for _, slot_date, start_time, end_time, *_ in (*stored, *occurrences):
+        if slot_date in dates:
+            rows[slot_date].append((start_time, end_time))
+    return rows
+
+
+def refresh_slot_stats(pairs):
+    """
+    Bring the rollups of the users in ``(user_id, date)`` pairs up to date: each
+    day's previous share is subtracted and its current one added, so the cost
+    depends on the days written, not on the user's history. The user's rollup row
+    is locked while their days are recomputed.
+    """
+    dates_by_user = defaultdict(set)
+    for user_id, slot_date in pairs:
+        dates_by_user[user_id].add(slot_date)
+
+    for user_id, dates in dates_by_user.items():
+        with transaction.atomic():
+            stats, _ = UserSlotStats.objects.select_for_update().get_or_create(user_id=user_id)
+            for day in DailySlotStats.objects.filter(user_id=user_id, date__in=dates):
+                _add_day(stats, day.date, (day.slot_count, day.total_duration, day.hour_counts), sign=-1)
+
+            current = {
+                slot_date: build_day_stats(slot_date, rows)
+                for slot_date, rows in _current_day_rows(user_id, dates).items()
+            }
+            for slot_date, day_stats in current.items():
+                _add_day(stats, slot_date, day_stats)
+
+            emptied = dates - current.keys()
+            if emptied:
+                DailySlotStats.objects.filter(user_id=user_id, date__in=emptied).delete()
+            DailySlotStats.objects.bulk_create(
+                [
+                    DailySlotStats(user_id=user_id, date=slot_date, **dict(zip(_DAY_FIELDS, day_stats)))
+                    for slot_date, day_stats in current.items()
+                ],
+                batch_size=_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=_DAY_FIELDS,
+            )
+            stats.save()
+
+
+def rebuild_slot_stats(user_ids=None):
+    """
+    Drop and regenerate the day shares and rollups of ``user_ids`` (everyone when
+    omitted) from a single streamed pass over their slots merged with their series
+    occurrences. Returns the number of rollups written.
+    """
+    slots = AvailabilitySlot.objects.all()
+    days = DailySlotStats.objects.all()
+    rollups = UserSlotStats.objects.all()
+    if user_ids is not None:
+        slots = slots.filter(user_id__in=user_ids)
+        days = days.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    occurrences = defaultdict(list)
+    for row in _occurrence_rows(user_ids):
+        occurrences[row[:2]].append(row)
+
+    stats_by_user = {}
+    with transaction.atomic():
+        days.delete()
+        rollups.delete()
+        values = slots.order_by('user_id', 'date').values_list(*_ROW_FIELDS).iterator()
+        batch = []
+        for (user_id, slot_date), day_rows in _iter_user_days(values, occurrences):
+            day_stats = build_day_stats(slot_date, [row[2:4] for row in day_rows])
+            if user_id not in stats_by_user:
+                stats_by_user[user_id] = UserSlotStats(
+                    user_id=user_id, total_duration=timedelta(), hour_counts=[0] * 24, weekday_counts=[0] * 7
+                )
+            _add_day(stats_by_user[user_id], slot_date, day_stats)
+            batch.append(DailySlotStats(user_id=user_id, date=slot_date, **dict(zip(_DAY_FIELDS, day_stats))))
+            if len(batch) >= _BATCH_SIZE:
+                DailySlotStats.objects.bulk_create(batch)
+                batch = []
+        DailySlotStats.objects.bulk_create(batch)
+        UserSlotStats.objects.bulk_create(stats_by_user.values(), batch_size=_BATCH_SIZE)
+
+    return len(stats_by_user)
+
+
+def aggregate_slot_stats(user_id):
+    """
+    The rollup's figures computed from scratch with aggregate queries over the
+    user's slots plus their series occurrences: ``(slot_count, total_duration,
+    hour_counts, weekday_counts)``. Used to check the stored rollups.
+    """
+    slots = AvailabilitySlot.objects.filter(user_id=user_id)
+    totals = slots.annotate(
+        duration=ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+    ).aggregate(total=Sum('duration'), count=Count('id'))
+    hour_counts = Counter(dict(
+        slots.annotate(hour=ExtractHour('start_time')).values_list('hour').annotate(count=Count('id'))
+    ))
+    weekday_counts = Counter(dict(
+        slots.annotate(weekday=ExtractWeekDay('date')).values_list('weekday').annotate(count=Count('id'))
+    ))
+
+    slot_count = totals['count']
+    total = totals['total'] or timedelta()
+    for slot in expand_recurring_slots(recurring_slots([user_id])):
+        slot_count += 1
+        total += datetime.combine(slot.date, slot.end_time) - datetime.combine(slot.date, slot.start_time)
+        hour_counts[slot.start_time.hour] += 1
+        weekday_counts[weekday_index(slot.date) + 1] += 1
+
+    return (
+        slot_count,
+        total,
+        [hour_counts[hour] for hour in range(24)],
+        [weekday_counts[weekday] for weekday in range(1, 8)],
+    )
+
+
+def find_inconsistent_slot_stats(user_ids=None):
+    """Yield the ids of users whose stored rollup disagrees with ``aggregate_slot_stats``"""
+    users = set(UserSlotStats.objects.values_list('user_id', flat=True))
+    users |= set(AvailabilitySlot.objects.values_list('user_id', flat=True).distinct())
+    users |= {series.user_id for series in recurring_slots(None)}
+    if user_ids is not None:
+        users &= set(user_ids)
+
+    stored = {
+        stats.user_id: (stats.slot_count, stats.total_duration, stats.hour_counts, stats.weekday_counts)
+        for stats in UserSlotStats.objects.filter(user_id__in=users)
+    }
+    empty = (0, timedelta(), [0] * 24, [0] * 7)
+    for user_id in sorted(users):
+        if stored.get(user_id, empty) != aggregate_slot_stats(user_id):
+            yield user_id
@@ -0,0 +1,175 @@
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from .models import AvailabilitySlot
+
+# Backends with window functions and a JSON table function for the occurrence rows.
+SUPPORTED_VENDORS = ('postgresql', 'sqlite')
+
+# Series occurrences are not stored, so they travel as one JSON array parameter.
+_OCCURRENCES_SQL = {
+    'postgresql': (
+        'SELECT user_id, date, start_time, end_time, title, 1, ord '
+        'FROM jsonb_to_recordset(%s::jsonb) AS occ('
+        'user_id integer, date date, start_time time, end_time time, title text, ord integer)'
+    ),
+    'sqlite': (
+        "SELECT json_extract(value, '$.user_id'), json_extract(value, '$.date'), "
+        "json_extract(value, '$.start_time'), json_extract(value, '$.end_time'), "
+        "json_extract(value, '$.title'), 1, json_extract(value, '$.ord') "
+        'FROM json_each(%s)'
+    ),
+}
+
+# The sweep mirrors matching.iter_common_intervals: every distinct slot boundary of
+# a day starts an elementary interval, a user counts once however many of their
+# slots overlap, and days where fewer than two members have slots never match.
+_SWEEP_SQL = '''
+WITH slots (user_id, date, start_time, end_time, title, src, ord) AS (
+    SELECT user_id, date, start_time, end_time, title, 0, id
+    FROM {slot_table}
+    WHERE user_id IN ({user_params}) AND date IN ({date_params}){available_filter}
+    UNION ALL
+    {occurrences_sql}
+),
+user_deltas AS (
+    SELECT date, user_id, t, SUM(delta) AS delta
+    FROM (
+        SELECT date, user_id, start_time AS t, 1 AS delta FROM slots
+        UNION ALL
+        SELECT date, user_id, end_time AS t, -1 AS delta FROM slots
+    ) events
+    GROUP BY date, user_id, t
+),
+user_coverage AS (
+    SELECT date, user_id, t, delta,
+           SUM(delta) OVER (PARTITION BY date, user_id ORDER BY t) AS active
+    FROM user_deltas
+),
+points AS (
+    SELECT date, t,
+           SUM(CASE WHEN active > 0 THEN 1 ELSE 0 END - CASE WHEN active - delta > 0 THEN 1 ELSE 0 END) AS change
+    FROM user_coverage
+    GROUP BY date, t
+),
+sweep AS (
+    SELECT date, t AS start_time,
+           LEAD(t) OVER (PARTITION BY date ORDER BY t) AS end_time,
+           SUM(change) OVER (PARTITION BY date ORDER BY t) AS covered
+    FROM points
+),
+windows AS (
+    SELECT date, start_time, end_time
+    FROM sweep
+    WHERE end_time IS NOT NULL AND covered >= %s
+      AND date IN (SELECT date FROM slots GROUP BY date HAVING COUNT(DISTINCT user_id) >= 2)
+),
+covering AS (
+    SELECT w.date, w.start_time, w.end_time, s.user_id, s.title,
+           ROW_NUMBER() OVER (
+               PARTITION BY w.date, w.start_time, s.user_id ORDER BY s.src, s.ord
+           ) AS pick
+    FROM windows w
+    JOIN slots s ON s.date = w.date AND s.start_time <= w.start_time AND s.end_time >= w.end_time
+)
+SELECT c.date, c.start_time, c.end_time, c.user_id, u.username, c.title
+FROM covering c
+JOIN {user_table} u ON u.id = c.user_id
+WHERE c.pick = 1
+ORDER BY c.date, c.start_time
+'''
+
+
+def is_supported():
+    return connection.vendor in SUPPORTED_VENDORS
+
+
+def _occurrence_payload(extra_rows):
+    """JSON array of the ``{date: [SlotRow, ...]}`` occurrences, numbered in input order"""
+    return json.dumps([
+        {
+            'user_id': row.user_id,
+            'date': row.date.isoformat(),
+            'start_time': row.start_time.isoformat(),
+            'end_time': row.end_time.isoformat(),
+            'title': row.title,
+            'ord': index,
+        }
+        for index, row in enumerate(row for rows in extra_rows.values() for row in rows)
+    ])
+
+
+def iter_database_windows(user_ids, dates, required=None, extra_rows=None, available_only=True):
+    """
+    Run the common-availability sweep inside the database for ``dates`` and yield
+    ``(date, start_time, end_time, covering)`` like ``iter_matched_intervals``,
+    where ``covering`` holds ``(username, title)`` pairs in ``user_ids`` order.
+
+    Start/end events are unnested with UNION ALL, a running SUM per user and then
+    per day gives the number of members covering each boundary, and LEAD pairs a
+    boundary with the next one; only the windows reaching ``required`` members
+    (everyone by default) come back, with one covering slot per member.
+    ``extra_rows`` (``{date: [SlotRow, ...]}``) adds series occurrences.
+    """
+    user_ids = list(user_ids)
+    dates = list(dates)
+    if not user_ids or not dates:
+        return
+    wanted = set(dates)
+
+    ops = connection.ops
+    sql = _SWEEP_SQL.format(
+        slot_table=AvailabilitySlot._meta.db_table,
+        user_table=User._meta.db_table,
+        user_params=', '.join(['%s'] * len(user_ids)),
+        date_params=', '.join(['%s'] * len(dates)),
+        available_filter=' AND is_available = %s' if available_only else '',
+        occurrences_sql=_OCCURRENCES_SQL[connection.vendor],
+    )
+    params = [
+        *user_ids,
+        *(ops.adapt_datefield_value(day) for day in dates),
+        *([True] if available_only else []),
+        _occurrence_payload({day: rows for day, rows in (extra_rows or {}).items() if day in wanted}),
+        len(user_ids) if required is None else required,
+    ]
+
+    date_field = AvailabilitySlot._meta.get_field('date')
+    time_field = AvailabilitySlot._meta.get_field('start_time')
+    position = {user_id: index for index, user_id in enumerate(user_ids)}
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for (day, start_time, end_time), rows in groupby(cursor, key=itemgetter(0, 1, 2)):
+            covering = sorted(rows, key=lambda row: position[row[3]])
+            yield (
+                date_field.to_python(day),
+                time_field.to_python(start_time),
+                time_field.to_python(end_time),
+                [(username, title) for _, _, _, _, username, title in covering],
+            )
+
+
+def iter_database_daily_slots(user_ids, dates, required=None, extra_rows=None, available_only=True, only_dates=None):
+    """
+    Yield ``(date, common slots)`` for every day of ``dates`` in order, like
+    ``matching.iter_daily_common_slots``. Only ``only_dates`` (all of ``dates`` by
+    default) are sent to the database; the other days come back empty.
+    """
+    queried = [day for day in dates if only_dates is None or day in only_dates]
+    by_day = {}
+    for day, start_time, end_time, covering in iter_database_windows(
+        user_ids, queried, required, extra_rows, available_only
+    ):
+        by_day.setdefault(day, []).append({
+            'date': day,
+            'start_time': start_time,
+            'end_time': end_time,
+            'users': [{'username': username, 'title': title} for username, title in covering],
+        })
+    for day in dates:
+        yield day, by_day.get(day, [])
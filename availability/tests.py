@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import json
+import random
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import ExtractHour
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from groups.models import Group, GroupMembership
+
+from . import match_cache, sql_sweep
+from .bitmap_store import build_day_bitmaps
+from .jobs import requeue_interrupted_jobs, run_job
+from .matching import (
+    ENGINE_BITMAP, ENGINE_INTERVAL, SlotRow, fetch_slot_rows, iter_daily_common_slots, iter_matched_intervals,
+)
+from .models import (
+    AvailabilitySlot, DailyAvailabilityBitmap, DailySlotStats, RecurringSlot, RecurringSlotOverride, SlotChange,
+    SlotImportJob, UserSlotStats,
+)
+from .recurrence import expand_recurring_slots, recurring_slots
+from .signals import collect_slot_changes, mark_slot_dates_changed
+from .slot_stats import aggregate_slot_stats
+
+START_DATE = date(2030, 1, 7)
+
+
+def create_slots(users, slots_per_user, days, start_date=START_DATE):
+    """One-hour slots from 08:00 on each of ``days`` days, plus their derived data"""
+    slots = [
+        AvailabilitySlot(
+            user=user,
+            date=start_date + timedelta(days=offset),
+            start_time=time(8 + hour),
+            end_time=time(9 + hour),
+            title='Livre'
+        )
+        for user in users
+        for offset in range(days)
+        for hour in range(slots_per_user)
+    ]
+    with collect_slot_changes():
+        AvailabilitySlot.objects.bulk_create(slots)
+        mark_slot_dates_changed({(slot.user_id, slot.date) for slot in slots})
+
+
+def create_group(name, users):
+    """A group owned by the first of ``users``, all of them accepted members"""
+    group = Group.objects.create(name=name, owner=users[0])
+    GroupMembership.objects.bulk_create(
+        GroupMembership(group=group, user=user, accepted=True) for user in users
+    )
+    return group
+
+
+def create_spans(user, spans, slot_date=START_DATE, title='Livre'):
+    """Slots of ``user`` at ``(start_hour, end_hour)`` spans, plus their derived data"""
+    with collect_slot_changes():
+        for start, end in spans:
+            AvailabilitySlot.objects.create(
+                user=user, date=slot_date, start_time=time(start), end_time=time(end), title=title
+            )
+
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class MatchQueryCountTests(APITestCase):
+    """The match endpoints run a fixed number of queries, however much data they match"""
+
+    # (users, slots per user, days)
+    scales = [(2, 1, 1), (5, 4, 3), (12, 10, 10)]
+
+    def setUp(self):
+        caches['group-roster'].clear()
+
+    def make_group(self, scale, member_count):
+        users = [User.objects.create(username=f'user-{scale}-{index}') for index in range(member_count)]
+        group = Group.objects.create(name=f'group-{scale}', owner=users[0])
+        GroupMembership.objects.bulk_create(
+            GroupMembership(group=group, user=user, accepted=True) for user in users
+        )
+        self.client.force_authenticate(users[0])
+        return users, group
+
+    def test_common_availability(self):
+        for scale, (member_count, slots_per_user, days) in enumerate(self.scales):
+            with self.subTest(users=member_count, slots=slots_per_user, days=days):
+                users, _ = self.make_group(scale, member_count)
+                create_slots(users, slots_per_user, days)
+
+                with self.assertNumQueries(4):
+                    response = self.client.post('/api/availability/common/', {
+                        'users': [user.id for user in users],
+                        'date': START_DATE,
+                        'coalesce': False,
+                    }, format='json')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), slots_per_user)
+                self.assertEqual(len(response.data[0]['users']), member_count)
+
+    def test_group_match(self):
+        for scale, (member_count, slots_per_user, days) in enumerate(self.scales):
+            with self.subTest(users=member_count, slots=slots_per_user, days=days):
+                users, group = self.make_group(scale, member_count)
+                create_slots(users, slots_per_user, days)
+
+                with self.assertNumQueries(7):
+                    response = self.client.post(f'/api/availability/group/{group.id}/match/', {
+                        'start_date': START_DATE,
+                        'end_date': START_DATE + timedelta(days=days - 1),
+                        'coalesce': False,
+                    }, format='json')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), slots_per_user * days)
+                self.assertEqual(len(response.data[0]['users']), member_count)
+
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class QuorumMatchTests(APITestCase):
+    """``min_members`` returns the windows where at least that many members are free"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.users = [User.objects.create(username=name) for name in ('ana', 'bia', 'caio')]
+        self.group = create_group('quorum', self.users)
+        for user, spans in zip(self.users, ([(8, 12)], [(9, 11)], [(10, 13)])):
+            create_spans(user, spans)
+        self.client.force_authenticate(self.users[0])
+
+    def match(self, **options):
+        return self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+            'date': START_DATE, 'coalesce': False, **options
+        }, format='json')
+
+    def windows(self, **options):
+        response = self.match(**options)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [
+            (window['start_time'], window['end_time'], [user['username'] for user in window['users']])
+            for window in response.json()
+        ]
+
+    def test_everyone_by_default(self):
+        self.assertEqual(self.windows(), [('10:00:00', '11:00:00', ['ana', 'bia', 'caio'])])
+        self.assertEqual(self.windows(min_members=3), self.windows())
+
+    def test_member_count_and_fraction(self):
+        expected = [
+            ('09:00:00', '10:00:00', ['ana', 'bia']),
+            ('10:00:00', '11:00:00', ['ana', 'bia', 'caio']),
+            ('11:00:00', '12:00:00', ['ana', 'caio']),
+        ]
+        self.assertEqual(self.windows(min_members=2), expected)
+        # Fractions round up: half of three members means two.
+        self.assertEqual(self.windows(min_members=0.5), expected)
+        self.assertEqual(self.windows(min_members=1, engine='bitmap'), [
+            ('08:00:00', '09:00:00', ['ana']), *expected, ('12:00:00', '13:00:00', ['caio'])
+        ])
+
+    def test_quorum_above_the_group_size(self):
+        self.assertEqual(self.windows(min_members=4), [])
+
+    def test_invalid_values(self):
+        for value in (0, -1, 1.5, True, 'half'):
+            with self.subTest(min_members=value):
+                response = self.match(min_members=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('min_members', response.data)
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class RankedWindowTests(APITestCase):
+    """``rank``, ``limit`` and ``duration_minutes`` pick the best windows and stop computing early"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.users = [User.objects.create(username=name) for name in ('ana', 'bia', 'caio')]
+        self.group = create_group('ranked', self.users)
+        self.dates = [START_DATE + timedelta(days=offset) for offset in range(3)]
+        for user in self.users:
+            create_spans(user, [(10, 12)], self.dates[0])
+            create_spans(user, [(8, 9)], self.dates[2])
+        for user in self.users[:2]:
+            create_spans(user, [(8, 9)], self.dates[0])
+            create_spans(user, [(14, 17)], self.dates[1])
+        self.client.force_authenticate(self.users[0])
+
+    def windows(self, **options):
+        computed = []
+
+        def record_days(*args, **kwargs):
+            for day, day_slots in iter_daily_common_slots(*args, **kwargs):
+                computed.append(day)
+                yield day, day_slots
+
+        with mock.patch('availability.views.iter_daily_common_slots', record_days):
+            response = self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+                'start_date': self.dates[0], 'end_date': self.dates[-1], 'min_members': 2, **options
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(window['date'][-2:], window['start_time'][:5], window['end_time'][:5]) for window in response.json()], computed
+
+    def test_rankings(self):
+        self.assertEqual(self.windows(limit=2)[0], [('07', '08:00', '09:00'), ('07', '10:00', '12:00')])
+        self.assertEqual(self.windows(rank='longest', limit=2)[0], [('08', '14:00', '17:00'), ('07', '10:00', '12:00')])
+        # Ties keep the earlier window first.
+        self.assertEqual(
+            self.windows(rank='most_attendees', limit=2)[0],
+            [('07', '10:00', '12:00'), ('09', '08:00', '09:00')]
+        )
+
+    def test_minimum_duration(self):
+        self.assertEqual(
+            self.windows(duration_minutes=120)[0],
+            [('07', '10:00', '12:00'), ('08', '14:00', '17:00')]
+        )
+        self.assertEqual(self.windows(duration_minutes=240)[0], [])
+
+    def test_stops_once_no_later_window_can_rank_higher(self):
+        self.assertEqual(self.windows(limit=1)[1], [self.dates[0]])
+        # The first day already has a window where everyone is free; without coalescing
+        # nothing needs to look ahead past it.
+        self.assertEqual(self.windows(rank='most_attendees', limit=1, coalesce=False)[1], [self.dates[0]])
+        self.assertEqual(self.windows(rank='longest', limit=1)[1], self.dates)
+
+    def test_invalid_options(self):
+        for options in ({'limit': 0}, {'duration_minutes': 0}, {'rank': 'best'}):
+            with self.subTest(**options):
+                response = self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+                    'date': self.dates[0], **options
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class StreamedMatchTests(APITestCase):
+    """``Accept: application/x-ndjson`` streams the windows of ranges too long to buffer"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.users = [User.objects.create(username=name) for name in ('ana', 'bia')]
+        self.group = create_group('stream', self.users)
+        self.offsets = [0, 40, 80, 400]
+        for user in self.users:
+            for offset in self.offsets:
+                create_spans(user, [(9, 10)], START_DATE + timedelta(days=offset))
+        self.client.force_authenticate(self.users[0])
+
+    def match(self, days, streaming=True, **options):
+        return self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+            'start_date': START_DATE, 'end_date': START_DATE + timedelta(days=days), **options
+        }, format='json', HTTP_ACCEPT='application/x-ndjson' if streaming else 'application/json')
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(response.streaming)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_streams_long_ranges_day_by_day(self):
+        lines = self.lines(self.match(500))
+        self.assertEqual(
+            [line['date'] for line in lines],
+            [str(START_DATE + timedelta(days=offset)) for offset in self.offsets]
+        )
+        self.assertEqual(
+            lines[0]['users'],
+            [{'username': 'ana', 'title': 'Livre'}, {'username': 'bia', 'title': 'Livre'}]
+        )
+        # Buffered responses keep the shorter limit.
+        self.assertEqual(self.match(500, streaming=False).status_code, 400)
+        self.assertEqual(self.match(5 * 366 + 1).status_code, 400)
+
+    def test_same_windows_as_the_buffered_response(self):
+        self.assertEqual(self.lines(self.match(31)), self.match(31, streaming=False).json())
+        self.assertEqual(
+            [line['date'] for line in self.lines(self.match(500, limit=2))],
+            [str(START_DATE), str(START_DATE + timedelta(days=40))]
+        )
+
+    def test_rankings_need_a_limit(self):
+        self.assertEqual(self.match(500, rank='longest').status_code, 400)
+        self.assertEqual(len(self.lines(self.match(500, rank='longest', limit=3))), 3)
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class CoalescedWindowTests(APITestCase):
+    """Touching windows with the same participants come back as one window"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.users = [User.objects.create(username=name) for name in ('ana', 'bia')]
+        self.group = create_group('coalesce', self.users)
+        create_spans(self.users[0], [(8, 14)])
+        # bia's 08-10 and 10-12 slots share a title, so the windows they split stay mergeable.
+        create_spans(self.users[1], [(8, 10), (10, 12)])
+        create_spans(self.users[1], [(12, 13)], title='Outro')
+        self.client.force_authenticate(self.users[0])
+
+    def windows(self, **options):
+        response = self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+            'date': START_DATE, **options
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(window['start_time'][:5], window['end_time'][:5]) for window in response.json()]
+
+    def test_merges_fragments_with_the_same_participants(self):
+        self.assertEqual(self.windows(), [('08:00', '12:00'), ('12:00', '13:00')])
+        self.assertEqual(self.windows(coalesce=False), [('08:00', '10:00'), ('10:00', '12:00'), ('12:00', '13:00')])
+
+    def test_filters_and_ranks_the_merged_windows(self):
+        self.assertEqual(self.windows(duration_minutes=180), [('08:00', '12:00')])
+        self.assertEqual(self.windows(duration_minutes=180, coalesce=False), [])
+        self.assertEqual(self.windows(rank='longest', limit=1), [('08:00', '12:00')])
+
+    def test_same_windows_from_every_engine(self):
+        for engine in ('bitmap', 'database'):
+            with self.subTest(engine=engine):
+                self.assertEqual(self.windows(engine=engine), [('08:00', '12:00'), ('12:00', '13:00')])
+
+class MatchCacheTests(APITestCase):
+    """Cached matches follow versions stored in the database, not invalidation in this process"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        caches['availability-match'].clear()
+        self.users = [User.objects.create(username=f'cached-{index}') for index in range(3)]
+        self.group = Group.objects.create(name='cached', owner=self.users[0])
+        GroupMembership.objects.bulk_create(
+            GroupMembership(group=self.group, user=user, accepted=True) for user in self.users[:2]
+        )
+        create_slots(self.users, 2, 2)
+        self.client.force_authenticate(self.users[0])
+
+    def match(self):
+        before = match_cache.get_stats()
+        response = self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+            'start_date': START_DATE, 'end_date': START_DATE + timedelta(days=1), 'coalesce': False,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        after = match_cache.get_stats()
+        return response.data, after['hits'] - before['hits']
+
+    def test_writes_reach_cached_results(self):
+        self.assertEqual(self.match()[1], 0)
+        self.assertEqual(self.match()[1], 2)
+
+        # Each step writes without going through the cache, as another process would
+        AvailabilitySlot.objects.filter(user=self.users[1], date=START_DATE + timedelta(days=1), start_time=time(8)).delete()
+        data, hits = self.match()
+        self.assertEqual(hits, 1)
+        self.assertEqual(len(data), 3)
+
+        self.users[1].username = 'renamed'
+        self.users[1].save()
+        data, hits = self.match()
+        self.assertEqual(hits, 0)
+        self.assertTrue(all('renamed' in [user['username'] for user in window['users']] for window in data))
+
+        GroupMembership.objects.create(group=self.group, user=self.users[2], accepted=True)
+        data, hits = self.match()
+        self.assertEqual(hits, 0)
+        self.assertEqual([len(window['users']) for window in data], [3, 3, 3])
+
+
+class DerivedDataTransactionTests(APITestCase):
+    """Slot writes and the data derived from them commit or roll back together"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='writer')
+        self.client.force_authenticate(self.user)
+        self.client.raise_request_exception = True
+
+    def test_failed_refresh_rolls_back_the_write(self):
+        with mock.patch('availability.signals.refresh_daily_bitmaps', side_effect=RuntimeError('refresh failed')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/availability/slots/', {
+                    'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Livre'
+                }, format='json')
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/availability/slots/batch_create/', {'slots': [
+                    {'date': START_DATE, 'start_time': '11:00', 'end_time': '12:00', 'title': 'Livre'}
+                ]}, format='json')
+
+        self.assertFalse(AvailabilitySlot.objects.filter(user=self.user).exists())
+
+    def test_failed_refresh_keeps_deleted_slots(self):
+        create_slots([self.user], 2, 1)
+        with mock.patch('availability.signals.refresh_daily_bitmaps', side_effect=RuntimeError('refresh failed')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/availability/slots/batch_delete/', {'slots': [
+                    {'date': START_DATE, 'start_time': '08:00', 'end_time': '09:00'}
+                ]}, format='json')
+
+        self.assertEqual(AvailabilitySlot.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(DailyAvailabilityBitmap.objects.filter(user=self.user, date=START_DATE).exists())
+
+
+class BatchCreateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='importer')
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_entries_get_one_result_each(self):
+        entries = [
+            {'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Primeiro'},
+            {'date': START_DATE, 'start_time': '10:00', 'end_time': '11:00', 'title': 'Outro'},
+            {'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Segundo', 'is_available': False},
+        ]
+        response = self.client.post('/api/availability/slots/batch_create/', {'slots': entries}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(slot['title'], slot['is_available']) for slot in response.data],
+            [('Primeiro', True), ('Outro', True), ('Segundo', False)]
+        )
+        # The last entry for a (date, start_time, end_time) wins, as with sequential upserts.
+        stored = AvailabilitySlot.objects.get(user=self.user, start_time=time(9))
+        self.assertEqual((stored.title, stored.is_available), ('Segundo', False))
+        self.assertEqual(response.data[0]['id'], stored.id)
+        self.assertEqual(response.data[2]['id'], stored.id)
+        self.assertEqual(AvailabilitySlot.objects.filter(user=self.user).count(), 2)
+
+
+@override_settings(AVAILABILITY_JOB_CHUNK_SIZE=2)
+class SlotImportJobTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='bulk-importer')
+        self.client.force_authenticate(self.user)
+
+    def submit(self, entries):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                '/api/availability/slots/batch_create/', {'slots': entries, 'async': True}, format='json'
+            )
+        return response, callbacks
+
+    def entries(self, days):
+        return [
+            {'date': START_DATE + timedelta(days=day), 'start_time': '09:00', 'end_time': '10:00', 'title': f'Dia {day}'}
+            for day in range(days)
+        ]
+
+    def test_accepts_the_import_and_points_at_the_job(self):
+        response, callbacks = self.submit(self.entries(3))
+
+        self.assertEqual(response.status_code, 202)
+        job = SlotImportJob.objects.get(user=self.user)
+        self.assertEqual(response['Location'], f'http://testserver/api/availability/slot-jobs/{job.id}/')
+        self.assertEqual((response.data['id'], response.data['status'], response.data['total']), (job.id, 'pending', 3))
+        # The slots are only created by the worker, once the request has committed.
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(AvailabilitySlot.objects.filter(user=self.user).exists())
+
+    def test_invalid_imports_are_rejected_without_a_job(self):
+        entries = self.entries(1) + [{'date': START_DATE, 'start_time': '12:00'}]
+        response, callbacks = self.submit(entries)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(SlotImportJob.objects.exists())
+
+    def test_worker_reports_counts_and_per_slot_errors(self):
+        entries = self.entries(4)
+        # Overlaps the entry before it in the same chunk; the later entry wins.
+        entries.insert(3, {'date': START_DATE + timedelta(days=2), 'start_time': '08:00', 'end_time': '09:30', 'title': 'Cedo'})
+        response, _ = self.submit(entries)
+
+        self.assertTrue(run_job(response.data['id']))
+        job = self.client.get(response['Location']).data
+
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['total'], job['processed'], job['created_count'], job['failed_count']), (5, 5, 4, 1))
+        self.assertEqual([error['index'] for error in job['errors']], [2])
+        self.assertEqual(job['errors'][0]['slot']['title'], 'Dia 2')
+        self.assertEqual(
+            sorted(AvailabilitySlot.objects.filter(user=self.user).values_list('title', flat=True)),
+            ['Cedo', 'Dia 0', 'Dia 1', 'Dia 3']
+        )
+        # A finished job is not claimed again.
+        self.assertFalse(run_job(response.data['id']))
+
+    def test_interrupted_job_resumes_after_its_last_chunk(self):
+        response, _ = self.submit(self.entries(5))
+        SlotImportJob.objects.filter(pk=response.data['id']).update(status=SlotImportJob.RUNNING, processed=2)
+
+        self.assertFalse(run_job(response.data['id']))
+        self.assertEqual(requeue_interrupted_jobs(), 1)
+        self.assertTrue(run_job(response.data['id']))
+
+        job = SlotImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.status, job.processed, job.created_count), (SlotImportJob.COMPLETED, 5, 3))
+        self.assertEqual(
+            sorted(AvailabilitySlot.objects.filter(user=self.user).values_list('title', flat=True)),
+            ['Dia 2', 'Dia 3', 'Dia 4']
+        )
+
+    def test_jobs_are_only_visible_to_their_owner(self):
+        response, _ = self.submit(self.entries(1))
+        self.client.force_authenticate(User.objects.create(username='curious'))
+
+        self.assertEqual(self.client.get(response['Location']).status_code, 404)
+        self.assertEqual(self.client.get('/api/availability/slot-jobs/').data, [])
+
+
+class BatchDeleteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cleaner')
+        self.client.force_authenticate(self.user)
+        create_slots([self.user], 3, 2)
+
+    def batch_delete(self, entries):
+        return self.client.post('/api/availability/slots/batch_delete/', {'slots': entries}, format='json')
+
+    def listed(self, slot_date):
+        response = self.client.get('/api/availability/slots/', {'start_date': slot_date, 'end_date': slot_date})
+        return [(slot['start_time'], slot['title']) for slot in response.data['results']]
+
+    def test_deletes_slots_and_reports_the_rest(self):
+        other = User.objects.create(username='bystander')
+        create_slots([other], 1, 1)
+        entries = [
+            {'date': START_DATE, 'start_time': '08:00', 'end_time': '09:00'},
+            {'date': START_DATE + timedelta(days=1), 'start_time': '10:00', 'end_time': '11:00'},
+            {'date': START_DATE, 'start_time': '08:00', 'end_time': '09:00'},
+            {'date': START_DATE, 'start_time': '12:00', 'end_time': '13:00'},
+            {'date': START_DATE, 'start_time': 'noon', 'end_time': '13:00'},
+        ]
+        response = self.batch_delete(entries)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['deleted_count'], 2)
+        # The repeated tuple only matches once, the unknown and malformed ones not at all.
+        self.assertEqual(
+            [(error['slot']['start_time'], error['error'] == 'Slot not found') for error in response.data['errors']],
+            [('08:00', True), ('12:00', True), ('noon', False)]
+        )
+        self.assertEqual(
+            set(AvailabilitySlot.objects.filter(user=self.user).values_list('date', 'start_time')),
+            {(START_DATE, time(9)), (START_DATE, time(10)), (START_DATE + timedelta(days=1), time(8)),
+             (START_DATE + timedelta(days=1), time(9))}
+        )
+        self.assertTrue(AvailabilitySlot.objects.filter(user=other, start_time=time(8)).exists())
+        self.assertEqual(
+            set(SlotChange.objects.filter(user=self.user).values_list('date', flat=True)),
+            {START_DATE, START_DATE + timedelta(days=1)}
+        )
+        self.assertEqual(SlotChange.objects.filter(user=self.user).count(), 4)
+
+    def test_cancels_recurring_occurrences(self):
+        response = self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '18:00', 'end_time': '19:00', 'title': 'Diário',
+            'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=3)}
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.batch_delete([
+            {'date': START_DATE + timedelta(days=1), 'start_time': '18:00', 'end_time': '19:00'},
+            {'date': START_DATE + timedelta(days=1), 'start_time': '08:00', 'end_time': '09:00'},
+        ])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['deleted_count'], 2)
+        self.assertEqual(
+            self.listed(START_DATE + timedelta(days=1)),
+            [('09:00:00', 'Livre'), ('10:00:00', 'Livre')]
+        )
+        self.assertIn(('18:00:00', 'Diário'), self.listed(START_DATE + timedelta(days=2)))
+        self.assertTrue(RecurringSlotOverride.objects.filter(
+            series__title='Diário', date=START_DATE + timedelta(days=1), cancelled=True
+        ).exists())
+
+        # A cancelled occurrence is gone, so deleting it again is reported as not found.
+        response = self.batch_delete([
+            {'date': START_DATE + timedelta(days=1), 'start_time': '18:00', 'end_time': '19:00'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['deleted_count'], 0)
+
+
+class SlotListPaginationTests(APITestCase):
+    """The slot list pages by keyset cursor, merging series occurrences into stored slots"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='pager')
+        self.client.force_authenticate(self.user)
+        for day in range(5):
+            create_spans(self.user, [(8, 9), (10, 11)], START_DATE + timedelta(days=day))
+        response = self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Série',
+            'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=4)}
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def pages(self, **params):
+        pages = []
+        url = '/api/availability/slots/'
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([(slot['date'][-2:], slot['start_time'][:5], slot['title']) for slot in response.json()['results']])
+            url, params = response.data['next'], None
+        return pages
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        [everything] = self.pages(limit=1000)
+        self.assertEqual(len(everything), 15)
+        self.assertEqual(everything[:3], [('07', '08:00', 'Livre'), ('07', '09:00', 'Série'), ('07', '10:00', 'Livre')])
+
+        pages = self.pages(limit=4)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 3])
+        self.assertEqual(sum(pages, []), everything)
+
+    def test_cursor_is_not_shifted_by_earlier_writes(self):
+        [everything] = self.pages(limit=1000)
+        first_page = self.client.get('/api/availability/slots/', {'limit': 4})
+        create_spans(self.user, [(8, 9)], START_DATE - timedelta(days=1))
+        AvailabilitySlot.objects.filter(user=self.user, date=START_DATE).delete()
+
+        second_page = self.client.get(first_page.data['next'])
+        self.assertEqual(
+            [(slot['date'][-2:], slot['start_time'][:5]) for slot in second_page.json()['results']],
+            [(slot_date, start_time) for slot_date, start_time, _ in everything[4:8]]
+        )
+
+    def test_next_link_keeps_the_filters(self):
+        pages = self.pages(limit=4, start_date=START_DATE + timedelta(days=1), end_date=START_DATE + timedelta(days=2))
+        self.assertEqual([len(page) for page in pages], [4, 2])
+        self.assertEqual({slot_date for page in pages for slot_date, _, _ in page}, {'08', '09'})
+
+    def test_page_size_is_bounded(self):
+        self.assertEqual(len(self.client.get('/api/availability/slots/', {'limit': 0}).data['results']), 1)
+        self.assertEqual(len(self.client.get('/api/availability/slots/', {'limit': 'all'}).data['results']), 15)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ['not-a-cursor', 'bm9wZQ==']:
+            response = self.client.get('/api/availability/slots/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class SlotChangesFeedTests(APITestCase):
+    """Delta sync: upserts and tombstones after a cursor of the user's change log"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='syncer')
+        self.client.force_authenticate(self.user)
+
+    def create_slot(self, offset, title='Livre'):
+        slot_date = START_DATE + timedelta(days=offset)
+        response = self.client.post('/api/availability/slots/', {
+            'date': slot_date, 'start_time': '09:00', 'end_time': '10:00', 'title': title
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return AvailabilitySlot.objects.get(user=self.user, date=slot_date).id
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/availability/slots/changes/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json()
+
+    def test_without_since_only_the_cursor_is_returned(self):
+        self.assertEqual(self.changes(), {'cursor': 0, 'has_more': False, 'upserts': [], 'deleted': []})
+        self.create_slot(0)
+        feed = self.changes()
+        self.assertGreater(feed['cursor'], 0)
+        self.assertEqual(feed['upserts'], [])
+
+    def test_upserts_and_tombstones_since_the_cursor(self):
+        kept = self.create_slot(0)
+        removed = self.create_slot(1)
+        cursor = self.changes()['cursor']
+
+        added = self.create_slot(2)
+        self.client.patch(f'/api/availability/slots/{kept}/', {'title': 'Renomeado'}, format='json')
+        self.client.delete(f'/api/availability/slots/{removed}/')
+
+        feed = self.changes(cursor)
+        self.assertEqual([(slot['id'], slot['title']) for slot in feed['upserts']], [(kept, 'Renomeado'), (added, 'Livre')])
+        self.assertEqual(feed['deleted'], [{'id': removed}])
+        self.assertFalse(feed['has_more'])
+        # Nothing changed after the returned cursor.
+        self.assertEqual(self.changes(feed['cursor']), {'cursor': feed['cursor'], 'has_more': False, 'upserts': [], 'deleted': []})
+
+    def test_moved_slots_are_upserted_not_tombstoned(self):
+        slot_id = self.create_slot(0)
+        cursor = self.changes()['cursor']
+        self.client.patch(f'/api/availability/slots/{slot_id}/', {'date': START_DATE + timedelta(days=3)}, format='json')
+
+        feed = self.changes(cursor)
+        self.assertEqual([(slot['id'], slot['date']) for slot in feed['upserts']], [(slot_id, str(START_DATE + timedelta(days=3)))])
+        self.assertEqual(feed['deleted'], [])
+
+    def test_cancelled_occurrences_are_tombstoned_by_series_and_date(self):
+        self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Série',
+            'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=2)}
+        }, format='json')
+        series = RecurringSlot.objects.get(user=self.user)
+        cursor = self.changes()['cursor']
+        self.client.delete(f'/api/availability/recurrences/{series.id}/occurrences/{START_DATE + timedelta(days=1)}/')
+
+        feed = self.changes(cursor)
+        self.assertEqual(feed['deleted'], [{'series': series.id, 'date': str(START_DATE + timedelta(days=1))}])
+        self.assertEqual(feed['upserts'], [])
+
+    def test_limit_pages_through_the_log(self):
+        cursor = self.changes()['cursor']
+        self.client.post('/api/availability/slots/batch_create/', {'slots': [
+            {'date': START_DATE + timedelta(days=offset), 'start_time': '09:00', 'end_time': '10:00', 'title': f'Dia {offset}'}
+            for offset in range(3)
+        ]}, format='json')
+
+        first = self.changes(cursor, limit=2)
+        self.assertTrue(first['has_more'])
+        second = self.changes(first['cursor'], limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [slot['title'] for slot in first['upserts'] + second['upserts']],
+            ['Dia 0', 'Dia 1', 'Dia 2']
+        )
+
+    @override_settings(AVAILABILITY_CHANGE_LOG_RETENTION=2)
+    def test_expired_cursors_are_gone(self):
+        cursor = self.changes()['cursor']
+        slot_ids = [self.create_slot(offset) for offset in range(4)]
+
+        response = self.client.get('/api/availability/slots/changes/', {'since': cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['cursor'], self.changes()['cursor'])
+        self.assertEqual(self.client.get('/api/availability/slots/changes/', {'since': 10 ** 6}).status_code, 410)
+
+        # The compacted log still diffs from the horizon on.
+        self.client.delete(f'/api/availability/slots/{slot_ids[0]}/')
+        self.assertEqual(self.changes(response.data['cursor'])['deleted'], [{'id': slot_ids[0]}])
+
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class ConditionalRequestTests(APITestCase):
+    """Slot lists and matches carry an ETag of the versions behind them and answer 304"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.user = User.objects.create(username='revalidator')
+        self.other = User.objects.create(username='colleague')
+        self.group = create_group('etag', [self.user, self.other])
+        create_spans(self.user, [(9, 12)])
+        create_spans(self.other, [(10, 13)])
+        self.client.force_authenticate(self.user)
+
+    def list_slots(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/availability/slots/', params, **headers)
+
+    def match(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.post(f'/api/availability/group/{self.group.id}/match/', {
+            'start_date': START_DATE, 'end_date': START_DATE
+        }, format='json', **headers)
+
+    def test_unchanged_slot_list_answers_304(self):
+        response = self.list_slots()
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        for tag in [etag, f'W/{etag}', f'"other", {etag}', '*']:
+            with self.subTest(tag=tag):
+                revalidated = self.list_slots(tag)
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated['ETag'], etag)
+                self.assertEqual(revalidated.content, b'')
+
+        # The filters and the user are part of the representation.
+        self.assertEqual(self.list_slots(etag, start_date=START_DATE).status_code, 200)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.list_slots(etag).status_code, 200)
+
+    def test_slot_writes_change_the_etag(self):
+        etag = self.list_slots()['ETag']
+        create_spans(self.user, [(14, 15)])
+
+        response = self.list_slots(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_match_revalidates_against_members_and_roster(self):
+        response = self.match()
+        etag = response['ETag']
+        self.assertEqual(self.match(etag).status_code, 304)
+
+        # Another member's slots...
+        create_spans(self.other, [(15, 16)])
+        response = self.match(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        # ...and the group's roster are both covered.
+        GroupMembership.objects.create(group=self.group, user=User.objects.create(username='newcomer'), accepted=True)
+        response = self.match(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_stats_count_hits_and_misses(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        before = self.client.get('/api/availability/etag/stats/').data.get('slots', {'hits': 0, 'misses': 0})
+
+        self.client.force_authenticate(self.user)
+        etag = self.list_slots()['ETag']
+        self.list_slots(etag)
+        self.list_slots(etag)
+
+        self.client.force_authenticate(admin)
+        after = self.client.get('/api/availability/etag/stats/').data['slots']
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (2, 1))
+
+
+class SlotOverlapTests(APITestCase):
+    """A new slot replaces the parts of the user's slots it overlaps, alone or in a batch"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='splitter')
+        self.client.force_authenticate(self.user)
+
+    def stored(self, slot_date=START_DATE):
+        return sorted(
+            (f'{start:%H:%M}-{end:%H:%M}', title)
+            for start, end, title in AvailabilitySlot.objects.filter(user=self.user, date=slot_date).values_list(
+                'start_time', 'end_time', 'title'
+            )
+        )
+
+    def test_span_lookups(self):
+        create_slots([self.user], 3, 1)
+        slots = AvailabilitySlot.objects.filter(user=self.user)
+
+        self.assertEqual(
+            sorted(slot.start_time.hour for slot in slots.overlapping(START_DATE, time(8, 30), time(10))),
+            [8, 9]
+        )
+        self.assertFalse(slots.overlapping(START_DATE, time(11), time(12)).exists())
+        self.assertFalse(slots.overlapping(START_DATE + timedelta(days=1), time(8), time(9)).exists())
+        self.assertEqual(
+            [slot.start_time.hour for slot in slots.within(START_DATE, time(9), time(10, 30))],
+            [9]
+        )
+        self.assertEqual(
+            slots.with_span().filter(Q(span__overlaps=(START_DATE, time(7), time(8, 1))) | Q(start_time=time(10))).count(),
+            2
+        )
+
+    def test_recurring_create_splits_slots_on_every_date(self):
+        create_slots([self.user], 3, 3)
+        response = self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '09:30', 'end_time': '10:30', 'title': 'Diário',
+            'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=1)}
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        split = [('08:00-09:00', 'Livre'), ('09:00-09:30', 'Livre'), ('10:30-11:00', 'Livre')]
+        self.assertEqual(self.stored(START_DATE), split)
+        self.assertEqual(self.stored(START_DATE + timedelta(days=1)), split)
+        self.assertEqual(
+            self.stored(START_DATE + timedelta(days=2)),
+            [('08:00-09:00', 'Livre'), ('09:00-10:00', 'Livre'), ('10:00-11:00', 'Livre')]
+        )
+
+    def test_batch_create_splits_slots_and_rejects_overlapped_entries(self):
+        AvailabilitySlot.objects.create(
+            user=self.user, date=START_DATE, start_time=time(8), end_time=time(12), title='Antigo'
+        )
+        self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '14:00', 'end_time': '15:00', 'title': 'Série',
+            'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=1)}
+        }, format='json')
+
+        entries = [
+            {'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Primeiro'},
+            {'date': START_DATE, 'start_time': '11:00', 'end_time': '13:00', 'title': 'Depois'},
+            {'date': START_DATE, 'start_time': '09:30', 'end_time': '10:30', 'title': 'Último'},
+            {'date': START_DATE, 'start_time': '14:30', 'end_time': '16:00', 'title': 'Tarde'},
+        ]
+        response = self.client.post('/api/availability/slots/batch_create/', {'slots': entries}, format='json')
+
+        # The later entry wins over the earlier one it overlaps, which gets an error.
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [(error['slot']['title'], error['error']) for error in response.data['errors']],
+            [('Primeiro', 'Overlaps a later slot in this batch')]
+        )
+        self.assertEqual(
+            [slot['title'] for slot in response.data['created_slots']],
+            ['Depois', 'Último', 'Tarde']
+        )
+        self.assertEqual(self.stored(), [
+            ('08:00-09:30', 'Antigo'),
+            ('09:30-10:30', 'Último'),
+            ('10:30-11:00', 'Antigo'),
+            ('11:00-13:00', 'Depois'),
+            ('14:00-14:30', 'Série'),
+            ('14:30-16:00', 'Tarde'),
+        ])
+        # The overlapped occurrence is cancelled; the rest of the series is unchanged.
+        response = self.client.get('/api/availability/slots/', {
+            'start_date': START_DATE, 'end_date': START_DATE + timedelta(days=1)
+        })
+        self.assertEqual(
+            [(slot['date'], slot['start_time']) for slot in response.data['results'] if slot['series']],
+            [(str(START_DATE + timedelta(days=1)), '14:00:00')]
+        )
+
+    def insert_overlapping_slots(self):
+        AvailabilitySlot.objects.bulk_create([
+            AvailabilitySlot(user=self.user, date=START_DATE, start_time=time(8), end_time=time(12), title='Antigo'),
+            AvailabilitySlot(user=self.user, date=START_DATE, start_time=time(9), end_time=time(10), title='Novo'),
+            AvailabilitySlot(user=self.user, date=START_DATE, start_time=time(14), end_time=time(15), title='Sozinho'),
+        ])
+
+    def test_migration_fails_on_overlapping_slots(self):
+        migration = import_module('availability.migrations.0007_availabilityslot_time_range')
+        schema_editor = mock.Mock(connection=mock.Mock(vendor='postgresql'))
+        self.insert_overlapping_slots()
+
+        with self.assertRaisesMessage(RuntimeError, '1 user days have overlapping slots'):
+            migration.add_time_range(django_apps, schema_editor)
+        schema_editor.execute.assert_not_called()
+
+    @mock.patch('django.db.migrations.recorder.MigrationRecorder.applied_migrations', return_value={})
+    def test_check_slot_overlaps_command(self, applied_migrations):
+        self.insert_overlapping_slots()
+
+        with self.assertRaisesMessage(CommandError, '1 days have overlapping slots'):
+            call_command('check_slot_overlaps', stdout=StringIO())
+        self.assertEqual(len(self.stored()), 3)
+
+        call_command('check_slot_overlaps', '--fix', stdout=StringIO())
+        self.assertEqual(self.stored(), [
+            ('08:00-09:00', 'Antigo'), ('09:00-10:00', 'Novo'), ('10:00-12:00', 'Antigo'), ('14:00-15:00', 'Sozinho')
+        ])
+        self.assertEqual(
+            DailyAvailabilityBitmap.objects.get(user=self.user, date=START_DATE).scheduled_bits,
+            build_day_bitmaps([(time(8), time(12), True), (time(14), time(15), True)])[0]
+        )
+        call_command('check_slot_overlaps', stdout=StringIO())
+
+class RecurringOverlapTests(APITestCase):
+    """A new series splits what it overlaps on every date with a fixed number of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='planner')
+        self.client.force_authenticate(self.user)
+
+    def create_series(self, days, **fields):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/availability/slots/', {
+                'date': START_DATE, 'start_time': '09:30', 'end_time': '10:30', 'title': 'Diário',
+                'recurrence': {'repeat_type': 'daily', 'end_date': START_DATE + timedelta(days=days - 1)},
+                **fields
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_dates(self):
+        counts = []
+        # Django deletes up to 100 rows per statement; 40 days overlap 80 slots.
+        for days in (3, 40):
+            AvailabilitySlot.objects.all().delete()
+            RecurringSlot.objects.all().delete()
+            create_slots([self.user], 3, days)
+            counts.append(self.create_series(days))
+            self.assertEqual(AvailabilitySlot.objects.filter(user=self.user).count(), 3 * days)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_overlapped_occurrences_leave_fragments(self):
+        response = self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '09:00', 'end_time': '11:00', 'title': 'Semanal',
+            'recurrence': {'repeat_type': 'weekly', 'end_date': START_DATE + timedelta(days=14)}
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.create_series(8)
+
+        response = self.client.get('/api/availability/slots/', {
+            'start_date': START_DATE, 'end_date': START_DATE + timedelta(days=14)
+        })
+        first_and_last = (str(START_DATE), str(START_DATE + timedelta(days=14)))
+        self.assertEqual(
+            [(slot['date'][-2:], slot['start_time'][:5], slot['end_time'][:5], slot['title'], slot['series'] is None)
+             for slot in response.data['results'] if slot['date'] in first_and_last],
+            [
+                ('07', '09:00', '09:30', 'Semanal', True),
+                ('07', '09:30', '10:30', 'Diário', False),
+                ('07', '10:30', '11:00', 'Semanal', True),
+                ('21', '09:00', '11:00', 'Semanal', False),
+            ]
+        )
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class RecurringSeriesTests(APITestCase):
+    """A recurring slot is stored once and expanded, with its overrides, only when read"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.user = User.objects.create(username='weekly')
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/availability/slots/', {
+            'date': START_DATE, 'start_time': '09:00', 'end_time': '10:00', 'title': 'Reunião',
+            'recurrence': {
+                'repeat_type': 'specific_days', 'weekdays': [0, 2], 'end_date': START_DATE + timedelta(days=27)
+            }
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.series = RecurringSlot.objects.get(user=self.user)
+
+    def listed(self, start_offset=0, end_offset=27):
+        response = self.client.get('/api/availability/slots/', {
+            'start_date': START_DATE + timedelta(days=start_offset), 'end_date': START_DATE + timedelta(days=end_offset)
+        })
+        return [(slot['date'][-2:], slot['start_time'][:5], slot['title']) for slot in response.data['results']]
+
+    def occurrence_url(self, offset):
+        return f'/api/availability/recurrences/{self.series.id}/occurrences/{START_DATE + timedelta(days=offset)}/'
+
+    def test_series_is_stored_once_and_expanded_on_read(self):
+        self.assertFalse(AvailabilitySlot.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            [date for date, _, _ in self.listed()],
+            ['07', '09', '14', '16', '21', '23', '28', '30']
+        )
+        response = self.client.get('/api/availability/slots/', {'start_date': START_DATE, 'end_date': START_DATE})
+        occurrence = response.data['results'][0]
+        self.assertIsNone(occurrence['id'])
+        self.assertEqual(occurrence['series'], self.series.id)
+        self.assertEqual(self.listed(3, 8), [('14', '09:00', 'Reunião')])
+
+    def test_overrides_change_single_occurrences(self):
+        response = self.client.patch(self.occurrence_url(2), {'start_time': '15:00', 'end_time': '16:30'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['start_time'], response.data['title']), ('15:00:00', 'Reunião'))
+        self.assertEqual(self.client.delete(self.occurrence_url(7)).status_code, 204)
+
+        self.assertEqual(
+            self.listed(0, 9),
+            [('07', '09:00', 'Reunião'), ('09', '15:00', 'Reunião'), ('16', '09:00', 'Reunião')]
+        )
+        # A cancelled occurrence can be edited back into the series.
+        self.client.patch(self.occurrence_url(7), {'title': 'Remarcada'}, format='json')
+        self.assertIn(('14', '09:00', 'Remarcada'), self.listed())
+
+    def test_occurrence_errors(self):
+        self.assertEqual(self.client.patch(self.occurrence_url(1), {'title': 'X'}, format='json').status_code, 404)
+        self.assertEqual(self.client.patch(self.occurrence_url(28), {'title': 'X'}, format='json').status_code, 404)
+        response = self.client.patch(self.occurrence_url(0), {'start_time': '11:00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleting_the_series_removes_every_occurrence(self):
+        self.assertEqual(self.client.delete(f'/api/availability/recurrences/{self.series.id}/').status_code, 204)
+        self.assertEqual(self.listed(), [])
+        self.assertFalse(DailyAvailabilityBitmap.objects.filter(user=self.user).exists())
+
+    def test_occurrences_take_part_in_matching(self):
+        other = User.objects.create(username='daily')
+        group = create_group('series', [self.user, other])
+        create_spans(other, [(8, 12)], START_DATE + timedelta(days=2))
+        self.client.patch(self.occurrence_url(2), {'start_time': '10:30', 'end_time': '11:30'}, format='json')
+
+        response = self.client.post(f'/api/availability/group/{group.id}/match/', {
+            'start_date': START_DATE, 'end_date': START_DATE + timedelta(days=6)
+        }, format='json')
+        self.assertEqual(
+            [(window['date'][-2:], window['start_time'][:5], window['end_time'][:5]) for window in response.json()],
+            [('09', '10:30', '11:30')]
+        )
+
+
+def quarter(index):
+    return time(index // 4, index % 4 * 15)
+
+
+@skipUnless(sql_sweep.is_supported(), 'The database engine needs PostgreSQL or SQLite.')
+class DatabaseEngineParityTests(TestCase):
+    """The SQL sweep returns exactly the interval engine's windows"""
+
+    def setUp(self):
+        self.rng = random.Random(17)
+        self.users = [User.objects.create(username=f'member-{index}') for index in range(5)]
+        self.user_ids = [user.id for user in self.users]
+        self.dates = [START_DATE + timedelta(days=offset) for offset in range(4)]
+
+    def random_times(self, count):
+        """``count`` sorted, non-overlapping (possibly touching) times on a 15-minute grid"""
+        points = sorted(self.rng.sample(range(96), count * 2))
+        times = []
+        for index in range(count):
+            start, end = points[2 * index], points[2 * index + 1]
+            if times and self.rng.random() < 0.3:
+                start = times[-1][1]
+            times.append((start, end))
+        return [(quarter(start), quarter(end)) for start, end in times]
+
+    def store_random_slots(self):
+        """Stored slots never overlap for the same user, as the PostgreSQL exclusion constraint requires"""
+        AvailabilitySlot.objects.all().delete()
+        AvailabilitySlot.objects.bulk_create(
+            AvailabilitySlot(
+                user=user,
+                date=day,
+                start_time=start_time,
+                end_time=end_time,
+                title=f'{user.username} {start_time:%H:%M}',
+                is_available=self.rng.random() < 0.8
+            )
+            for user in self.users
+            for day in self.dates
+            for start_time, end_time in self.random_times(self.rng.randrange(5))
+        )
+
+    def random_occurrences(self):
+        """Series occurrences are not stored, so they may overlap the user's slots"""
+        extra_rows = defaultdict(list)
+        for user in self.users:
+            for day in self.dates:
+                for start_time, end_time in self.random_times(self.rng.randrange(3)):
+                    extra_rows[day].append(SlotRow(user.id, user.username, day, start_time, end_time, 'Série'))
+        return dict(extra_rows)
+
+    def python_windows(self, required, extra_rows, available_only):
+        slots = AvailabilitySlot.objects.filter(user_id__in=self.user_ids, date__in=self.dates)
+        if available_only:
+            slots = slots.filter(is_available=True)
+        rows = defaultdict(list)
+        for row in fetch_slot_rows(slots):
+            rows[row.date].append(row)
+        days = [(day, rows[day] + extra_rows.get(day, [])) for day in self.dates]
+        return [
+            (day, start_time, end_time, [(row.username, row.title) for row in covering])
+            for day, start_time, end_time, covering in iter_matched_intervals(days, self.user_ids, required=required)
+        ]
+
+    def test_random_slot_sets(self):
+        matched = 0
+        for trial in range(10):
+            self.store_random_slots()
+            occurrences = self.random_occurrences()
+            for required in (None, 1, 2, 4):
+                for extra_rows in ({}, occurrences):
+                    for available_only in (True, False):
+                        with self.subTest(trial=trial, required=required, occurrences=bool(extra_rows),
+                                          available_only=available_only):
+                            expected = self.python_windows(required, extra_rows, available_only)
+                            self.assertEqual(
+                                list(sql_sweep.iter_database_windows(
+                                    self.user_ids, self.dates, required, extra_rows, available_only
+                                )),
+                                expected
+                            )
+                            matched += len(expected)
+        self.assertGreater(matched, 0)
+
+
+
+@override_settings(AVAILABILITY_MATCH_CACHE=None)
+class BitmapEngineParityTests(APITestCase):
+    """The bitmap engine returns exactly the interval engine's windows, with or without a quorum"""
+
+    def setUp(self):
+        caches['group-roster'].clear()
+        self.rng = random.Random(29)
+        self.users = [User.objects.create(username=f'bit-{index}') for index in range(5)]
+        self.user_ids = [user.id for user in self.users]
+        self.dates = [START_DATE + timedelta(days=offset) for offset in range(6)]
+
+    def random_rows(self, day, unaligned=False):
+        """Rows on a 5-minute grid; a user's rows may overlap, as series occurrences can"""
+        rows = []
+        for user in self.users:
+            for _ in range(self.rng.randrange(4)):
+                start = self.rng.randrange(8 * 12, 20 * 12)
+                end = min(start + self.rng.randrange(1, 48), 24 * 12 - 1)
+                start_time, end_time = time(start // 12, start % 12 * 5), time(end // 12, end % 12 * 5)
+                if unaligned and self.rng.random() < 0.3:
+                    end_time = end_time.replace(second=30)
+                rows.append(SlotRow(user.id, user.username, day, start_time, end_time, f'{user.username} {start}'))
+        return rows
+
+    def windows(self, days, engine, required):
+        return [
+            (day, start_time, end_time, [(row.username, row.title) for row in covering])
+            for day, start_time, end_time, covering in iter_matched_intervals(days, self.user_ids, engine, required)
+        ]
+
+    def test_random_rows(self):
+        matched = 0
+        for trial in range(25):
+            days = [(day, self.random_rows(day, unaligned=trial % 5 == 0)) for day in self.dates]
+            for required in (None, 1, 2, 3, 5, 6):
+                with self.subTest(trial=trial, required=required):
+                    expected = self.windows(days, ENGINE_INTERVAL, required)
+                    self.assertEqual(self.windows(days, ENGINE_BITMAP, required), expected)
+                    matched += len(expected)
+        self.assertGreater(matched, 0)
+
+    def test_group_match_endpoint(self):
+        group = Group.objects.create(name='parity', owner=self.users[0])
+        GroupMembership.objects.bulk_create(
+            GroupMembership(group=group, user=user, accepted=True) for user in self.users
+        )
+        with collect_slot_changes():
+            for day in self.dates:
+                kept = {}
+                for row in self.random_rows(day):
+                    # Stored slots of one user may not overlap; keep the first of any overlapping pair.
+                    if any(row.start_time < end and row.end_time > start for start, end in kept.get(row.user_id, [])):
+                        continue
+                    kept.setdefault(row.user_id, []).append((row.start_time, row.end_time))
+                    AvailabilitySlot.objects.create(
+                        user_id=row.user_id, date=day, start_time=row.start_time, end_time=row.end_time,
+                        title=row.title, is_available=self.rng.random() < 0.9
+                    )
+        self.client.force_authenticate(self.users[0])
+
+        for min_members in (None, 2, 3, 0.5, 1.0):
+            with self.subTest(min_members=min_members):
+                results = {}
+                for engine in (ENGINE_INTERVAL, ENGINE_BITMAP):
+                    payload = {
+                        'start_date': self.dates[0], 'end_date': self.dates[-1], 'engine': engine, 'coalesce': False
+                    }
+                    if min_members is not None:
+                        payload['min_members'] = min_members
+                    response = self.client.post(f'/api/availability/group/{group.id}/match/', payload, format='json')
+                    self.assertEqual(response.status_code, 200, response.data)
+                    results[engine] = response.data
+                self.assertEqual(results[ENGINE_BITMAP], results[ENGINE_INTERVAL])
+                if min_members == 2:
+                    self.assertTrue(results[ENGINE_INTERVAL])
+
+def aggregate_day_stats(user_id):
+    """Each day's ``(slot_count, total_duration, hour_counts)`` from aggregate queries plus the series occurrences"""
+    slots = AvailabilitySlot.objects.filter(user_id=user_id).annotate(
+        duration=ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+    )
+    days = {
+        day['date']: [day['count'], day['total'], [0] * 24]
+        for day in slots.values('date').annotate(count=Count('id'), total=Sum('duration'))
+    }
+    for slot_date, hour, count in slots.annotate(hour=ExtractHour('start_time')).values_list(
+        'date', 'hour'
+    ).annotate(count=Count('id')):
+        days[slot_date][2][hour] += count
+    for slot in expand_recurring_slots(recurring_slots([user_id])):
+        day = days.setdefault(slot.date, [0, timedelta(), [0] * 24])
+        day[0] += 1
+        day[1] += datetime.combine(slot.date, slot.end_time) - datetime.combine(slot.date, slot.start_time)
+        day[2][slot.start_time.hour] += 1
+    return {slot_date: tuple(day) for slot_date, day in days.items()}
+
+
+class SlotStatsRollupTests(APITestCase):
+    """After every kind of slot write the rollups equal the aggregate queries they replaced"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='planner')
+        self.other = User.objects.create(username='bystander')
+        create_slots([self.other], 2, 3)
+        self.client.force_authenticate(self.user)
+
+    def assertRollupsMatchAggregates(self):
+        for user in (self.user, self.other):
+            stats = UserSlotStats.objects.filter(user=user).first()
+            stored = (
+                (stats.slot_count, stats.total_duration, stats.hour_counts, stats.weekday_counts)
+                if stats else (0, timedelta(), [0] * 24, [0] * 7)
+            )
+            self.assertEqual(stored, aggregate_slot_stats(user.id))
+            self.assertEqual(
+                {
+                    day.date: (day.slot_count, day.total_duration, day.hour_counts)
+                    for day in DailySlotStats.objects.filter(user=user)
+                },
+                aggregate_day_stats(user.id)
+            )
+
+    def slot_id(self, slot_date, start_time):
+        return AvailabilitySlot.objects.get(user=self.user, date=slot_date, start_time=start_time).id
+
+    def test_writes_keep_rollups_equal_to_aggregates(self):
+        day = [START_DATE + timedelta(days=offset) for offset in range(15)]
+        self.assertRollupsMatchAggregates()
+
+        steps = [
+            ('create', lambda: self.client.post('/api/availability/slots/', {
+                'date': day[0], 'start_time': '09:00', 'end_time': '10:00', 'title': 'Livre'
+            }, format='json')),
+            ('create', lambda: self.client.post('/api/availability/slots/', {
+                'date': day[1], 'start_time': '14:00', 'end_time': '16:30', 'title': 'Ocupado', 'is_available': False
+            }, format='json')),
+            ('move to another day', lambda: self.client.patch(
+                f'/api/availability/slots/{self.slot_id(day[0], time(9))}/', {'date': day[2]}, format='json'
+            )),
+            ('move within the day', lambda: self.client.patch(
+                f'/api/availability/slots/{self.slot_id(day[1], time(14))}/',
+                {'start_time': '07:00', 'end_time': '08:45'}, format='json'
+            )),
+            ('create series', lambda: self.client.post('/api/availability/slots/', {
+                'date': day[3], 'start_time': '18:00', 'end_time': '19:00', 'title': 'Diário',
+                'recurrence': {'repeat_type': 'daily', 'end_date': day[9]}
+            }, format='json')),
+            ('move occurrence', lambda: self.client.patch(
+                f'/api/availability/recurrences/{RecurringSlot.objects.get(title="Diário").id}/occurrences/{day[5]}/',
+                {'start_time': '20:15', 'end_time': '21:00'}, format='json'
+            )),
+            ('cancel occurrence', lambda: self.client.delete(
+                f'/api/availability/recurrences/{RecurringSlot.objects.get(title="Diário").id}/occurrences/{day[6]}/'
+            )),
+            ('batch create', lambda: self.client.post('/api/availability/slots/batch_create/', {'slots': [
+                {'date': day[4], 'start_time': '10:00', 'end_time': '11:00', 'title': 'Lote'},
+                {'date': day[4], 'start_time': '11:00', 'end_time': '12:00', 'title': 'Lote'},
+                {'date': day[0], 'start_time': '12:00', 'end_time': '13:00', 'title': 'Semanal',
+                 'recurrence': {'repeat_type': 'weekly', 'end_date': day[14]}},
+            ]}, format='json')),
+            ('batch delete', lambda: self.client.post('/api/availability/slots/batch_delete/', {'slots': [
+                {'date': day[4], 'start_time': '10:00', 'end_time': '11:00'},
+                {'date': day[2], 'start_time': '09:00', 'end_time': '10:00'},
+            ]}, format='json')),
+            ('delete', lambda: self.client.delete(
+                f'/api/availability/slots/{self.slot_id(day[1], time(7))}/'
+            )),
+            ('delete series', lambda: self.client.delete(
+                f'/api/availability/recurrences/{RecurringSlot.objects.get(title="Diário").id}/'
+            )),
+        ]
+        for step, request in steps:
+            with self.subTest(step=step):
+                response = request()
+                self.assertLess(response.status_code, 300, response.data)
+                self.assertRollupsMatchAggregates()
+
+        # Left: the batch's 11:00 slot and the weekly series' three occurrences
+        self.assertEqual(UserSlotStats.objects.get(user=self.user).slot_count, 4)
@@ -1,14 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AvailabilitySlotViewSet, CommonAvailabilityView, GroupCommonAvailabilityView
+from .views import (
+    AvailabilitySlotViewSet,
+    CommonAvailabilityView,
+    ConditionalRequestStatsView,
+    GroupCommonAvailabilityView,
+    MatchCacheStatsView,
+    RecurringSlotViewSet,
+    SlotImportJobViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'slots', AvailabilitySlotViewSet, basename='availability-slot')
+router.register(r'recurrences', RecurringSlotViewSet, basename='recurring-slot')
+router.register(r'slot-jobs', SlotImportJobViewSet, basename='slot-import-job')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('common/', CommonAvailabilityView.as_view(), name='common-availability'),
     path('group/<int:group_id>/match/', GroupCommonAvailabilityView.as_view(), name='group-common-availability'),
+    path('match-cache/stats/', MatchCacheStatsView.as_view(), name='match-cache-stats'),
+    path('etag/stats/', ConditionalRequestStatsView.as_view(), name='etag-stats'),
 ]
 
 
@@ -1,34 +1,162 @@
-from django.shortcuts import render
-from rest_framework import viewsets, permissions, generics
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework import mixins, viewsets, permissions, generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.contrib.auth.models import User
-from .models import AvailabilitySlot
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from .models import AvailabilitySlot, RecurringSlot, RecurringSlotOverride, SlotImportJob
+from . import match_cache
+from .bitmap_store import AVAILABLE, SCHEDULED, find_candidate_dates
+from .change_log import CursorExpired, current_cursor, get_changes
+from .etags import get_stats as get_etag_stats, make_etag, not_modified, slot_versions, tag_response
+from .instrumentation import server_timing, track_queries
+from .jobs import enqueue_job
+from .matching import (
+    ENGINE_DATABASE,
+    RANK_EARLIEST,
+    coalesce_windows,
+    fetch_occurrence_rows,
+    fetch_slot_rows,
+    iter_common_slots,
+    iter_daily_common_slots,
+    iter_earliest_windows,
+    iter_slot_rows_by_date,
+    resolve_min_members,
+    select_windows,
+)
+from .recurrence import (
+    build_occurrence,
+    cancel_occurrences,
+    iter_series_dates,
+    iter_sorted_occurrences,
+    occurrences_by_date,
+    recurring_slots,
+)
+from .pagination import SlotKeysetPagination
+from .renderers import NDJSONRenderer
+from .signals import collect_slot_changes, mark_slot_dates_changed
+from .sql_sweep import iter_database_daily_slots
 from .serializers import (
     AvailabilitySlotSerializer, 
-    CommonAvailabilitySerializer,
     CommonAvailabilityRequestSerializer,
     GroupCommonAvailabilityRequestSerializer,
-    BatchAvailabilitySlotSerializer
+    BatchAvailabilitySlotSerializer,
+    RecurringSlotOverrideSerializer,
+    RecurringSlotSerializer,
+    SlotChangesRequestSerializer,
+    SlotImportJobSerializer
 )
-from datetime import time, timedelta, datetime, date
-from collections import defaultdict
-from groups.models import Group, GroupMembership
+from datetime import timedelta
+from groups.models import Group
+from groups.permissions import IsGroupMember
+from groups.roster import get_roster
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import action
-import datetime
+
+# OR'd (date, start_time, end_time) lookups per query; SQLite caps expression depth at 1000.
+BATCH_DELETE_CHUNK_SIZE = 500
+
+def delete_slots(user_id, keys):
+    """
+    Delete the user's one-off slots matching the ``(date, start_time, end_time)``
+    keys and return ``{key: id}`` for the rows removed. On PostgreSQL a single
+    DELETE joins the slots to the keys unnested from three array parameters, so
+    the statement's size does not grow with the request; other databases look the
+    rows up in chunks of OR-ed conditions and delete them by id.
+    """
+    if not keys:
+        return {}
+
+    if connection.vendor != 'postgresql':
+        found = {}
+        for offset in range(0, len(keys), BATCH_DELETE_CHUNK_SIZE):
+            chunk = keys[offset:offset + BATCH_DELETE_CHUNK_SIZE]
+            match = reduce(
+                lambda combined, key: combined | Q(date=key[0], start_time=key[1], end_time=key[2]),
+                chunk,
+                Q(pk__in=[])
+            )
+            for pk, slot_date, start_time, end_time in AvailabilitySlot.objects.filter(
+                match, user_id=user_id
+            ).values_list('id', 'date', 'start_time', 'end_time'):
+                found[slot_date, start_time, end_time] = pk
+
+        # post_delete receivers keep the derived data in sync, so Django loads the
+        # rows once more before issuing a single DELETE ... WHERE id IN (...).
+        if found:
+            AvailabilitySlot.objects.filter(pk__in=found.values()).delete()
+        return found
+
+    meta = AvailabilitySlot._meta
+    qn = connection.ops.quote_name
+    columns = [qn(meta.get_field(name).column) for name in ('date', 'start_time', 'end_time')]
+    sql = (
+        'DELETE FROM {table} AS slot '
+        'USING unnest(%s::date[], %s::time[], %s::time[]) AS requested ({columns}) '
+        'WHERE slot.{user} = %s AND {match} '
+        'RETURNING slot.{id}, slot.{date}, slot.{start_time}, slot.{end_time}'
+    ).format(
+        table=qn(meta.db_table),
+        columns=', '.join(columns),
+        user=qn(meta.get_field('user').column),
+        match=' AND '.join(f'slot.{column} = requested.{column}' for column in columns),
+        id=qn(meta.pk.column),
+        date=columns[0],
+        start_time=columns[1],
+        end_time=columns[2],
+    )
+    params = [[key[index] for key in keys] for index in range(3)] + [user_id]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        found = {(slot_date, start_time, end_time): pk for pk, slot_date, start_time, end_time in cursor.fetchall()}
+
+    # The raw DELETE sends no post_delete signals; mark the days for the derived data here.
+    mark_slot_dates_changed({(user_id, slot_date) for slot_date, _, _ in found})
+    return found
 
 class AvailabilitySlotViewSet(viewsets.ModelViewSet):
     serializer_class = AvailabilitySlotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SlotKeysetPagination
+
+    def get_filter_params(self):
+        """Parsed ``date``, ``start_date``, ``end_date``, ``start_time`` and ``end_time`` list filters"""
+        params = {}
+        for name, field in (
+            ('date', 'date'),
+            ('start_date', 'date'),
+            ('end_date', 'date'),
+            ('start_time', 'start_time'),
+            ('end_time', 'end_time'),
+        ):
+            value = self.request.query_params.get(name)
+            try:
+                params[name] = AvailabilitySlot._meta.get_field(field).to_python(value) if value else None
+            except DjangoValidationError as e:
+                raise ValidationError({name: e.messages})
+        return params
 
     def get_queryset(self):
         queryset = AvailabilitySlot.objects.filter(user=self.request.user)
-        
-        date = self.request.query_params.get('date')
-        start_time = self.request.query_params.get('start_time')
-        end_time = self.request.query_params.get('end_time')
-        
+        params = self.get_filter_params()
+        date, start_time, end_time = params['date'], params['start_time'], params['end_time']
+
+        if params['start_date']:
+            queryset = queryset.filter(date__gte=params['start_date'])
+
+        if params['end_date']:
+            queryset = queryset.filter(date__lte=params['end_date'])
+
+        if date and start_time and end_time:
+            return queryset.within(date, start_time, end_time)
+
         if date:
             queryset = queryset.filter(date=date)
         
@@ -39,6 +167,38 @@ class AvailabilitySlotViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(end_time__lte=end_time)
             
         return queryset
+
+    def get_occurrences(self, from_date=None):
+        """
+        Occurrences of the user's recurring series that match the list filters,
+        starting at ``from_date`` and lazily yielded in slot list order.
+        """
+        params = self.get_filter_params()
+        start_time, end_time = params['start_time'], params['end_time']
+        first = max(filter(None, (params['date'], params['start_date'], from_date)), default=None)
+        last = min(filter(None, (params['date'], params['end_date'])), default=None)
+
+        occurrences = iter_sorted_occurrences(recurring_slots([self.request.user.id], first, last), first, last)
+        return (
+            slot for slot in occurrences
+            if (not start_time or slot.start_time >= start_time)
+            and (not end_time or slot.end_time <= end_time)
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(
+            'slots',
+            request.user.id,
+            slot_versions([request.user.id])[request.user.id],
+            request.build_absolute_uri(),
+            request.accepted_renderer.format
+        )
+        response = not_modified(request, 'slots', etag)
+        if response is not None:
+            return response
+
+        slots = self.paginator.paginate_slots(self.get_queryset(), self.get_occurrences, request)
+        return tag_response(self.get_paginated_response(self.get_serializer(slots, many=True).data), etag)
     
     def perform_create(self, serializer):
         validated_data = {
@@ -49,13 +209,70 @@ class AvailabilitySlotViewSet(viewsets.ModelViewSet):
         if not validated_data.get('is_available', True):
             validated_data['title'] = 'Ocupado'
 
-        serializer.create(validated_data)
+        with collect_slot_changes():
+            serializer.create(validated_data)
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        with collect_slot_changes():
+            mark_slot_dates_changed([(instance.user_id, instance.date)])
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
+                # PostgreSQL rejects same-user overlaps through the time_range exclusion constraint.
+                raise ValidationError({'detail': 'This slot overlaps another slot.'})
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Upserted slots and tombstones since the ``since`` cursor. Apply ``deleted``
+        before ``upserts``, and keep calling with the returned cursor while
+        ``has_more`` is true. An expired cursor gets 410 with the current cursor, to
+        be used after reloading the slot list.
+        """
+        serializer = SlotChangesRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        if 'since' not in serializer.validated_data:
+            return Response({'cursor': current_cursor(request.user), 'has_more': False, 'upserts': [], 'deleted': []})
+
+        try:
+            cursor, upserts, deleted, has_more = get_changes(
+                request.user, serializer.validated_data['since'], serializer.validated_data['limit']
+            )
+        except CursorExpired as e:
+            return Response(
+                {'detail': 'This cursor has expired; reload the slot list.', 'cursor': e.cursor},
+                status=status.HTTP_410_GONE
+            )
+
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'upserts': self.get_serializer(upserts, many=True).data,
+            'deleted': deleted,
+        })
 
     @action(detail=False, methods=['post'], url_path='batch_create')
     def batch_create(self, request):
         serializer = BatchAvailabilitySlotSerializer(data=request.data)
+        if serializer.is_valid() and request.data.get('async'):
+            # Large imports are validated here and created by the background worker pool.
+            with transaction.atomic():
+                job = SlotImportJob.objects.create(
+                    user=request.user,
+                    payload=request.data['slots'],
+                    total=len(request.data['slots'])
+                )
+                enqueue_job(job)
+            response = Response(SlotImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = reverse('slot-import-job-detail', args=[job.id], request=request)
+            return response
+
         if serializer.is_valid():
-            result = serializer.create({'user': request.user, 'slots': serializer.validated_data['slots']})
+            with collect_slot_changes():
+                result = serializer.create({'user': request.user, 'slots': serializer.validated_data['slots']})
             
             if result['errors']:
                 return Response({
@@ -72,35 +289,116 @@ class AvailabilitySlotViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='batch_delete')
     def batch_delete(self, request):
         slots_data = request.data.get('slots', [])
-        deleted_count = 0
         errors = []
 
+        # Parse every requested (date, start_time, end_time) tuple up front; repeated
+        # tuples only match once, as they did when slots were deleted one by one.
+        requested = []
         for slot_data in slots_data:
             try:
-                slot = AvailabilitySlot.objects.get(
-                    user=request.user,
-                    date=slot_data['date'],
-                    start_time=slot_data['start_time'],
-                    end_time=slot_data['end_time']
-                )
-                slot.delete()
-                deleted_count += 1
-            except AvailabilitySlot.DoesNotExist:
+                requested.append((slot_data, self._slot_key(slot_data), None))
+            except Exception as e:
+                requested.append((slot_data, None, e))
+
+        keys = list(dict.fromkeys(key for _, key, error in requested if error is None))
+        with collect_slot_changes():
+            found = delete_slots(request.user.id, keys)
+
+            # Tuples that are not one-off slots may be occurrences of a recurring series,
+            # which are cancelled with an override instead.
+            missing = {key for key in keys if key not in found}
+            cancelled = []
+            if missing:
+                cancelled = [
+                    slot
+                    for day_slots in occurrences_by_date(
+                        [request.user.id], min(key[0] for key in missing), max(key[0] for key in missing)
+                    ).values()
+                    for slot in day_slots
+                    if (slot.date, slot.start_time, slot.end_time) in missing
+                ]
+                cancel_occurrences(cancelled)
+                mark_slot_dates_changed({(request.user.id, slot.date) for slot in cancelled})
+            removed = found.keys() | {(slot.date, slot.start_time, slot.end_time) for slot in cancelled}
+
+        matched = set()
+        for slot_data, key, error in requested:
+            if error is not None:
                 errors.append({
                     'slot': slot_data,
-                    'error': 'Slot not found'
+                    'error': str(error)
                 })
-            except Exception as e:
+            elif key in removed and key not in matched:
+                matched.add(key)
+            else:
                 errors.append({
                     'slot': slot_data,
-                    'error': str(e)
+                    'error': 'Slot not found'
                 })
 
         return Response({
-            'deleted_count': deleted_count,
+            'deleted_count': len(found) + len(cancelled),
             'errors': errors
         }, status=status.HTTP_200_OK if not errors else status.HTTP_207_MULTI_STATUS)
 
+    @staticmethod
+    def _slot_key(slot_data):
+        return tuple(
+            AvailabilitySlot._meta.get_field(field).to_python(slot_data[field])
+            for field in ('date', 'start_time', 'end_time')
+        )
+
+class SlotImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Progress, counts and per-slot errors of the user's background slot imports"""
+    serializer_class = SlotImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return SlotImportJob.objects.filter(user=self.request.user).order_by('-created_at')
+
+class RecurringSlotViewSet(mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    serializer_class = RecurringSlotSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringSlot.objects.filter(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        with collect_slot_changes():
+            instance.delete()
+
+    @action(detail=True, methods=['patch', 'delete'], url_path=r'occurrences/(?P<occurrence_date>\d{4}-\d{2}-\d{2})')
+    def occurrence(self, request, pk=None, occurrence_date=None):
+        """Edit (PATCH) or cancel (DELETE) one occurrence without touching the rest of the series"""
+        series = self.get_object()
+        occurrence_date = AvailabilitySlot._meta.get_field('date').to_python(occurrence_date)
+        if not any(iter_series_dates(series, occurrence_date, occurrence_date)):
+            return Response(
+                {'detail': 'The series has no occurrence on this date.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        override = (
+            RecurringSlotOverride.objects.filter(series=series, date=occurrence_date).first()
+            or RecurringSlotOverride(series=series, date=occurrence_date)
+        )
+
+        if request.method == 'DELETE':
+            override.cancelled = True
+            with collect_slot_changes():
+                override.save()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = RecurringSlotOverrideSerializer(override, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with collect_slot_changes():
+            override = serializer.save(cancelled=False)
+
+        return Response(AvailabilitySlotSerializer(build_occurrence(series, occurrence_date, override)).data)
+
 class CommonAvailabilityView(generics.CreateAPIView):
     serializer_class = CommonAvailabilityRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -114,142 +412,228 @@ class CommonAvailabilityView(generics.CreateAPIView):
         user_ids.append(request.user.id)
         user_ids = list(dict.fromkeys(user_ids))
 
-        slots = AvailabilitySlot.objects.filter(
-            user_id__in=user_ids,
-            date=date
-        )
-        
-        user_slots = defaultdict(list)
-        time_points = set()
-        for slot in slots:
-            user_slots[slot.user_id].append(slot)
-            time_points.add(slot.start_time)
-            time_points.add(slot.end_time)
-
-        if len(user_slots) < 2:
-            return Response([])
-
-        time_points = sorted(time_points)
-        common_slots = []
-        for i in range(len(time_points) - 1):
-            interval_start = time_points[i]
-            interval_end = time_points[i + 1]
-            users_info = []
-            all_available = True
-            for uid in user_ids:
-                slot = next((s for s in user_slots[uid] if s.start_time <= interval_start and s.end_time >= interval_end), None)
-                if slot:
-                    user = User.objects.get(id=uid)
-                    users_info.append({
-                        'username': user.username,
-                        'title': slot.title
-                    })
+        with track_queries() as queries:
+            etag = make_etag(
+                'common',
+                list(slot_versions(user_ids).items()),
+                sorted(serializer.validated_data.items()),
+                request.accepted_renderer.format
+            )
+            response = not_modified(request, 'common', etag)
+            if response is not None:
+                return response
+
+            if settings.AVAILABILITY_DAILY_BITMAPS and not find_candidate_dates(user_ids, date, date, SCHEDULED):
+                common_slots = []
+            else:
+                engine = serializer.validated_data['engine']
+                occurrences = fetch_occurrence_rows(user_ids, date, date)
+                if engine == ENGINE_DATABASE:
+                    windows = (
+                        slot
+                        for _, day_slots in iter_database_daily_slots(
+                            user_ids, [date], extra_rows=occurrences, available_only=False
+                        )
+                        for slot in day_slots
+                    )
                 else:
-                    all_available = False
-                    break
-            if all_available:
-                common_slots.append({
-                    'date': date,
-                    'start_time': interval_start,
-                    'end_time': interval_end,
-                    'users': users_info
-                })
-        return Response(common_slots)
+                    rows = fetch_slot_rows(AvailabilitySlot.objects.filter(
+                        user_id__in=user_ids,
+                        date=date
+                    ))
+                    rows.extend(occurrences.get(date, []))
+                    windows = iter_common_slots([(date, rows)], user_ids, engine=engine)
+
+                if serializer.validated_data['coalesce']:
+                    windows = coalesce_windows(windows)
+
+                common_slots = select_windows(
+                    windows,
+                    duration_minutes=serializer.validated_data.get('duration_minutes'),
+                    limit=serializer.validated_data.get('limit'),
+                    rank=serializer.validated_data['rank'],
+                    max_attendees=len(user_ids)
+                )
+
+        response = tag_response(Response(common_slots), etag)
+        response['Server-Timing'] = server_timing(queries)
+        return response
 
 class GroupCommonAvailabilityView(generics.CreateAPIView):
     serializer_class = GroupCommonAvailabilityRequestSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+    # Days computed per cache lookup / range query when streaming.
+    stream_chunk_days = 31
+
+    def is_streaming(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return renderer is not None and renderer.format == NDJSONRenderer.format
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'streaming': self.is_streaming()}
+
+    def iter_computed_days(self, user_ids, dates, engine, required):
+        """Compute the common slots of the given dates, yielding ``(date, slots)`` in order"""
+        start_date, end_date = dates[0], dates[-1]
+        requested = set(dates)
+        wanted = set(requested)
+        if settings.AVAILABILITY_DAILY_BITMAPS:
+            wanted &= find_candidate_dates(user_ids, start_date, end_date, AVAILABLE, required)
+
+        occurrences = {}
+        if wanted:
+            occurrences = {
+                day: rows
+                for day, rows in fetch_occurrence_rows(
+                    user_ids, min(wanted), max(wanted), available_only=True
+                ).items()
+                if day in wanted
+            }
+
+        if engine == ENGINE_DATABASE:
+            yield from iter_database_daily_slots(
+                user_ids, dates, required, extra_rows=occurrences, only_dates=wanted
+            )
+            return
 
-    def get_common_slots_for_date(self, date_obj, user_ids):
-        """Helper method to find common slots for a specific date"""
         slots = AvailabilitySlot.objects.filter(
             user_id__in=user_ids,
-            date=date_obj,
             is_available=True
         )
-        
-        user_slots = defaultdict(list)
-        time_points = set()
-        for slot in slots:
-            user_slots[slot.user_id].append(slot)
-            time_points.add(slot.start_time)
-            time_points.add(slot.end_time)
-
-        if len(user_slots) < 2:
-            return []
-
-        time_points = sorted(time_points)
-        common_slots = []
-        
-        for i in range(len(time_points) - 1):
-            interval_start = time_points[i]
-            interval_end = time_points[i + 1]
-            users_info = []
-            all_available = True
-            
-            for uid in user_ids:
-                slot = next(
-                    (s for s in user_slots[uid] 
-                     if s.start_time <= interval_start and s.end_time >= interval_end),
-                    None
+        days = (
+            (day, rows)
+            for day, rows in iter_slot_rows_by_date(
+                slots, start_date, end_date, only_dates=wanted, extra_rows=occurrences
+            )
+            if day in requested
+        )
+        yield from iter_daily_common_slots(days, user_ids, engine=engine, required=required)
+
+    def iter_group_slots(self, group, user_ids, dates, options):
+        """
+        Yield the group's common slots in chronological order, serving cached days
+        from the match cache and computing (then caching) the others lazily, so a
+        caller that stops early never computes the remaining days.
+        """
+        cached, cache_keys = {}, None
+        if match_cache.is_enabled():
+            cached, cache_keys = match_cache.lookup(group, user_ids, dates, options)
+
+        missing = [day for day in dates if day not in cached]
+        computed = self.iter_computed_days(user_ids, missing, **options) if missing else iter(())
+
+        for day in dates:
+            if day in cached:
+                day_slots = cached[day]
+            else:
+                _, day_slots = next(computed)
+                if cache_keys:
+                    match_cache.store(cache_keys, {day: day_slots})
+            yield from day_slots
+
+    def iter_ndjson(self, group, user_ids, dates, options, validated_data):
+        """Stream the group's windows as NDJSON lines, one chunk of days at a time"""
+        def iter_slots():
+            for offset in range(0, len(dates), self.stream_chunk_days):
+                yield from self.iter_group_slots(
+                    group, user_ids, dates[offset:offset + self.stream_chunk_days], options
                 )
-                if slot:
-                    user = User.objects.get(id=uid)
-                    users_info.append({
-                        'username': user.username,
-                        'title': slot.title
-                    })
-                else:
-                    all_available = False
-                    break
-                    
-            if all_available:
-                common_slots.append({
-                    'date': date_obj,
-                    'start_time': interval_start,
-                    'end_time': interval_end,
-                    'users': users_info
-                })
-                
-        return common_slots
+
+        slots = iter_slots()
+        if validated_data['coalesce']:
+            slots = coalesce_windows(slots)
+
+        if validated_data['rank'] == RANK_EARLIEST:
+            windows = iter_earliest_windows(
+                slots,
+                duration_minutes=validated_data.get('duration_minutes'),
+                limit=validated_data.get('limit')
+            )
+        else:
+            windows = select_windows(
+                slots,
+                duration_minutes=validated_data.get('duration_minutes'),
+                limit=validated_data['limit'],
+                rank=validated_data['rank'],
+                max_attendees=len(user_ids)
+            )
+
+        for window in windows:
+            yield NDJSONRenderer.render_line(window)
 
     def post(self, request, group_id, *args, **kwargs):
-        group = get_object_or_404(Group, id=group_id)
-        
-        if not GroupMembership.objects.filter(
-            group=group,
-            user=request.user,
-            accepted=True
-        ).exists():
-            return Response(
-                {'detail': 'You are not a member of this group.'},
-                status=status.HTTP_403_FORBIDDEN
+        with track_queries() as queries:
+            # IsGroupMember already checked the (cached) roster.
+            group = get_object_or_404(Group, id=group_id)
+
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+
+            user_ids = list(get_roster(group.id).member_ids)
+
+            if 'date' in serializer.validated_data:
+                start_date = end_date = serializer.validated_data['date']
+            else:
+                start_date = serializer.validated_data['start_date']
+                end_date = serializer.validated_data['end_date']
+
+            dates = [
+                start_date + timedelta(days=offset)
+                for offset in range((end_date - start_date).days + 1)
+            ]
+            options = {
+                'engine': serializer.validated_data['engine'],
+                'required': resolve_min_members(serializer.validated_data.get('min_members'), len(user_ids)),
+            }
+
+            # The group's version covers its roster, each member's version their slots.
+            etag = make_etag(
+                'group-match',
+                group.id,
+                group.version,
+                list(slot_versions(user_ids).items()),
+                sorted(serializer.validated_data.items()),
+                request.accepted_renderer.format
             )
+            response = not_modified(request, 'group-match', etag)
+            if response is not None:
+                return response
 
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        
-        user_ids = list(GroupMembership.objects.filter(
-            group=group,
-            accepted=True
-        ).values_list('user_id', flat=True))
-        
-        user_ids = list(dict.fromkeys(user_ids))
+            if self.is_streaming():
+                return tag_response(StreamingHttpResponse(
+                    self.iter_ndjson(group, user_ids, dates, options, serializer.validated_data),
+                    content_type=NDJSONRenderer.media_type
+                ), etag)
 
-        all_common_slots = []
-        
-        if 'date' in serializer.validated_data:
-            target_date = serializer.validated_data['date']
-            common_slots = self.get_common_slots_for_date(target_date, user_ids)
-            all_common_slots.extend(common_slots)
-        else:
-            start_date = serializer.validated_data['start_date']
-            end_date = serializer.validated_data['end_date']
-            current_date = start_date
-            
-            while current_date <= end_date:
-                common_slots = self.get_common_slots_for_date(current_date, user_ids)
-                all_common_slots.extend(common_slots)
-                current_date += timedelta(days=1)
+            slots = self.iter_group_slots(group, user_ids, dates, options)
+            if serializer.validated_data['coalesce']:
+                slots = coalesce_windows(slots)
+
+            all_common_slots = select_windows(
+                slots,
+                duration_minutes=serializer.validated_data.get('duration_minutes'),
+                limit=serializer.validated_data.get('limit'),
+                rank=serializer.validated_data['rank'],
+                max_attendees=len(user_ids)
+            )
+
+        response = tag_response(Response(all_common_slots), etag)
+        response['Server-Timing'] = server_timing(queries)
+        return response
+
+
+class MatchCacheStatsView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(match_cache.get_stats())
+
+
+class ConditionalRequestStatsView(generics.GenericAPIView):
+    """Per-endpoint 304 (hit) and full response (miss) counters of the ETag checks"""
+    permission_classes = [permissions.IsAdminUser]
 
-        return Response(all_common_slots)
+    def get(self, request, *args, **kwargs):
+        return Response(get_etag_stats())
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from groups.models import Group, GroupMembership
+from groups.models import Group, GroupMembership, InviteNotification
 
 admin.site.register(Group)
-admin.site.register(GroupMembership)
\ No newline at end of file
+admin.site.register(GroupMembership)
+admin.site.register(InviteNotification)
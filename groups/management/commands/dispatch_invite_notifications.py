@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from groups.models import InviteNotification
+from groups.notifications import dispatch_due, retry_dead, run_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending group invite notifications from the outbox to n8n'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-dead', action='store_true',
+                            help='First return dead-lettered notifications to the queue with their attempts reset')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep dispatching as a worker (for GROUP_INVITE_OUTBOX_DISPATCHER=False deployments)')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f'{retry_dead()} dead notifications requeued.')
+
+        if options['loop']:
+            self.stdout.write('Dispatching invite notifications; press Ctrl+C to stop.')
+            try:
+                run_dispatcher()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        processed = dispatch_due()
+        counts = {
+            status: InviteNotification.objects.filter(status=status).count()
+            for status, _ in InviteNotification.STATUS_CHOICES
+        }
+        self.stdout.write(
+            f"{processed} notifications processed; {counts['pending']} pending, "
+            f"{counts['sent']} sent, {counts['dead']} dead."
+        )
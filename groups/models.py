@@ -1,10 +1,13 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Group(models.Model):
     name = models.CharField(max_length=100, unique=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_groups')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incrementado a cada alteração do grupo ou dos seus convites/membros (ETags)
+    version = models.PositiveBigIntegerField(default=0)
     members = models.ManyToManyField(
         User,
         through='GroupMembership',
@@ -24,4 +27,35 @@ class GroupMembership(models.Model):
     accepted_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ('group', 'user')
\ No newline at end of file
+        unique_together = ('group', 'user')
+
+class InviteNotification(models.Model):
+    """
+    Outbox de convites: gravado na mesma transação que a associação e entregue ao
+    n8n em lotes pelo despachante de groups.notifications. Depois da última
+    tentativa o evento fica como ``dead`` para ser reenviado manualmente.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='groups_invite_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.payload.get("invited_user")} ({self.status})'
@@ -0,0 +1,193 @@
+import logging
+import threading
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from .models import InviteNotification
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def invite_payload(group, user, invited_by):
+    return {
+        "group": group.name,
+        "invited_user": user.username,
+        "invited_email": user.email,
+        "invited_by": invited_by.username,
+        "accept_link": f"https://your-site.com/groups/{group.id}/accept/"
+    }
+
+
+def enqueue_invites(payloads):
+    """
+    Grava os convites no outbox. Deve ser chamado na transação que cria as
+    associações: o convite só existe para o despachante se a associação existir.
+    """
+    if not payloads:
+        return
+    InviteNotification.objects.bulk_create([InviteNotification(payload=payload) for payload in payloads])
+    transaction.on_commit(wake_dispatcher)
+
+
+def _get_session():
+    """Sessão compartilhada, que reaproveita as conexões com o n8n entre os lotes"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.auth = HTTPBasicAuth(settings.N8N_BASIC_USER, settings.N8N_BASIC_PASSWORD)
+            _session = session
+        return _session
+
+
+def retry_delay(attempts):
+    """Espera antes da próxima tentativa: dobra a cada falha, até o máximo configurado"""
+    delay = settings.GROUP_INVITE_OUTBOX_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.GROUP_INVITE_OUTBOX_MAX_BACKOFF))
+
+
+def _record_failure(batch, error):
+    now = timezone.now()
+    for notification in batch:
+        notification.attempts += 1
+        notification.last_error = error
+        if notification.attempts >= settings.GROUP_INVITE_OUTBOX_MAX_ATTEMPTS:
+            notification.status = InviteNotification.DEAD
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+    InviteNotification.objects.bulk_update(batch, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def claim_batch(due_before=None):
+    """
+    Reserva um lote de convites vencidos até ``due_before`` (agora, por padrão):
+    numa transação curta, com SKIP LOCKED, adia o ``next_attempt_at`` das linhas
+    pelo prazo de envio. Outros despachantes não as pegam enquanto o prazo durar,
+    e, se este processo morrer no meio do envio, elas voltam à fila quando ele vencer.
+    """
+    with transaction.atomic():
+        batch = list(
+            InviteNotification.objects.select_for_update(skip_locked=True).filter(
+                status=InviteNotification.PENDING,
+                next_attempt_at__lte=due_before or timezone.now()
+            ).order_by('next_attempt_at', 'id')[:settings.GROUP_INVITE_OUTBOX_BATCH_SIZE]
+        )
+        if batch:
+            InviteNotification.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+                next_attempt_at=timezone.now() + timedelta(seconds=settings.GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT)
+            )
+    return batch
+
+
+def dispatch_batch(due_before=None):
+    """
+    Envia ao n8n, numa única chamada ``{"invites": [...]}``, um lote de convites
+    vencidos até ``due_before`` (agora, por padrão) e retorna quantos foram
+    processados. O lote é reservado antes (``claim_batch``), então o POST corre
+    fora de qualquer transação, sem bloquear linhas.
+    """
+    batch = claim_batch(due_before)
+    if not batch:
+        return 0
+
+    try:
+        response = _get_session().post(
+            settings.GROUP_INVITE_WEBHOOK_URL,
+            json={"invites": [notification.payload for notification in batch]},
+            timeout=settings.GROUP_INVITE_WEBHOOK_TIMEOUT
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning('Falha ao enviar %s convites ao n8n: %s', len(batch), e)
+        _record_failure(batch, str(e))
+    else:
+        InviteNotification.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+            status=InviteNotification.SENT,
+            sent_at=timezone.now(),
+            last_error=''
+        )
+    return len(batch)
+
+
+def dispatch_due():
+    """
+    Envia em lotes os convites vencidos até agora; os que falharem ficam para a
+    próxima chamada. Retorna quantos foram processados.
+    """
+    due_before = timezone.now()
+    processed = 0
+    while True:
+        count = dispatch_batch(due_before)
+        if not count:
+            return processed
+        processed += count
+
+
+def next_attempt_at():
+    return InviteNotification.objects.filter(status=InviteNotification.PENDING).order_by(
+        'next_attempt_at'
+    ).values_list('next_attempt_at', flat=True).first()
+
+
+def retry_dead():
+    """Devolve os convites descartados à fila, com as tentativas zeradas; retorna quantos"""
+    return InviteNotification.objects.filter(status=InviteNotification.DEAD).update(
+        status=InviteNotification.PENDING,
+        attempts=0,
+        next_attempt_at=timezone.now()
+    )
+
+
+def run_dispatcher(stop=None):
+    """
+    Laço do despachante: envia o que estiver vencido e dorme até a próxima
+    tentativa agendada, um novo convite (``wake_dispatcher``) ou o intervalo de
+    varredura, o que vier primeiro.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        _wake.clear()
+        close_old_connections()
+        timeout = settings.GROUP_INVITE_OUTBOX_POLL_INTERVAL
+        try:
+            dispatch_due()
+            due = next_attempt_at()
+            if due is not None:
+                # Ao menos 1s: um convite vencido pode estar bloqueado por outro despachante
+                timeout = min(timeout, max((due - timezone.now()).total_seconds(), 1))
+        except Exception:
+            logger.exception('Erro no despachante de convites')
+        finally:
+            connection.close()
+        _wake.wait(timeout)
+
+
+def wake_dispatcher():
+    """
+    Acorda o despachante em segundo plano, iniciando-o na primeira vez. Os pontos
+    de entrada WSGI/ASGI o iniciam ao subir, para retomar os convites pendentes.
+    """
+    global _dispatcher
+    if not settings.GROUP_INVITE_OUTBOX_DISPATCHER:
+        return
+    with _dispatcher_lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _dispatcher = threading.Thread(target=run_dispatcher, name='invite-outbox', daemon=True)
+            _dispatcher.start()
+    _wake.set()
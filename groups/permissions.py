@@ -0,0 +1,19 @@
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound
+
+from .roster import get_roster
+
+
+class IsGroupMember(permissions.BasePermission):
+    """
+    Permite apenas membros aceitos do grupo indicado pela URL (``group_id``). Usa o
+    roster em cache, então não consulta o banco quando o grupo já está no cache.
+    """
+    message = 'You are not a member of this group.'
+    group_url_kwarg = 'group_id'
+
+    def has_permission(self, request, view):
+        roster = get_roster(view.kwargs[self.group_url_kwarg])
+        if roster is None:
+            raise NotFound()
+        return request.user.id in roster.member_ids
@@ -0,0 +1,54 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Group, GroupMembership
+
+# Membros aceitos (em ordem de associação) de um grupo.
+Roster = namedtuple('Roster', ['member_ids'])
+
+
+def _cache():
+    return caches[settings.GROUP_ROSTER_CACHE]
+
+
+def _key(group_id):
+    return f'group-roster:{group_id}'
+
+
+def get_roster(group_id):
+    """
+    Roster do grupo, ou None se ele não existir. Vem do cache quando possível; os
+    sinais de groups.signals o invalidam a cada alteração de associação e o TTL
+    limita o atraso entre processos.
+    """
+    key = _key(group_id)
+    roster = _cache().get(key)
+    if roster is not None:
+        return Roster(*roster)
+
+    if not Group.objects.filter(pk=group_id).exists():
+        return None
+    member_ids = tuple(
+        GroupMembership.objects.filter(group_id=group_id, accepted=True).order_by('id').values_list('user_id', flat=True)
+    )
+    roster = Roster(member_ids)
+    _cache().set(key, tuple(roster))
+    return roster
+
+
+def is_member(group_id, user_id):
+    roster = get_roster(group_id)
+    return roster is not None and user_id in roster.member_ids
+
+
+def invalidate_roster(group_id):
+    """
+    Remove o roster agora, para as leituras desta transação, e de novo no commit,
+    para que uma leitura concorrente não guarde o estado anterior.
+    """
+    key = _key(group_id)
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
@@ -12,10 +12,11 @@ class GroupSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'owner', 'owner_id', 'created_at', 'members']
 
     def get_members(self, obj):
-        return [
-            membership.user.username
-            for membership in obj.memberships.filter(accepted=True)
-        ]
+        # Usa as associações pré-carregadas pela listagem; um grupo recém-criado faz a consulta
+        memberships = getattr(obj, 'accepted_memberships', None)
+        if memberships is None:
+            memberships = obj.memberships.filter(accepted=True).select_related('user')
+        return [membership.user.username for membership in memberships]
 
 class GroupMembershipSerializer(serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field='username', queryset=User.objects.all())
@@ -25,4 +26,11 @@ class GroupMembershipSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = GroupMembership
-        fields = ['id', 'group', 'group_id', 'user', 'invited_by', 'accepted', 'invited_at']
\ No newline at end of file
+        fields = ['id', 'group', 'group_id', 'user', 'invited_by', 'accepted', 'invited_at']
+
+class GroupBulkInviteSerializer(serializers.Serializer):
+    users = serializers.ListField(
+        child=serializers.CharField(max_length=254),
+        allow_empty=False,
+        max_length=1000
+    )
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Group, GroupMembership
+from .roster import invalidate_roster
+
+
+def bump_group_version(group_id):
+    Group.objects.filter(pk=group_id).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, **kwargs):
+    # Um grupo novo começa na versão 0; depois, qualquer alteração (ex.: novo dono) gera uma nova versão
+    if not created:
+        bump_group_version(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_roster(instance.pk)
+
+
+@receiver(post_delete, sender=GroupMembership)
+@receiver(post_save, sender=GroupMembership)
+def membership_changed(sender, instance, origin=None, **kwargs):
+    # Ao deletar o grupo, os convites são removidos em cascata e não há versão a atualizar
+    if isinstance(origin, Group) or getattr(origin, 'model', None) is Group:
+        return
+    bump_group_version(instance.group_id)
+    invalidate_roster(instance.group_id)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Só consulta o username anterior quando ele pode ter mudado (o login grava só last_login)
+    instance._username_changed = False
+    if raw or instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+    instance._username_changed = previous is not None and previous != instance.username
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Membros e convites mostram usernames: os grupos em que o usuário é membro ou
+    # convidou alguém mudam de versão, e as ETags deles junto
+    if getattr(instance, '_username_changed', False):
+        Group.objects.filter(
+            pk__in=GroupMembership.objects.filter(Q(user=instance) | Q(invited_by=instance)).values('group_id')
+        ).update(version=F('version') + 1)
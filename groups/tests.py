@@ -1,2 +1,405 @@
-from django.test import TestCase
+import base64
+import importlib
+import json
+import re
+import sys
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
+import requests
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import views
+from .models import Group, GroupMembership, InviteNotification
+from .notifications import claim_batch, dispatch_batch, enqueue_invites, invite_payload
+from .roster import get_roster
+from .signals import bump_group_version
+
+
+class GroupTestCase(APITestCase):
+    def setUp(self):
+        caches['group-roster'].clear()
+
+    def make_group(self, name, owner, members=(), pending=()):
+        group = Group.objects.create(name=name, owner=owner)
+        GroupMembership.objects.create(group=group, user=owner, invited_by=owner, accepted=True)
+        for user in members:
+            GroupMembership.objects.create(group=group, user=user, invited_by=owner, accepted=True)
+        for user in pending:
+            GroupMembership.objects.create(group=group, user=user, invited_by=owner, accepted=False)
+        return Group.objects.get(pk=group.pk)
+
+
+class GroupVersionTests(GroupTestCase):
+    """Salvar um grupo carregado antes de um bump concorrente não desfaz o bump"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create(username='dono')
+        self.member = User.objects.create(username='membro')
+        self.client.force_authenticate(self.owner)
+
+    def stale_group(self, **members):
+        group = self.make_group('grupo', self.owner, **members)
+        bump_group_version(group.id)
+        return group
+
+    def test_transfer_ownership_keeps_concurrent_bump(self):
+        stale = self.stale_group(members=[self.member])
+        version = Group.objects.get(pk=stale.pk).version
+
+        with mock.patch('groups.views.get_object_or_404', return_value=stale):
+            response = self.client.post('/api/groups/transfer-ownership/', {
+                'group_id': stale.id, 'new_owner_username': 'membro'
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        group = Group.objects.get(pk=stale.pk)
+        self.assertEqual(group.owner, self.member)
+        self.assertEqual(group.version, version + 1)
+
+    def test_automatic_transfer_keeps_concurrent_bump(self):
+        stale = self.stale_group(members=[self.member])
+        version = Group.objects.get(pk=stale.pk).version
+
+        with mock.patch('groups.views.get_object_or_404', return_value=stale):
+            response = self.client.post('/api/groups/remove-member/', {
+                'group_id': stale.id, 'username': 'dono'
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        group = Group.objects.get(pk=stale.pk)
+        self.assertEqual(group.owner, self.member)
+        # Um bump pelo novo dono e outro pela saída do antigo
+        self.assertEqual(group.version, version + 2)
+
+
+class GroupQueryCountTests(GroupTestCase):
+    """Listagens com número fixo de consultas, seja qual for o número de grupos ou associações"""
+
+    sizes = [1, 8]
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='usuario')
+        self.client.force_authenticate(self.user)
+
+    def make_users(self, prefix, count):
+        return [User.objects.create(username=f'{prefix}-{index}') for index in range(count)]
+
+    def test_group_list(self):
+        created = 0
+        for size in self.sizes:
+            with self.subTest(groups=size):
+                for index in range(size):
+                    owner = User.objects.create(username=f'dono-{size}-{index}')
+                    members = [self.user, *self.make_users(f'membro-{size}-{index}', size)]
+                    pending = self.make_users(f'convidado-{size}-{index}', size)
+                    self.make_group(f'grupo-{size}-{index}', owner, members=members, pending=pending)
+                created += size
+                # Um grupo em que o usuário só foi convidado não aparece
+                self.make_group(f'convite-{size}', User.objects.create(username=f'outro-{size}'), pending=[self.user])
+
+                with self.assertNumQueries(3):
+                    response = self.client.get('/api/groups/')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), created)
+                self.assertTrue(all(len(group['members']) == size + 2 for group in response.data[-size:]))
+
+    def test_group_members(self):
+        for size in self.sizes:
+            with self.subTest(members=size):
+                group = self.make_group(
+                    f'grupo-{size}', self.user,
+                    members=self.make_users(f'membro-{size}', size),
+                    pending=self.make_users(f'convidado-{size}', size)
+                )
+
+                with self.assertNumQueries(4):
+                    response = self.client.get(f'/api/groups/{group.id}/members/')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), size + 1)
+                self.assertTrue(all(membership['invited_by'] == 'usuario' for membership in response.data))
+
+    def test_pending_invites(self):
+        invited = 0
+        for size in self.sizes:
+            with self.subTest(invites=size):
+                for index in range(size):
+                    owner = User.objects.create(username=f'dono-{size}-{index}')
+                    self.make_group(f'grupo-{size}-{index}', owner, pending=[self.user])
+                invited += size
+
+                with self.assertNumQueries(1):
+                    response = self.client.get('/api/groups/pending-invites/')
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), invited)
+                self.assertTrue(all(invite['group'].startswith('grupo-') for invite in response.data))
+
+
+class GroupMembersETagTests(GroupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create(username='dono')
+        self.member = User.objects.create(username='membro')
+        self.group = self.make_group('grupo', self.owner, members=[self.member])
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/groups/{self.group.id}/members/'
+        self.etag = self.client.get(self.url)['ETag']
+
+    def revalidate(self):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+
+    def test_unchanged_members_answer_304(self):
+        self.member.last_login = timezone.now()
+        self.member.save(update_fields=['last_login'])
+        self.member.save()
+
+        self.assertEqual(self.revalidate().status_code, 304)
+
+    def test_username_change_invalidates_etag(self):
+        for user, username in [(self.member, 'membro-novo'), (self.owner, 'dono-novo')]:
+            with self.subTest(username=username):
+                user.username = username
+                user.save()
+
+                response = self.revalidate()
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(username, [membership['user'] for membership in response.data])
+                self.etag = response['ETag']
+        # O dono também aparece como quem convidou os membros
+        self.assertEqual({membership['invited_by'] for membership in response.data}, {'dono-novo'})
+
+
+class GroupBulkInviteTests(GroupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create(username='dono')
+        self.rival = User.objects.create(username='rival')
+        self.client.force_authenticate(self.owner)
+
+    def test_invite_lost_to_concurrent_request(self):
+        group = self.make_group('grupo', self.owner, members=[self.rival])
+        first, second = User.objects.create(username='primeiro'), User.objects.create(username='segundo')
+        insert = views.insert_invites
+
+        def racing_insert(*args):
+            # Outra requisição convida o segundo usuário entre a leitura das associações e a
+            # escrita, no mesmo instante do relógio
+            GroupMembership.objects.create(group=group, user=second, invited_by=self.rival, accepted=False)
+            return insert(*args)
+
+        now = timezone.now()
+        with mock.patch('groups.views.insert_invites', side_effect=racing_insert), \
+                mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.post(f'/api/groups/{group.id}/invite/bulk/', {
+                'users': ['primeiro', 'segundo']
+            }, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['invited_count'], 1)
+        self.assertEqual(
+            [(result['user'], result['status']) for result in response.data['results']],
+            [('primeiro', 'invited'), ('segundo', 'already_invited')]
+        )
+        self.assertEqual(
+            [notification.payload['invited_user'] for notification in InviteNotification.objects.all()],
+            ['primeiro']
+        )
+        self.assertEqual(GroupMembership.objects.get(group=group, user=second).invited_by, self.rival)
+        membership = GroupMembership.objects.get(group=group, user=first)
+        self.assertEqual((membership.invited_by, membership.accepted, membership.invited_at), (self.owner, False, now))
+
+
+class StaleRosterTests(GroupTestCase):
+    """Remoção e transferência de propriedade não confiam num roster desatualizado"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create(username='dono')
+        self.member = User.objects.create(username='membro')
+        self.group = self.make_group('grupo', self.owner, members=[self.member])
+        # O membro sai por outro processo, cujo cache não é o deste
+        get_roster(self.group.id)
+        with mock.patch('groups.signals.invalidate_roster'):
+            GroupMembership.objects.filter(group=self.group, user=self.member).delete()
+        self.assertIn(self.member.id, get_roster(self.group.id).member_ids)
+
+    def test_transfer_to_departed_member(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/api/groups/transfer-ownership/', {
+            'group_id': self.group.id, 'new_owner_username': 'membro'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).owner, self.owner)
+
+    def test_departed_member_cannot_remove(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.post('/api/groups/remove-member/', {
+            'group_id': self.group.id, 'username': 'membro'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_owner_leaving_ignores_departed_member(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/api/groups/remove-member/', {
+            'group_id': self.group.id, 'username': 'dono'
+        }, format='json')
+
+        # Sem outros membros no banco, o grupo é apagado em vez de passar ao membro que saiu
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Group.objects.filter(pk=self.group.pk).exists())
+
+
+class InviteDispatchTests(TransactionTestCase):
+    """O lote é reservado numa transação curta e enviado fora dela"""
+
+    def setUp(self):
+        self.notifications = InviteNotification.objects.bulk_create(
+            InviteNotification(payload={'invited_user': f'convidado-{index}'}) for index in range(3)
+        )
+        session = mock.Mock()
+        patcher = mock.patch('groups.notifications._get_session', return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.post = session.post
+
+    def test_posts_claimed_batch_outside_transaction(self):
+        def post(*args, **kwargs):
+            self.assertFalse(connection.in_atomic_block)
+            # Outro despachante não pega as linhas reservadas
+            self.assertEqual(claim_batch(), [])
+            return mock.Mock()
+
+        self.post.side_effect = post
+        self.assertEqual(dispatch_batch(), 3)
+
+        self.post.assert_called_once()
+        self.assertEqual(InviteNotification.objects.filter(status=InviteNotification.SENT).count(), 3)
+
+    def test_failed_post_is_retried_with_backoff(self):
+        self.post.side_effect = requests.ConnectionError('n8n fora do ar')
+        before = timezone.now()
+        with self.assertLogs('groups.notifications', 'WARNING'):
+            self.assertEqual(dispatch_batch(), 3)
+
+        for notification in InviteNotification.objects.all():
+            self.assertEqual(notification.status, InviteNotification.PENDING)
+            self.assertEqual(notification.attempts, 1)
+            self.assertEqual(notification.last_error, 'n8n fora do ar')
+            self.assertLess(notification.next_attempt_at, before + timedelta(seconds=settings.GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT))
+
+    def test_unfinished_batch_is_due_again_when_claim_expires(self):
+        # O processo que reservou o lote morreu antes de enviá-lo
+        self.assertEqual(len(claim_batch()), 3)
+        self.assertEqual(dispatch_batch(), 0)
+
+        expired = timezone.now() + timedelta(seconds=settings.GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT + 1)
+        self.assertEqual(dispatch_batch(expired), 3)
+        self.assertEqual(InviteNotification.objects.filter(status=InviteNotification.SENT).count(), 3)
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    """Guarda cada corpo recebido e responde com o próximo status da fila do servidor"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.headers['Authorization'], json.loads(body)))
+        self.send_response(self.server.statuses.pop(0) if self.server.statuses else 200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(GROUP_INVITE_OUTBOX_DISPATCHER=False, N8N_BASIC_USER='n8n', N8N_BASIC_PASSWORD='segredo')
+class InviteDispatchStubServerTests(TransactionTestCase):
+    """O despachante contra um servidor HTTP local no lugar do n8n"""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+        self.server.received, self.server.statuses = [], []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # A sessão compartilhada guarda as credenciais da primeira chamada
+        patcher = mock.patch('groups.notifications._session', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        url = f'http://127.0.0.1:{self.server.server_port}/webhook/group-invite'
+        settings_override = override_settings(GROUP_INVITE_WEBHOOK_URL=url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        owner = User(username='dono')
+        group = Group(id=7, name='grupo')
+        self.payloads = [
+            invite_payload(group, User(username=f'convidado-{index}', email=f'c{index}@example.com'), owner)
+            for index in range(2)
+        ]
+        enqueue_invites(self.payloads)
+
+    def test_posts_batch_and_retries_after_failure(self):
+        self.server.statuses = [503]
+        before = timezone.now()
+        with self.assertLogs('groups.notifications', 'WARNING'):
+            self.assertEqual(dispatch_batch(), 2)
+
+        for notification in InviteNotification.objects.all():
+            self.assertEqual((notification.status, notification.attempts), (InviteNotification.PENDING, 1))
+            self.assertIn('503', notification.last_error)
+            backoff = timedelta(seconds=settings.GROUP_INVITE_OUTBOX_BACKOFF)
+            self.assertGreaterEqual(notification.next_attempt_at, before + backoff)
+            self.assertLess(notification.next_attempt_at, timezone.now() + backoff)
+        # Ainda em espera: nada é reenviado antes do backoff
+        self.assertEqual(dispatch_batch(), 0)
+
+        self.assertEqual(dispatch_batch(timezone.now() + backoff), 2)
+        self.assertEqual(InviteNotification.objects.filter(status=InviteNotification.SENT).count(), 2)
+
+        auth = 'Basic ' + base64.b64encode(b'n8n:segredo').decode()
+        self.assertEqual(self.server.received, [(auth, {'invites': self.payloads})] * 2)
+
+    def test_workflow_reads_the_posted_fields(self):
+        """O workflow do n8n separa ``body.invites`` em itens e só lê campos do payload"""
+        with open(settings.BASE_DIR / 'workflows n8n' / 'gmail' / 'gmail.json', encoding='utf-8') as workflow_file:
+            nodes = {node['type']: node for node in json.load(workflow_file)['nodes']}
+
+        self.assertEqual(nodes['n8n-nodes-base.splitOut']['parameters']['fieldToSplitOut'], 'body.invites')
+        fields = set(re.findall(r'\$json\.(\w+)', json.dumps(nodes['n8n-nodes-base.gmail']['parameters'])))
+        self.assertTrue(fields)
+        self.assertLessEqual(fields, set(self.payloads[0]))
+
+
+class DispatcherStartupTests(SimpleTestCase):
+    """Só os pontos de entrada que atendem requisições iniciam o despachante"""
+
+    def test_entrypoints_start_dispatcher(self):
+        for module in ('timemesh.wsgi', 'timemesh.asgi'):
+            with self.subTest(module=module), mock.patch('groups.notifications.wake_dispatcher') as wake_dispatcher, \
+                    mock.patch.dict(sys.modules):
+                sys.modules.pop(module, None)
+                importlib.import_module(module)
+                wake_dispatcher.assert_called_once_with()
+
+    def test_app_loading_does_not_start_dispatcher(self):
+        with mock.patch('groups.notifications.wake_dispatcher') as wake_dispatcher:
+            django_apps.get_app_config('groups').ready()
+        wake_dispatcher.assert_not_called()
@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     GroupListCreateView,
     GroupInviteView,
+    GroupBulkInviteView,
     GroupAcceptInviteView,
     GroupMembersListView,
     PendingInvitesListView,
@@ -16,6 +17,7 @@ urlpatterns = [
     path('remove-member/', GroupRemoveMemberView.as_view(), name='group-remove-member'),
     path('transfer-ownership/', GroupTransferOwnershipView.as_view(), name='group-transfer-ownership'),
     path('<int:group_id>/invite/', GroupInviteView.as_view(), name='group-invite'),
+    path('<int:group_id>/invite/bulk/', GroupBulkInviteView.as_view(), name='group-bulk-invite'),
     path('<int:group_id>/accept/', GroupAcceptInviteView.as_view(), name='group-accept-invite'),
     path('<int:group_id>/reject/', GroupRejectInviteView.as_view(), name='group-reject-invite'),
     path('<int:group_id>/members/', GroupMembersListView.as_view(), name='group-members'),
@@ -1,24 +1,45 @@
 from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from availability.etags import make_etag, not_modified, tag_response
 from .models import Group, GroupMembership
-from .serializers import GroupSerializer, GroupMembershipSerializer
+from .notifications import enqueue_invites, invite_payload
+from .roster import is_member
+from .serializers import GroupBulkInviteSerializer, GroupSerializer, GroupMembershipSerializer
+from .signals import bump_group_version
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Lower
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-import requests
-import os
-from requests.auth import HTTPBasicAuth
 
 class GroupListCreateView(generics.ListCreateAPIView):
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        # As duas condições num único filter() valem para a mesma associação, que é única
+        # por (grupo, usuário): cada grupo aparece uma vez e convites pendentes não entram.
         return Group.objects.filter(
-            members=self.request.user,
+            memberships__user=self.request.user,
             memberships__accepted=True
+        ).select_related('owner').prefetch_related(
+            Prefetch(
+                'memberships',
+                queryset=GroupMembership.objects.filter(accepted=True).select_related('user'),
+                to_attr='accepted_memberships'
+            )
         )
 
+    def list(self, request, *args, **kwargs):
+        # A ETag muda quando um grupo entra ou sai da lista, ou quando a versão de algum deles muda
+        versions = sorted(self.get_queryset().prefetch_related(None).values_list('id', 'version'))
+        etag = make_etag('groups', request.user.id, versions, request.accepted_renderer.format)
+        response = not_modified(request, 'groups', etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return tag_response(response, etag)
+
     def perform_create(self, serializer):
         group = serializer.save(owner=self.request.user)
         GroupMembership.objects.create(
@@ -45,41 +66,129 @@ class GroupInviteView(views.APIView):
         
         if GroupMembership.objects.filter(group=group, user=user).exists():
             return Response({'detail': 'User already invited or is a member.'}, status=400)
-            
-        GroupMembership.objects.create(
-            group=group,
-            user=user,
-            invited_by=request.user,
-            accepted=False
+
+        # O e-mail é enviado pelo despachante do outbox, fora da requisição
+        with transaction.atomic():
+            GroupMembership.objects.create(
+                group=group,
+                user=user,
+                invited_by=request.user,
+                accepted=False
+            )
+            enqueue_invites([invite_payload(group, user, request.user)])
+
+        return Response({'detail': f'Invite sent to {username}.'})
+
+def insert_invites(group, users, invited_by):
+    """
+    Cria convites pendentes de ``group`` para ``users`` e retorna os ids dos usuários
+    cujas linhas esta chamada inseriu. Um convite concorrente para o mesmo (grupo,
+    usuário) ganha a restrição única e não é contado: no PostgreSQL e no SQLite um
+    único INSERT ... ON CONFLICT DO NOTHING RETURNING diz quais linhas entraram.
+    """
+    if not users:
+        return set()
+
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        created = set()
+        for user in users:
+            try:
+                with transaction.atomic():
+                    GroupMembership.objects.create(group=group, user=user, invited_by=invited_by, accepted=False)
+            except IntegrityError:
+                continue
+            created.add(user.id)
+        return created
+
+    meta = GroupMembership._meta
+    qn = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in ('group', 'user', 'invited_by', 'accepted', 'invited_at')]
+    invited_at = meta.get_field('invited_at').get_db_prep_value(timezone.now(), connection)
+    sql = 'INSERT INTO {table} ({columns}) VALUES {rows} ON CONFLICT ({group}, {user}) DO NOTHING RETURNING {user}'.format(
+        table=qn(meta.db_table),
+        columns=', '.join(qn(field.column) for field in fields),
+        rows=', '.join(['(%s, %s, %s, %s, %s)'] * len(users)),
+        group=qn(fields[0].column),
+        user=qn(fields[1].column),
+    )
+    params = [value for user in users for value in (group.id, user.id, invited_by.id, False, invited_at)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {user_id for user_id, in cursor.fetchall()}
+
+class GroupBulkInviteView(views.APIView):
+    """
+    Convida vários usuários (username ou email) de uma vez: uma consulta resolve os
+    usuários, outra encontra as associações existentes, as novas são criadas num
+    único INSERT e os convites entram no outbox na mesma transação.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def resolve_users(self, identifiers):
+        """``{identificador: [usuários]}``; o username exato tem prioridade sobre o email"""
+        emails = {identifier.lower() for identifier in identifiers if '@' in identifier}
+        users = User.objects.annotate(email_lower=Lower('email')).filter(
+            Q(username__in=identifiers) | Q(email_lower__in=emails)
         )
-        
-        payload = {
-            "group": group.name,
-            "invited_user": user.username,
-            "invited_email": user.email,
-            "invited_by": request.user.username,
-            "accept_link": f"https://your-site.com/groups/{group.id}/accept/"
+        by_username, by_email = {}, {}
+        for user in users:
+            by_username[user.username] = user
+            if user.email_lower in emails:
+                by_email.setdefault(user.email_lower, []).append(user)
+        return {
+            identifier: [by_username[identifier]] if identifier in by_username else by_email.get(identifier.lower(), [])
+            for identifier in identifiers
         }
-        
-        N8N_BASIC_USER = os.getenv("N8N_BASIC_USER")
-        N8N_BASIC_PASSWORD = os.getenv("N8N_BASIC_PASSWORD")
-        auth = HTTPBasicAuth(N8N_BASIC_USER, N8N_BASIC_PASSWORD)
 
-        try:
-            response = requests.post(
-                "http://n8n:5678/webhook/group-invite",
-                json=payload,
-                auth=auth,
-                timeout=5
-            )
-            if response.status_code >= 200 and response.status_code < 300:
-                print(f"[n8n] Email sent to {user.email} successfully!", flush=True)
+    def post(self, request, group_id):
+        group = get_object_or_404(Group, id=group_id, owner=request.user)
+        serializer = GroupBulkInviteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        identifiers = serializer.validated_data['users']
+
+        matches = self.resolve_users(identifiers)
+        found_ids = {users[0].id for users in matches.values() if len(users) == 1}
+        existing = dict(GroupMembership.objects.filter(
+            group=group,
+            user_id__in=found_ids
+        ).values_list('user_id', 'accepted'))
+
+        results = []
+        invited = {}
+        for identifier in identifiers:
+            users = matches[identifier]
+            if not users:
+                results.append({'user': identifier, 'status': 'not_found'})
+                continue
+            if len(users) > 1:
+                results.append({'user': identifier, 'status': 'ambiguous'})
+                continue
+            user = users[0]
+            if user.id in existing:
+                result_status = 'already_member' if existing[user.id] else 'already_invited'
+            elif user.id in invited:
+                result_status = 'duplicate'
             else:
-                print(f"[n8n] Failed to send email to {user.email}. Status: {response.status_code}", flush=True)
-        except Exception as e:
-            print(f"[n8n] Error notifying n8n for {user.email}: {e}", flush=True)
+                invited[user.id] = user
+                result_status = 'invited'
+            results.append({'user': identifier, 'username': user.username, 'status': result_status})
 
-        return Response({'detail': f'Invite sent to {username}.'})
+        with transaction.atomic():
+            # Só os convites inseridos por esta requisição são informados e notificados
+            created = insert_invites(group, list(invited.values()), request.user)
+            if created:
+                # O INSERT direto não dispara os sinais que atualizam a versão do grupo
+                bump_group_version(group.id)
+            enqueue_invites([invite_payload(group, invited[user_id], request.user) for user_id in created])
+
+        for result in results:
+            if result['status'] == 'invited' and matches[result['user']][0].id not in created:
+                result['status'] = 'already_invited'
+
+        return Response(
+            {'invited_count': len(created), 'results': results},
+            status=status.HTTP_201_CREATED if len(created) == len(identifiers) else status.HTTP_207_MULTI_STATUS
+        )
 
 class GroupAcceptInviteView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -106,12 +215,28 @@ class GroupMembersListView(generics.ListAPIView):
     serializer_class = GroupMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_group_access(self):
+        """O grupo e se o usuário é membro dele (pelo roster em cache), uma única vez por requisição"""
+        if not hasattr(self, '_group_access'):
+            group = get_object_or_404(Group, id=self.kwargs['group_id'])
+            self._group_access = (group, is_member(group.id, self.request.user.id))
+        return self._group_access
+
     def get_queryset(self):
-        group_id = self.kwargs['group_id']
-        group = get_object_or_404(Group, id=group_id)
-        if not GroupMembership.objects.filter(group=group, user=self.request.user, accepted=True).exists():
+        group, is_member = self.get_group_access()
+        if not is_member:
             return GroupMembership.objects.none()
-        return GroupMembership.objects.filter(group=group, accepted=True)
+        return GroupMembership.objects.filter(group=group, accepted=True).select_related('group', 'user', 'invited_by')
+
+    def list(self, request, *args, **kwargs):
+        group, is_member = self.get_group_access()
+        etag = make_etag(
+            'group-members', group.id, group.version, is_member, request.accepted_renderer.format
+        )
+        response = not_modified(request, 'group-members', etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return tag_response(response, etag)
 
 class PendingInvitesListView(generics.ListAPIView):
     serializer_class = GroupMembershipSerializer
@@ -121,7 +246,7 @@ class PendingInvitesListView(generics.ListAPIView):
         return GroupMembership.objects.filter(
             user=self.request.user,
             accepted=False
-        ).select_related('group', 'invited_by')
+        ).select_related('group', 'user', 'invited_by')
 
 class GroupDeleteView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -191,7 +316,8 @@ class GroupTransferOwnershipView(views.APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Verifica se o novo dono é membro do grupo
+        # Verifica se o novo dono é membro do grupo, no banco: o roster em cache pode
+        # estar atrasado em outro processo e só serve para as verificações de leitura
         if not GroupMembership.objects.filter(
             group=group,
             user=new_owner,
@@ -202,9 +328,9 @@ class GroupTransferOwnershipView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Transfere a propriedade
+        # Transfere a propriedade; a versão só é gravada pelo F() de bump_group_version
         group.owner = new_owner
-        group.save()
+        group.save(update_fields=['owner'])
         
         return Response(
             {'detail': f'Propriedade do grupo transferida para {new_owner_username} com sucesso.'},
@@ -224,12 +350,12 @@ class GroupRemoveMemberView(views.APIView):
         
         group = get_object_or_404(Group, id=group_id)
         
-        # Verifica se o usuário é membro do grupo
-        if not GroupMembership.objects.filter(
+        # Verifica se o usuário é membro do grupo, no banco (não pelo roster em cache)
+        member_ids = list(GroupMembership.objects.filter(
             group=group,
-            user=request.user,
             accepted=True
-        ).exists():
+        ).order_by('id').values_list('user_id', flat=True))
+        if request.user.id not in member_ids:
             return Response(
                 {'detail': 'Você não é membro deste grupo.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -255,10 +381,8 @@ class GroupRemoveMemberView(views.APIView):
             # Se for o dono do grupo
             if group.owner == request.user:
                 # Conta quantos outros membros existem
-                other_members = GroupMembership.objects.filter(
-                    group=group,
-                    accepted=True
-                ).exclude(user=request.user).count()
+                other_member_ids = [user_id for user_id in member_ids if user_id != request.user.id]
+                other_members = len(other_member_ids)
                 
                 if other_members == 0:
                     # Se não houver outros membros, deleta o grupo
@@ -269,13 +393,10 @@ class GroupRemoveMemberView(views.APIView):
                     )
                 elif other_members == 1:
                     # Se houver apenas um outro membro, transfere a propriedade automaticamente
-                    new_owner = GroupMembership.objects.filter(
-                        group=group,
-                        accepted=True
-                    ).exclude(user=request.user).first().user
+                    new_owner = User.objects.get(pk=other_member_ids[0])
                     
                     group.owner = new_owner
-                    group.save()
+                    group.save(update_fields=['owner'])
                     
                     # Remove o antigo dono
                     membership = GroupMembership.objects.get(
@@ -129,8 +129,11 @@ const DateSelector: React.FC<DateSelectorProps> = ({ selectedDate, onDateChange
   );
 };
 
-const fetchSlots = async () => {
-  const response = await availabilityService.getSlots();
+const fetchSlots = async (startDate: Date, endDate: Date) => {
+  const response = await availabilityService.getSlots({
+    start_date: format(startDate, 'yyyy-MM-dd'),
+    end_date: format(endDate, 'yyyy-MM-dd'),
+  });
   return response;
 };
 
@@ -202,27 +205,29 @@ const TimeSlotCell = memo(({ day, hour, slot, isInSelection, mouseDownButton, da
 });
 
 export const CalendarPage = () => {
+  const [selectedDate, setSelectedDate] = useState(new Date());
+
+  const weekDates = useMemo(() => {
+    const monday = startOfWeek(selectedDate, { weekStartsOn: 1 });
+    return WEEKDAYS.map((_, index) => addDays(monday, index));
+  }, [selectedDate]);
+
+  // Only the visible week is fetched; invalidating ['slots'] refreshes every cached week.
   const { data: timeSlots = [], isLoading, isError } = useQuery<ApiTimeSlot[]>({
-    queryKey: ['slots'],
-    queryFn: fetchSlots,
+    queryKey: ['slots', format(weekDates[0], 'yyyy-MM-dd')],
+    queryFn: () => fetchSlots(weekDates[0], weekDates[weekDates.length - 1]),
   });
   const queryClient = useQueryClient();
   const [selectedSlots, setSelectedSlots] = useState<ModalTimeSlot[]>([]);
   const [showSlotModal, setShowSlotModal] = useState(false);
   const [mouseDown, setMouseDown] = useState<{ button: number; day: string; hour: number; x: number; y: number } | null>(null);
   const [currentHover, setCurrentHover] = useState<{ day: string; hour: number } | null>(null);
-  const [selectedDate, setSelectedDate] = useState(new Date());
   const [isDragging, setIsDragging] = useState(false);
   
   const gridRef = useRef<HTMLDivElement>(null);
   const modalTimeoutRef = useRef<number>();
   const lastMoveTime = useRef(0);
 
-  const weekDates = useMemo(() => {
-    const monday = startOfWeek(selectedDate, { weekStartsOn: 1 });
-    return WEEKDAYS.map((_, index) => addDays(monday, index));
-  }, [selectedDate]);
-
   const slotLookupMap = useMemo(() => {
     const map = new Map();
     timeSlots.forEach((slot: ApiTimeSlot) => {
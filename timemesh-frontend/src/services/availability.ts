@@ -26,6 +26,7 @@ interface BaseSlot {
 export interface AvailabilitySlot extends BaseSlot {
   id?: string;
   notes?: string;
+  series?: number | null;
 }
 
 export interface TimeSlot extends BaseSlot {
@@ -43,6 +44,23 @@ interface GroupAvailabilityRequest {
   end_date?: string;
 }
 
+interface SlotRange {
+  start_date?: string;
+  end_date?: string;
+}
+
+interface SlotPage {
+  next: string | null;
+  results: ApiTimeSlot[];
+}
+
+export interface SlotChanges {
+  cursor: number;
+  has_more: boolean;
+  upserts: ApiTimeSlot[];
+  deleted: Array<{ id: number } | { series: number; date: string }>;
+}
+
 interface BatchResponse {
   created_slots?: AvailabilitySlot[];
   deleted_count?: number;
@@ -53,8 +71,24 @@ interface BatchResponse {
 }
 
 export const availabilityService = {
-  async getSlots(): Promise<ApiTimeSlot[]> {
-    const response = await api.get('/api/availability/slots/');
+  async getSlots(range: SlotRange = {}): Promise<ApiTimeSlot[]> {
+    const slots: ApiTimeSlot[] = [];
+    let cursor: string | null = null;
+    do {
+      const response: { data: SlotPage } = await api.get('/api/availability/slots/', {
+        params: { ...range, ...(cursor ? { cursor } : {}) },
+      });
+      slots.push(...response.data.results);
+      cursor = response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+    } while (cursor);
+    return slots;
+  },
+
+  // Omit `since` to get the current cursor; a 410 response means the slot list must be reloaded.
+  async getSlotChanges(since?: number, limit?: number): Promise<SlotChanges> {
+    const response = await api.get('/api/availability/slots/changes/', {
+      params: { ...(since !== undefined ? { since } : {}), ...(limit ? { limit } : {}) },
+    });
     return response.data;
   },
 
@@ -19,6 +19,19 @@ export interface GroupMember {
   accepted_at?: string;
 }
 
+export type BulkInviteStatus =
+  | 'invited'
+  | 'already_member'
+  | 'already_invited'
+  | 'duplicate'
+  | 'not_found'
+  | 'ambiguous';
+
+export interface BulkInviteResult {
+  invited_count: number;
+  results: { user: string; username?: string; status: BulkInviteStatus }[];
+}
+
 export const groupsService = {
   async getGroups() {
     const response = await api.get<Group[]>('/api/groups/');
@@ -74,5 +87,11 @@ export const groupsService = {
 
   async inviteUser(groupId: number, username: string) {
     await api.post(`/api/groups/${groupId}/invite/`, { username });
+  },
+
+  // Usernames or emails; responds 201 when all were invited, 207 otherwise.
+  async inviteUsers(groupId: number, users: string[]) {
+    const response = await api.post<BulkInviteResult>(`/api/groups/${groupId}/invite/bulk/`, { users });
+    return response.data;
   }
 }; 
\ No newline at end of file
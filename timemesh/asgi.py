@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'timemesh.settings')
 
 application = get_asgi_application()
+
+# Only the processes that serve requests (runserver loads this module in its serving
+# child, gunicorn/uvicorn import it) run the invite outbox dispatcher; management
+# commands, tests and scripts never load it.
+from groups.notifications import wake_dispatcher  # noqa: E402
+
+wake_dispatcher()
@@ -44,6 +44,71 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Use the derived per-user daily bitmaps to skip days that cannot match.
+# Turn off if the table is known to be stale (see `manage.py check_daily_bitmaps`).
+AVAILABILITY_DAILY_BITMAPS = config('AVAILABILITY_DAILY_BITMAPS', default=True, cast=bool)
+
+# Default engine for match requests that do not pick one: 'interval', 'bitmap' or
+# 'database' (the sweep runs as one SQL query; PostgreSQL or SQLite only).
+AVAILABILITY_MATCH_ENGINE = config('AVAILABILITY_MATCH_ENGINE', default='interval')
+
+# Per-day group match results are cached here (LRU, TTL in seconds). Entries are keyed by
+# versions read from the database (group version, members' change log heads per day), so a
+# per-process cache never serves stale results; the TTL only bounds memory.
+# Set AVAILABILITY_MATCH_CACHE to None to disable.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'availability-match': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'availability-match',
+        'TIMEOUT': config('AVAILABILITY_MATCH_CACHE_TTL', default=300, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('AVAILABILITY_MATCH_CACHE_SIZE', default=10000, cast=int),
+        },
+    },
+    'group-roster': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'group-roster',
+        'TIMEOUT': config('GROUP_ROSTER_CACHE_TTL', default=60, cast=int),
+    },
+}
+AVAILABILITY_MATCH_CACHE = 'availability-match'
+
+# Accepted member ids per group, used by the read-only membership checks (IsGroupMember);
+# member removal and ownership transfer check the database instead.
+# Invalidated by signals on membership changes and group deletion; the TTL bounds how long
+# another process may serve a stale roster with a per-process cache such as LocMemCache.
+GROUP_ROSTER_CACHE = 'group-roster'
+
+# Background slot imports (batch_create with "async": true) run on an in-process
+# thread pool and are tracked in the SlotImportJob table; no broker is involved.
+AVAILABILITY_JOB_WORKERS = config('AVAILABILITY_JOB_WORKERS', default=2, cast=int)
+AVAILABILITY_JOB_CHUNK_SIZE = config('AVAILABILITY_JOB_CHUNK_SIZE', default=500, cast=int)
+
+# Slot change log entries kept intact for delta sync (slots/changes/); older ones are
+# compacted to the latest entry per day and cursors before them must resync.
+AVAILABILITY_CHANGE_LOG_RETENTION = config('AVAILABILITY_CHANGE_LOG_RETENTION', default=1000, cast=int)
+
+# Group invite e-mails are written to the InviteNotification outbox with the membership
+# and delivered to n8n in batches by a background dispatcher thread, started by the WSGI/ASGI
+# entrypoints of the web processes (or by `manage.py dispatch_invite_notifications --loop`
+# when GROUP_INVITE_OUTBOX_DISPATCHER is off). A batch is claimed for GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT seconds and posted outside the
+# claiming transaction; an unfinished batch is picked up again once its claim expires.
+# Failed batches are retried with exponential backoff and dead-lettered after the last attempt.
+GROUP_INVITE_WEBHOOK_URL = config('GROUP_INVITE_WEBHOOK_URL', default='http://n8n:5678/webhook/group-invite')
+GROUP_INVITE_WEBHOOK_TIMEOUT = config('GROUP_INVITE_WEBHOOK_TIMEOUT', default=5, cast=float)
+N8N_BASIC_USER = config('N8N_BASIC_USER', default='')
+N8N_BASIC_PASSWORD = config('N8N_BASIC_PASSWORD', default='')
+GROUP_INVITE_OUTBOX_DISPATCHER = config('GROUP_INVITE_OUTBOX_DISPATCHER', default=True, cast=bool)
+GROUP_INVITE_OUTBOX_BATCH_SIZE = config('GROUP_INVITE_OUTBOX_BATCH_SIZE', default=50, cast=int)
+GROUP_INVITE_OUTBOX_MAX_ATTEMPTS = config('GROUP_INVITE_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+GROUP_INVITE_OUTBOX_BACKOFF = config('GROUP_INVITE_OUTBOX_BACKOFF', default=5, cast=float)  # seconds, doubled per attempt
+GROUP_INVITE_OUTBOX_MAX_BACKOFF = config('GROUP_INVITE_OUTBOX_MAX_BACKOFF', default=3600, cast=float)
+GROUP_INVITE_OUTBOX_POLL_INTERVAL = config('GROUP_INVITE_OUTBOX_POLL_INTERVAL', default=60, cast=float)
+GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT = config('GROUP_INVITE_OUTBOX_CLAIM_TIMEOUT', default=300, cast=float)
+
 # Application definition
 
 INSTALLED_APPS = [